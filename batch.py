@@ -0,0 +1,164 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from loaders import load_cars_file, load_track_file
+from race_config import RaceConfig
+from simulation import simulate
+
+
+# Batch mode.
+# Runs every (cars, track, laps, seed) combination listed in a manifest
+# in one go instead of one interactive session per race. Each distinct
+# cars or track file is read and parsed once, handed to every worker
+# process once when it starts, and shared by all the runs that use it.
+# Every run's result goes to a single JSON Lines output file, in
+# manifest order.
+#
+# Manifest format (paths are relative to the manifest):
+#   {
+#     "engine": "classic",
+#     "jobs": [
+#       {"cars": "cars.txt", "track": "track.txt", "laps": 50, "seeds": [1, 2, 3]},
+#       {"cars": "cars.txt", "track": "other_track.txt", "laps": 30, "seed": 7, "engine": "vector"},
+#       {"cars": "cars.txt", "track": "track.txt", "laps": 50, "seeds": [1, 2, 3], "config": {"pass_threshold": 0.5}}
+#     ]
+#   }
+#
+# "config" overrides tuning constants for one job; see race_config.
+#
+# Example:
+#   python batch.py season.json results.jsonl --workers 8
+
+
+# Parsed cars and track files of the current worker, keyed by path.
+# Filled in once per worker process by init_worker.
+worker_files = {}
+
+
+# One race weekend to simulate.
+class BatchRun:
+
+    __slots__ = ("job", "cars", "track", "laps", "seed", "engine", "config")
+
+    def __init__(self, job, cars, track, laps, seed, engine, config=None):
+        self.job = job
+        self.cars = cars
+        self.track = track
+        self.laps = laps
+        self.seed = seed
+        self.engine = engine
+        self.config = config
+
+
+# Read a manifest file and expand its jobs into a list of BatchRuns,
+# one per seed. A job with no seeds gets a single freshly seeded run.
+#
+# Raises ValueError if the manifest is missing a required key or has a bad value.
+def read_manifest(filepath):
+    manifest = main.read_json_file(filepath)
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+    default_engine = manifest.get("engine", "classic")
+    if "jobs" not in manifest:
+        raise ValueError(f"Manifest {filepath} has no \"jobs\" list.")
+
+    runs = []
+    for job_index, job in enumerate(manifest["jobs"]):
+        for key in ("cars", "track", "laps"):
+            if key not in job:
+                raise ValueError(f"Job {job_index} in {filepath} is missing \"{key}\".")
+        if not isinstance(job["laps"], int) or job["laps"] < 1:
+            raise ValueError(f"Job {job_index} in {filepath} has an invalid lap count: {job['laps']!r}")
+        engine = job.get("engine", default_engine)
+        if engine not in ("classic", "vector"):
+            raise ValueError(f"Job {job_index} in {filepath} has an unknown race engine: {engine}")
+        try:
+            config = RaceConfig(**job["config"]) if "config" in job else None
+        except TypeError as error:
+            raise ValueError(f"Job {job_index} in {filepath} has a bad config: {error}")
+
+        if "seeds" in job:
+            seeds = job["seeds"]
+        else:
+            seeds = [job.get("seed")]
+        cars_path = os.path.join(base_dir, job["cars"])
+        track_path = os.path.join(base_dir, job["track"])
+        for seed in seeds:
+            runs.append(BatchRun(job_index, cars_path, track_path, job["laps"], seed, engine, config))
+    return runs
+
+
+# Read and validate every distinct cars and track file the runs use, once each.
+#
+# Raises SchemaError if a file doesn't match the cars or track schema.
+def load_files(runs):
+    files = {}
+    for run in runs:
+        for path, load in ((run.cars, load_cars_file), (run.track, load_track_file)):
+            if path not in files:
+                logging.info("Loading %s", path)
+                files[path] = load(path)
+    return files
+
+
+# Worker initializer: keep the parsed files for every run this worker gets.
+def init_worker(files):
+    worker_files.clear()
+    worker_files.update(files)
+
+
+# Simulate one run against the parsed files of this process and
+# return its output record.
+def run_one(run):
+    result = simulate(worker_files[run.cars], worker_files[run.track], run.laps, seed=run.seed, engine=run.engine, config=run.config)
+    record = {"job": run.job, "cars": run.cars, "track": run.track, "engine": run.engine}
+    if run.config is not None:
+        record["config"] = run.config.to_dict()
+    record.update(result.to_dict())
+    del record["profile"]
+    return record
+
+
+# Run every run of a manifest, writing one JSON line per run to output_path
+# as results come in. Results are written in manifest order no matter how
+# many workers are used. Returns the number of runs written.
+def run_batch(runs, output_path, workers=None):
+    files = load_files(runs)
+    workers = workers or os.cpu_count() or 1
+    logging.info("Running %s race weekends from %s files on %s workers.", len(runs), len(files), workers)
+
+    with open(output_path, "w") as output_file:
+        if workers == 1:
+            init_worker(files)
+            for record in map(run_one, runs):
+                output_file.write(json.dumps(record) + "\n")
+        else:
+            # A few chunks per worker so slow runs don't leave cores idle at the end.
+            chunksize = max(1, len(runs) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(files,)) as executor:
+                for record in executor.map(run_one, runs, chunksize=chunksize):
+                    output_file.write(json.dumps(record) + "\n")
+    return len(runs)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Simulate every race weekend listed in a manifest and collect the results in one file.")
+    parser.add_argument("manifest", help="JSON manifest listing the (cars, track, laps, seeds) jobs.")
+    parser.add_argument("output", help="JSON Lines file to write one result per run to.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    runs = read_manifest(args.manifest)
+    count = run_batch(runs, args.output, workers=args.workers)
+    print(f"Wrote {count} race results to {args.output}.")
+
+
+if __name__ == "__main__":
+    run_cli()
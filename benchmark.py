@@ -0,0 +1,234 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import main
+import vector_engine
+from race_config import DEFAULT_CONFIG
+from race_context import RaceContext
+from race_rng import RaceRNG
+
+
+# Benchmark suite for the race engine.
+# Generates synthetic fields and tracks of configurable size, times the
+# hot entry points at every size, and writes the timings to a JSON file.
+# Given a baseline file from an earlier run, it flags every benchmark that
+# got slower than the allowed tolerance and exits non-zero.
+#
+# Example:
+#   python benchmark.py --cars 10 100 1000 --items 5 50 200 --output bench.json
+#   python benchmark.py --baseline bench.json
+#   python benchmark.py --startup --cars 20 --items 12 --laps 30 --repeat 10
+
+
+# Build a synthetic field of num_cars cars in the cars.txt schema.
+# Two cars per team, ratings spread around the ones in the league today.
+def synthetic_field(num_cars, seed=0):
+    rng = random.Random(f"field:{seed}")
+    cars = []
+    for i in range(num_cars):
+        team = i // 2
+        cars.append({
+            "team_name": f"Team {team}",
+            "driver_name": f"Driver {i}",
+            "driver_skill": rng.randint(6, 14),
+            "car_number": str(i + 1).zfill(len(str(num_cars))),
+            "handling": rng.randint(7, 14),
+            "power": rng.randint(7, 14),
+            "reliability": rng.randint(7, 11),
+        })
+    return cars
+
+
+# Build a synthetic track of num_items items in the track.txt schema.
+# The last item ends the lap.
+def synthetic_track(num_items, seed=0):
+    rng = random.Random(f"track:{seed}")
+    items = {}
+    for i in range(num_items):
+        items[str(i + 1)] = {
+            "base_time": round(rng.uniform(5.0, 20.0), 1),
+            "name": f"Item {i + 1}",
+            "power": rng.randint(6, 13),
+            "handling": rng.randint(6, 15),
+            "is_lap_end": i == num_items - 1,
+        }
+    return {"reliability_rating": 8, "items": items}
+
+
+# Give a field the race fields run_race_weekend would: health, grid
+# positions in list order and the start penalties.
+def prepare_field(cars):
+    for i, car in enumerate(cars):
+        car["race_time"] = DEFAULT_CONFIG.start_penalty * i
+        car["position"] = i + 1
+        car["health"] = DEFAULT_CONFIG.starting_health
+    return cars
+
+
+# A field in the middle of a race: everyone running, spread out so about
+# a third of the adjacent pairs are close enough to pass or defend.
+def mid_race_field(num_cars, seed=0):
+    rng = random.Random(f"mid_race:{seed}")
+    cars = prepare_field(synthetic_field(num_cars, seed))
+    race_time = 1000.0
+    for car in cars:
+        race_time += rng.choice((rng.uniform(0.0, 0.6), rng.uniform(-0.5, 0.0), rng.uniform(0.6, 3.0)))
+        car["race_time"] = race_time
+    return cars
+
+
+# Time fn(*prepared) repeat times, where setup() builds a fresh tuple of
+# inputs each time outside the timed region. Return the best time in seconds.
+def time_best(setup, fn, repeat):
+    best = None
+    for _ in range(repeat):
+        prepared = setup()
+        started = time.perf_counter()
+        fn(*prepared)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def silent_context(seed=0):
+    return RaceContext(rng=RaceRNG(seed))
+
+
+# Run every benchmark at every size and return {name: seconds}.
+def run_benchmarks(car_counts, item_counts, num_laps, repeat, engines, seed=0):
+    results = {}
+    for num_cars in car_counts:
+        cars = synthetic_field(num_cars, seed)
+
+        name = f"run_pass_check[cars={num_cars}]"
+        mid_race = mid_race_field(num_cars, seed)
+        results[name] = time_best(lambda: (copy.deepcopy(mid_race), silent_context(seed)), main.run_pass_check, repeat)
+        print(f"{name}: {results[name]:.6f}s")
+
+        name = f"update_positions[cars={num_cars}]"
+        results[name] = time_best(lambda: (copy.deepcopy(mid_race), random.Random(seed)), main.update_positions, repeat)
+        print(f"{name}: {results[name]:.6f}s")
+
+        for num_items in item_counts:
+            track = synthetic_track(num_items, seed)
+
+            name = f"run_qualifying[cars={num_cars},items={num_items}]"
+            results[name] = time_best(lambda: (prepare_field(copy.deepcopy(cars)), track, silent_context(seed)), main.run_qualifying, repeat)
+            print(f"{name}: {results[name]:.6f}s")
+
+            if "vector" in engines:
+                name = f"run_qualifying_vectorized[cars={num_cars},items={num_items}]"
+                results[name] = time_best(lambda: (prepare_field(copy.deepcopy(cars)), track, silent_context(seed)), vector_engine.run_qualifying_vectorized, repeat)
+                print(f"{name}: {results[name]:.6f}s")
+
+            for engine in engines:
+                name = f"run_race[engine={engine},cars={num_cars},items={num_items},laps={num_laps}]"
+                race = vector_engine.run_race_vectorized if engine == "vector" else main.run_race
+                results[name] = time_best(lambda: (prepare_field(copy.deepcopy(cars)), track, num_laps, silent_context(seed)), race, repeat)
+                print(f"{name}: {results[name]:.6f}s")
+
+    return results
+
+
+# Command lines timed by the startup benchmarks, as arguments to the
+# Python interpreter: importing main on its own, a quick race-time
+# estimate, both run as a module and as a script, and a full scripted
+# race weekend.
+def startup_commands(cars_path, track_path, num_laps, seed=0):
+    race = ["-m", "main", cars_path, track_path, str(num_laps)]
+    return {
+        "import_main": ["-c", "import main"],
+        "estimate": race + ["--estimate"],
+        "estimate_script": ["main.py"] + race[2:] + ["--estimate"],
+        "race_weekend": race + ["--yes", "--seed", str(seed), "--log", os.devnull],
+    }
+
+
+# Time each startup command as a fresh interpreter process, from launch to
+# exit, on a synthetic field of num_cars cars over num_items items written
+# to a temporary directory. Returns {name: seconds}, the best of repeat runs.
+def run_startup_benchmarks(num_cars, num_items, num_laps, repeat, seed=0):
+    results = {}
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        cars_path = os.path.join(directory, "cars.json")
+        track_path = os.path.join(directory, "track.json")
+        with open(cars_path, "w") as cars_file:
+            json.dump(synthetic_field(num_cars, seed), cars_file)
+        with open(track_path, "w") as track_file:
+            json.dump(synthetic_track(num_items, seed), track_file)
+
+        for command, arguments in startup_commands(cars_path, track_path, num_laps, seed).items():
+            name = f"startup[{command},cars={num_cars},items={num_items},laps={num_laps}]"
+            run = lambda: subprocess.run([sys.executable] + arguments, cwd=repo, stdout=subprocess.DEVNULL, check=True)
+            results[name] = time_best(tuple, run, repeat)
+            print(f"{name}: {results[name]:.6f}s")
+    return results
+
+
+# Compare results against a baseline, returning the list of
+# (name, baseline seconds, current seconds) that slowed down by more
+# than tolerance (0.2 = 20% slower).
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1.0 + tolerance):
+            regressions.append((name, baseline[name], seconds))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the race engine on synthetic fields and tracks.")
+    parser.add_argument("--cars", type=int, nargs="+", default=[10, 100, 1000], help="Field sizes to benchmark.")
+    parser.add_argument("--items", type=int, nargs="+", default=[5, 50, 200], help="Track sizes (items per lap) to benchmark.")
+    parser.add_argument("--laps", type=int, default=3, help="Laps per benchmarked race.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best time is kept.")
+    parser.add_argument("--engines", nargs="+", choices=("classic", "vector"), default=["classic", "vector"], help="Race engines to benchmark.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data and the races.")
+    parser.add_argument("--startup", action="store_true",
+                        help="Time CLI startup instead: fresh main.py processes importing, estimating and racing the smallest field and track.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default=None, help="JSON file from an earlier run to check for slowdowns against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%).")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.startup:
+        results = run_startup_benchmarks(min(args.cars), min(args.items), args.laps, args.repeat, args.seed)
+    else:
+        results = run_benchmarks(args.cars, args.items, args.laps, args.repeat, args.engines, args.seed)
+
+    if args.output is not None:
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "laps": args.laps,
+            "results": results,
+        }
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"SLOWER: {name}: {before:.6f}s -> {after:.6f}s ({(after / before - 1.0) * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"No slowdowns beyond {args.tolerance * 100:.0f}% against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    run_cli()
@@ -0,0 +1,152 @@
+import copy
+import os
+import pickle
+
+import main
+from compiled_track import CompiledTrack
+from metrics import RaceMetrics
+from race_config import RaceConfig
+from race_context import RaceContext
+from race_rng import RaceRNG
+from simulation import SimulationResult, classify
+
+
+# Checkpoint and resume of a race in progress.
+# A snapshot holds everything the race needs to carry on after a lap:
+# the field as the engine keeps it (see RaceState), the last lap completed, whether the pit
+# stops have run, the state of every RNG stream, the race metrics,
+# the track, the engine and the tuning constants. Resuming a snapshot
+# reproduces the rest of the original race exactly; resuming it with a
+# new seed branches off a "what if" from that lap without re-running the
+# laps before it.
+#
+# Snapshots are a short magic header followed by a pickle of plain
+# values, with the field stored column-wise (the car keys once, then one
+# tuple per car) rather than as a dict per car. Only load snapshots you
+# wrote yourself: like any pickle, a crafted one can run code.
+
+
+MAGIC = b"RACESNAP"
+FORMAT_VERSION = 2
+
+
+# A decoded snapshot. field is a list of car dicts in the engine's order,
+# metrics the race's RaceMetrics so far as a dictionary.
+class RaceSnapshot:
+
+    __slots__ = ("track", "engine", "config", "num_laps", "lap", "has_pitstop_occurred", "field", "rng_state", "metrics")
+
+    def __init__(self, track, engine, config, num_laps, lap, has_pitstop_occurred, field, rng_state, metrics):
+        self.track = track
+        self.engine = engine
+        self.config = config
+        self.num_laps = num_laps
+        self.lap = lap
+        self.has_pitstop_occurred = has_pitstop_occurred
+        self.field = field
+        self.rng_state = rng_state
+        self.metrics = metrics
+
+    # The RaceState to hand back to iter_race. The field is copied, so
+    # the snapshot can be resumed any number of times.
+    def race_state(self):
+        return main.RaceState(copy.deepcopy(self.field), self.lap, self.has_pitstop_occurred)
+
+
+# Encode the race state after a lap as snapshot bytes.
+# state is the RaceState yielded by iter_race / iter_race_weekend, ctx
+# the context the race is running under.
+def dump_snapshot(state, track, num_laps, ctx, engine="classic"):
+    if isinstance(track, CompiledTrack):
+        track = track.track
+    if hasattr(track, "to_dict"):
+        track = track.to_dict()
+    # Optional keys like pit_laps may be on some cars only; they come back as None, which reads the same.
+    keys = tuple(dict.fromkeys(key for car in state.field for key in car.keys()))
+    rows = [tuple(car.get(key) for key in keys) for car in state.field]
+    payload = {
+        "track": track,
+        "engine": engine,
+        "config": ctx.config.to_dict(),
+        "num_laps": num_laps,
+        "lap": state.lap,
+        "has_pitstop_occurred": state.has_pitstop_occurred,
+        "keys": keys,
+        "rows": rows,
+        "rng_state": ctx.rng.getstate(),
+        "metrics": ctx.metrics.to_dict(),
+    }
+    return MAGIC + bytes([FORMAT_VERSION]) + pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# Decode snapshot bytes into a RaceSnapshot.
+#
+# Raises ValueError if data is not a snapshot this version can read.
+def load_snapshot(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a race snapshot.")
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported race snapshot version: {version}")
+    payload = pickle.loads(data[len(MAGIC) + 1:])
+    keys = payload["keys"]
+    field = [dict(zip(keys, row)) for row in payload["rows"]]
+    return RaceSnapshot(payload["track"], payload["engine"], RaceConfig.from_dict(payload["config"]), payload["num_laps"],
+                        payload["lap"], payload["has_pitstop_occurred"], field, payload["rng_state"], payload["metrics"])
+
+
+def write_snapshot_file(filepath, data):
+    with open(filepath, "wb") as snapshot_file:
+        snapshot_file.write(data)
+
+
+# Raises IOError if no such file exists.
+# Raises ValueError if the file is not a snapshot this version can read.
+def read_snapshot_file(filepath):
+    with open(filepath, "rb") as snapshot_file:
+        return load_snapshot(snapshot_file.read())
+
+
+# Generator carrying a snapshotted race on from its lap under ctx, like
+# iter_race. The caller sets up ctx (see resume).
+def iter_resumed_race(snapshot, ctx):
+    state = snapshot.race_state()
+    if snapshot.engine == "vector":
+        from vector_engine import iter_race_vectorized
+        return (yield from iter_race_vectorized(state.field, snapshot.track, snapshot.num_laps, ctx=ctx, state=state))
+    return (yield from main.iter_race(state.field, snapshot.track, snapshot.num_laps, ctx, state=state))
+
+
+# Run a snapshotted race to the finish and return a SimulationResult.
+# With seed None the race carries on with the snapshot's own RNG streams
+# and finishes exactly as the original did. Any other seed branches: the
+# remaining laps draw from a fresh RaceRNG(seed) instead.
+# config, if given, replaces the snapshot's tuning constants from here on.
+# sink, if given, gets the commentary for the remaining laps.
+def resume(snapshot, seed=None, config=None, sink=None):
+    if seed is None:
+        rng = RaceRNG.from_state(snapshot.rng_state)
+    else:
+        rng = RaceRNG(seed)
+    ctx = RaceContext(sink=sink, rng=rng, config=config if config is not None else snapshot.config, metrics=RaceMetrics.from_dict(snapshot.metrics))
+    field = main.exhaust(iter_resumed_race(snapshot, ctx))
+    return SimulationResult(rng.seed, snapshot.num_laps, [classify(car) for car in field], ctx.metrics.statistics(), metrics=ctx.metrics)
+
+
+# Simulate a race weekend like simulate(), writing a snapshot file to
+# directory after every `every` laps (lap_0010.snap and so on).
+# Returns the SimulationResult.
+def simulate_with_checkpoints(cars, track, num_laps, directory, every=1, seed=None, engine="classic", config=None):
+    os.makedirs(directory, exist_ok=True)
+    ctx = RaceContext(rng=RaceRNG(seed), config=config)
+    laps = main.iter_race_weekend(copy.deepcopy(cars), track, num_laps, engine=engine, ctx=ctx)
+    while True:
+        try:
+            state = next(laps)
+        except StopIteration as stop:
+            field = stop.value
+            break
+        if state.lap % every == 0:
+            data = dump_snapshot(state, track, num_laps, ctx, engine)
+            write_snapshot_file(os.path.join(directory, f"lap_{state.lap:04d}.snap"), data)
+    return SimulationResult(ctx.rng.seed, num_laps, [classify(car) for car in field], ctx.metrics.statistics(), metrics=ctx.metrics)
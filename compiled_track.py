@@ -0,0 +1,83 @@
+import main
+from race_config import DEFAULT_CONFIG
+
+
+# Precompiled track representation.
+# A track is compiled once per race weekend into an ordered list of its
+# items, with the lap-end items indexed for the reliability step. The part
+# of item_time that only depends on the car and the item,
+#   corner_randomness_factor * sum_of_differences,
+# is cached per car on first use, so each lap only has to draw and apply
+# the random factor. The vectorized engine gets the same terms as a
+# (cars x items) matrix. The terms depend on the RaceConfig, so a
+# compiled track belongs to the config it was compiled with.
+class CompiledTrack:
+
+    def __init__(self, track, config=None):
+        self.track = track
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.reliability_rating = track["reliability_rating"]
+        self.item_ids = list(track["items"].keys())
+        self.items = [track["items"][item_id] for item_id in self.item_ids]
+        self.base_times = [track_item["base_time"] for track_item in self.items]
+        self.lap_end_indexes = [i for i, track_item in enumerate(self.items) if track_item["is_lap_end"]]
+        self.rng_low = int(round(self.config.corner_base_rng_val * 10))
+        self.rng_high = int(round(self.config.corner_highest_rng_val * 10))
+        self.terms_by_car = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    # Static item_time terms of a car for every item, in lap order.
+    # Cached by car number; ratings don't change during a weekend.
+    def car_terms(self, car):
+        terms = self.terms_by_car.get(car["car_number"])
+        if terms is None:
+            terms = [main.item_time_term(track_item, car, self.config) for track_item in self.items]
+            self.terms_by_car[car["car_number"]] = terms
+        return terms
+
+    # item_time for a car on the item at item_index, using the cached term.
+    # Draws the same single RNG value item_time does, so results match it exactly.
+    def item_time(self, car, item_index, rng):
+        rng_factor = rng.randint(self.rng_low, self.rng_high) / 10.0
+        return self.base_times[item_index] + (self.car_terms(car)[item_index] * rng_factor)
+
+    # Runs of item indexes that each end at a lap-end item or at the end
+    # of the lap, as (start, stop, ends_lap) tuples.
+    def segments(self):
+        segments = []
+        start = 0
+        for index in self.lap_end_indexes:
+            segments.append((start, index + 1, True))
+            start = index + 1
+        if start < len(self.items):
+            segments.append((start, len(self.items), False))
+        return segments
+
+    # Item base times as a NumPy array, in lap order.
+    def base_time_array(self):
+        import numpy as np
+        return np.array(self.base_times, dtype=float)
+
+    # (cars x items) matrix of static item_time terms for a field given as
+    # power and handling arrays, for the vectorized engine.
+    def term_matrix(self, power, handling):
+        import numpy as np
+        item_power = np.array([track_item["power"] for track_item in self.items], dtype=float)
+        item_handling = np.array([track_item["handling"] for track_item in self.items], dtype=float)
+        sum_of_differences = (item_power[None, :] - power[:, None] + item_handling[None, :] - handling[:, None]) / self.config.sum_of_differences_weight
+        sum_of_differences[sum_of_differences == 0.0] = 0.1 # Same minimum difference as item_time.
+        return self.config.corner_randomness_factor * sum_of_differences
+
+
+# Compile a track for a config (the defaults if None), passing tracks
+# already compiled for that config through.
+def compile_track(track, config=None):
+    if config is None:
+        config = DEFAULT_CONFIG
+    if isinstance(track, CompiledTrack):
+        if track.config == config:
+            return track
+        track = track.track
+    return CompiledTrack(track, config)
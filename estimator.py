@@ -0,0 +1,274 @@
+import argparse
+import math
+import sys
+import time
+
+from compiled_track import compile_track
+from loaders import load_cars_file, load_track_file
+from pit_strategy import car_pit_laps, tyre_wear_time
+from race_config import DEFAULT_CONFIG
+
+
+# Fast analytical race estimate.
+# Predicts each car's race time and finishing position straight from the
+# distributions the simulation draws from, without running any laps:
+#
+#   item times     base_time + term * U, U uniform over the corner RNG
+#                  factors, independent per item and lap, so a lap's mean
+#                  and variance are sums over the track's items
+#   reliability    one check per lap-end item with a fixed failure
+#                  chance, so breakdowns are binomial and a car retires
+#                  once they reach starting_health
+#   pit stops      one clipped normal stop per pit lap of the car's
+#                  strategy, plus the fixed tyre wear of its stints
+#   start penalty  start_penalty per grid slot, the grid coming from a
+#                  single qualifying lap per car
+#
+# Race times are treated as independent normals. Finishing positions come
+# from the pairwise chances of one car finishing ahead of another, with
+# retirements classified at the back. Pass and defend penalties and
+# crashes are left out; they are small and rare next to the above.
+#
+# compare_with_monte_carlo measures how far an estimate is from
+# ChampionshipOdds collected by monte_carlo.run_championship_odds.
+
+
+# Standard normal cumulative distribution and density functions.
+def normal_cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def normal_pdf(x):
+    return math.exp(-0.5 * x * x) / math.sqrt(2.0 * math.pi)
+
+
+# Mean and variance of the corner RNG factor: randint(low, high) / 10.
+def corner_factor_moments(compiled):
+    low, high = compiled.rng_low, compiled.rng_high
+    mean = (low + high) / 20.0
+    variance = ((high - low + 1) ** 2 - 1) / 12.0 / 100.0
+    return mean, variance
+
+
+# Mean and variance of a normal(mean, std_dev) sample clipped to [low, high],
+# as run_pit_stops draws them.
+def clipped_normal_moments(mean, std_dev, low, high):
+    alpha = (low - mean) / std_dev
+    beta = (high - mean) / std_dev
+    below, inside, above = normal_cdf(alpha), normal_cdf(beta) - normal_cdf(alpha), 1.0 - normal_cdf(beta)
+    pdf_alpha, pdf_beta = normal_pdf(alpha), normal_pdf(beta)
+    first = low * below + high * above + mean * inside + std_dev * (pdf_alpha - pdf_beta)
+    second = (low * low * below + high * high * above + (mean * mean + std_dev * std_dev) * inside
+              + 2.0 * mean * std_dev * (pdf_alpha - pdf_beta) + std_dev * std_dev * (alpha * pdf_alpha - beta * pdf_beta))
+    return first, second - first * first
+
+
+# Chance that one reliability_check fails for a car on a track.
+def breakdown_probability(car, track_rating, config):
+    percent_difference = config.failure_factor * (car["reliability"] / track_rating)
+    # reliability_check fails on randint(1, 100) > percent_difference * 100.
+    passing = min(100, max(0, math.floor(percent_difference * 100)))
+    return (100 - passing) / 100.0
+
+
+# Chance of a car surviving num_checks reliability checks with fewer
+# than starting_health failures.
+def finish_probability(failure, num_checks, starting_health):
+    return sum(math.comb(num_checks, k) * failure ** k * (1.0 - failure) ** (num_checks - k) for k in range(min(starting_health, num_checks + 1)))
+
+
+# Distribution of how many of a set of independent events happen,
+# given each one's probability (Poisson binomial).
+def count_distribution(probabilities):
+    counts = [1.0]
+    for p in probabilities:
+        next_counts = [0.0] * (len(counts) + 1)
+        for k, mass in enumerate(counts):
+            next_counts[k] += mass * (1.0 - p)
+            next_counts[k + 1] += mass * p
+        counts = next_counts
+    return counts
+
+
+# Chance that a time with mean_a / variance_a comes in below one with mean_b / variance_b.
+def probability_faster(mean_a, variance_a, mean_b, variance_b):
+    spread = math.sqrt(variance_a + variance_b)
+    if spread == 0.0:
+        return 0.5 if mean_a == mean_b else float(mean_a < mean_b)
+    return normal_cdf((mean_b - mean_a) / spread)
+
+
+# Estimated outcome for one car.
+# Race time figures are for a car that finishes.
+class CarEstimate:
+
+    __slots__ = ("car_number", "driver_name", "lap_mean", "lap_variance", "grid_position",
+                 "race_time_mean", "race_time_variance", "finish_probability", "position_probabilities")
+
+    def __init__(self, car_number, driver_name, lap_mean, lap_variance):
+        self.car_number = car_number
+        self.driver_name = driver_name
+        self.lap_mean = lap_mean
+        self.lap_variance = lap_variance
+
+    # Expected finishing position.
+    def expected_position(self):
+        return sum((i + 1) * p for i, p in enumerate(self.position_probabilities))
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+# Estimated outcome of a whole race.
+class RaceEstimate:
+
+    def __init__(self, num_laps, cars):
+        self.num_laps = num_laps
+        self.cars = cars
+
+    # Expected race time of the fastest expected finisher, i.e. how long the race should run.
+    def race_time(self):
+        return min(car.race_time_mean for car in self.cars)
+
+    # Probability of each car finishing in each position, like ChampionshipOdds.probabilities.
+    def probabilities(self):
+        return {car.car_number: car.position_probabilities for car in self.cars}
+
+    def to_dict(self):
+        return {"num_laps": self.num_laps, "race_time": self.race_time(), "cars": [car.to_dict() for car in self.cars]}
+
+
+# Mean and variance of one lap for a car, from the per-item time terms.
+def lap_moments(compiled, car):
+    factor_mean, factor_variance = corner_factor_moments(compiled)
+    terms = compiled.car_terms(car)
+    mean = sum(compiled.base_times) + factor_mean * sum(terms)
+    variance = factor_variance * sum(term * term for term in terms)
+    return mean, variance
+
+
+# Estimate a race weekend (qualifying and race) of num_laps laps
+# under config, the default RaceConfig if None.
+def estimate_race(cars, track, num_laps, config=None):
+    if config is None:
+        config = DEFAULT_CONFIG
+    compiled = compile_track(track, config)
+    estimates = [CarEstimate(car["car_number"], car["driver_name"], *lap_moments(compiled, car)) for car in cars]
+    pit_mean, pit_variance = clipped_normal_moments(config.avg_pitstop_time, config.std_dev_pitstop_time, config.min_pitstop_time, config.max_pitstop_time)
+    num_checks = num_laps * len(compiled.lap_end_indexes)
+
+    for car, estimate in zip(cars, estimates):
+        # Grid slot: one qualifying lap against everyone else's.
+        ahead = [probability_faster(other.lap_mean, other.lap_variance, estimate.lap_mean, estimate.lap_variance) for other in estimates if other is not estimate]
+        estimate.grid_position = 1.0 + sum(ahead)
+        penalty_mean = config.start_penalty * sum(ahead)
+        penalty_variance = config.start_penalty ** 2 * sum(p * (1.0 - p) for p in ahead)
+
+        # A lap listed twice is one stop, as in pit_schedule.
+        pit_laps = sorted(set(lap for lap in car_pit_laps(car, num_laps) if lap <= num_laps))
+        pit_time = len(pit_laps) * pit_mean + tyre_wear_time(pit_laps, num_laps, config.tyre_wear)
+        estimate.race_time_mean = num_laps * estimate.lap_mean + pit_time + penalty_mean
+        estimate.race_time_variance = num_laps * estimate.lap_variance + len(pit_laps) * pit_variance + penalty_variance
+        estimate.finish_probability = finish_probability(breakdown_probability(car, compiled.reliability_rating, config), num_checks, car.get("starting_health") or config.starting_health)
+
+    # Cars with the same figures (team mates in identical cars, say) face the
+    # same rivals and get the same finishing distribution, worked out once.
+    field_size = len(estimates)
+    distributions = {}
+    for estimate in estimates:
+        key = (estimate.race_time_mean, estimate.race_time_variance, estimate.finish_probability)
+        if key in distributions:
+            estimate.position_probabilities = list(distributions[key])
+            continue
+
+        others = [other for other in estimates if other is not estimate]
+        positions = [0.0] * field_size
+
+        # Finished: one place further back for every other finisher that beats it.
+        beaten_by = count_distribution([other.finish_probability * probability_faster(other.race_time_mean, other.race_time_variance, estimate.race_time_mean, estimate.race_time_variance) for other in others])
+        for k, mass in enumerate(beaten_by):
+            positions[k] += estimate.finish_probability * mass
+
+        # Retired: somewhere behind all the finishers.
+        if estimate.finish_probability < 1.0:
+            finishers = count_distribution([other.finish_probability for other in others])
+            for k, mass in enumerate(finishers):
+                share = (1.0 - estimate.finish_probability) * mass / (field_size - k)
+                for position in range(k, field_size):
+                    positions[position] += share
+
+        estimate.position_probabilities = positions
+        distributions[key] = positions
+
+    return RaceEstimate(num_laps, estimates)
+
+
+# How far an estimate is from Monte Carlo odds for the same race.
+# Per car: the estimated and simulated expected position and mean race
+# time, and the total variation distance between the two finishing
+# position distributions (0 = identical, 1 = disjoint).
+def compare_with_monte_carlo(estimate, odds):
+    simulated = odds.probabilities()
+    simulated_times = odds.mean_race_times()
+    cars = {}
+    for car in estimate.cars:
+        probabilities = simulated[car.car_number]
+        cars[car.car_number] = {
+            "expected_position": car.expected_position(),
+            "simulated_position": sum((i + 1) * p for i, p in enumerate(probabilities)),
+            "race_time": car.race_time_mean,
+            "simulated_race_time": simulated_times[car.car_number],
+            "distance": 0.5 * sum(abs(a - b) for a, b in zip(car.position_probabilities, probabilities)),
+        }
+    return {
+        "num_weekends": odds.num_weekends,
+        "mean_distance": sum(car["distance"] for car in cars.values()) / len(cars),
+        "max_distance": max(car["distance"] for car in cars.values()),
+        "cars": cars,
+    }
+
+
+# Print the estimate, and the comparison against Monte Carlo if there is one.
+def print_estimate(estimate, seconds, comparison=None):
+    print(f"Estimated race time: {estimate.race_time() / 60.0:.2f} minutes ({seconds * 1e6:.0f} us to estimate).")
+    for car in sorted(estimate.cars, key=lambda car: car.expected_position()):
+        print(f"\tCar #: {car.car_number} ({car.driver_name})")
+        print(f"\t\tRace time: {car.race_time_mean:.2f} +/- {math.sqrt(car.race_time_variance):.2f}s  Grid: {car.grid_position:.2f}  Position: {car.expected_position():.2f}  Finish: {car.finish_probability:.3f}")
+        if comparison is not None:
+            simulated = comparison["cars"][car.car_number]
+            simulated_time = "n/a" if simulated["simulated_race_time"] is None else f"{simulated['simulated_race_time']:.2f}s"
+            print(f"\t\tMonte Carlo: race time {simulated_time}  Position: {simulated['simulated_position']:.2f}  Distance: {simulated['distance']:.3f}")
+    if comparison is not None:
+        print(f"Distance from {comparison['num_weekends']} simulated weekends: mean {comparison['mean_distance']:.3f}, max {comparison['max_distance']:.3f}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Estimate race times and finishing odds analytically, without simulating laps.")
+    parser.add_argument("cars", help="JSON file where the cars are saved.")
+    parser.add_argument("track", help="JSON file where the track is saved.")
+    parser.add_argument("laps", type=int, help="Number of laps per race.")
+    parser.add_argument("--compare", type=int, default=0, metavar="WEEKENDS", help="Also run this many Monte Carlo weekends and report the difference.")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed for the Monte Carlo comparison.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the Monte Carlo comparison (default: all cores).")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    cars = load_cars_file(args.cars)
+    track = load_track_file(args.track)
+
+    started = time.perf_counter()
+    estimate = estimate_race(cars, track, args.laps)
+    seconds = time.perf_counter() - started
+
+    comparison = None
+    if args.compare > 0:
+        from monte_carlo import run_championship_odds
+        odds = run_championship_odds(cars, track, args.laps, args.compare, seed=args.seed, workers=args.workers)
+        comparison = compare_with_monte_carlo(estimate, odds)
+    print_estimate(estimate, seconds, comparison)
+
+
+if __name__ == "__main__":
+    run_cli()
@@ -0,0 +1,78 @@
+# Maintained running order for a field of car dicts.
+# Instead of re-sorting the whole field through a comparator every time
+# something happens, the order is kept as a list indexed by position:
+# running cars first, ordered as on track, then the DNFs with the most
+# recent retirement at the head of the DNF block. Every car's "position"
+# key is kept in step with its index.
+#
+#   at(position)      O(1)
+#   swap(position)    O(1)  adjacent pass
+#   retire(car)       O(k)  k = cars between the car and the DNF block
+#   sort_running()    O(n) on a nearly sorted field (C-level key sort)
+#   contacts(start)   O(n - start) list comprehension over race times
+class FieldOrder:
+
+    # cars is any list of car dicts with position, race_time and health set.
+    def __init__(self, cars):
+        self.cars = sorted(cars, key=lambda car: car["position"])
+        self.num_running = sum(1 for car in self.cars if car["race_time"] is not None)
+        self.renumber(0, len(self.cars))
+
+    def __len__(self):
+        return len(self.cars)
+
+    def __iter__(self):
+        return iter(self.cars)
+
+    # Re-number the cars in indexes [start, stop).
+    def renumber(self, start, stop):
+        cars = self.cars
+        for i in range(start, stop):
+            cars[i]["position"] = i + 1
+
+    # Select the car with the given position, or None.
+    def at(self, position):
+        if position < 1 or position > len(self.cars):
+            return None
+        return self.cars[position - 1]
+
+    # Position of the last running car.
+    def last_running(self):
+        return self.num_running
+
+    # Swap the car at position with the car directly ahead of it.
+    def swap(self, position):
+        cars = self.cars
+        behind, ahead = position - 1, position - 2
+        cars[ahead], cars[behind] = cars[behind], cars[ahead]
+        cars[ahead]["position"] = ahead + 1
+        cars[behind]["position"] = behind + 1
+
+    # Move a car that just dropped out (race_time already None) to the
+    # head of the DNF block, classifying it ahead of earlier retirements.
+    def retire(self, car):
+        index = car["position"] - 1
+        last = self.num_running - 1
+        del self.cars[index]
+        self.cars.insert(last, car)
+        self.num_running -= 1
+        self.renumber(index, last + 1)
+
+    # Indexes i >= start, in order, where the running car at i has caught
+    # the running car ahead of it: race_time[i - 1] - race_time[i] >= 0.
+    # These are the only adjacent pairs a pass check can act on.
+    def contacts(self, start=1):
+        stop = self.num_running
+        if start >= stop:
+            return []
+        times = [car["race_time"] for car in self.cars[start - 1:stop]]
+        return [start + j for j, (ahead, behind) in enumerate(zip(times, times[1:])) if ahead - behind >= 0]
+
+    # Re-order the running cars by race_time, lower = earlier.
+    # Ties keep their current order, or their order in ties if given (a
+    # list of the same cars). DNFs are left where they are.
+    def sort_running(self, ties=None):
+        running = self.cars[:self.num_running] if ties is None else [car for car in ties if car["race_time"] is not None]
+        running.sort(key=lambda car: car["race_time"])
+        self.cars[:self.num_running] = running
+        self.renumber(0, self.num_running)
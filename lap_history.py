@@ -0,0 +1,335 @@
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from loaders import load_cars_file, load_track_file
+from race_rng import RaceRNG
+
+
+# Columnar lap history.
+# Records every car's time through every track item, plus its race time,
+# position and gap to the car ahead at the end of every lap, for any
+# number of races. Everything lives in a few preallocated NumPy columns
+# indexed [race, lap, (item,) car], so recording a value is a single
+# array store and a thousand 20-car, 30-lap races on a 10-item track
+# take about 30 MB, where the same history as car dicts would take
+# gigabytes. Attach a LapHistory to a RaceContext as its recorder (or
+# pass history= to simulate) and the engines fill it in as they go.
+#
+# The columns can live in memory or in a memory-mapped file, which is
+# then the history itself: nothing has to fit in memory, and worker
+# processes can each record their own races into the same file. A file
+# is a fixed prefix (magic, version, races recorded, header length), a
+# JSON header describing the columns, then each column's raw bytes at a
+# 64-byte aligned offset. Loading one maps the columns straight from the
+# file without copying or parsing them.
+#
+# Qualifying laps are not recorded. Cars that have retired read NaN.
+#
+# Example:
+#   python lap_history.py record cars.txt track.txt 30 -n 1000 --output history.bin
+#   python lap_history.py summary history.bin
+
+
+MAGIC = b"LAPHIST\0"
+FORMAT_VERSION = 1
+
+# magic, format version, races recorded, header length.
+PREFIX = struct.Struct("<8sIQI")
+
+# Byte alignment of every column in a history file.
+ALIGNMENT = 64
+
+# Seeds the seeds column can hold. Every seed RaceRNG picks or spawns is
+# one of these; other seeds are refused rather than wrapped around.
+MAX_SEED = 2 ** 64 - 1
+
+# Columns and their dtypes. Each is indexed by race first.
+COLUMN_DTYPES = {
+    "seeds": np.dtype("<u8"), # [race] seed of the race
+    "item_times": np.dtype("<f4"), # [race, lap, item, car] seconds through the item
+    "race_times": np.dtype("<f8"), # [race, lap, car] race time at the end of the lap
+    "gaps": np.dtype("<f4"), # [race, lap, car] seconds behind the car ahead at the end of the lap
+    "positions": np.dtype("<i2"), # [race, lap, car] position at the end of the lap
+}
+
+
+# Shape of every column for a history of the given size.
+def column_shapes(num_races, num_laps, num_items, num_cars):
+    return {
+        "seeds": (num_races,),
+        "item_times": (num_races, num_laps, num_items, num_cars),
+        "race_times": (num_races, num_laps, num_cars),
+        "gaps": (num_races, num_laps, num_cars),
+        "positions": (num_races, num_laps, num_cars),
+    }
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+# Header and total file size of a history file. The header is a JSON
+# dictionary of the history's size and each column's dtype, shape and offset.
+def file_layout(car_numbers, num_laps, num_items, num_races):
+    shapes = column_shapes(num_races, num_laps, num_items, len(car_numbers))
+    header = {"car_numbers": list(car_numbers), "num_laps": num_laps, "num_items": num_items, "max_races": num_races, "columns": {}}
+    # Two passes: the offsets depend on the header's length, which depends on the offsets.
+    for _ in range(2):
+        offset = align(PREFIX.size + len(json.dumps(header).encode("utf-8")))
+        for name, dtype in COLUMN_DTYPES.items():
+            header["columns"][name] = {"dtype": dtype.str, "shape": list(shapes[name]), "offset": offset}
+            offset = align(offset + dtype.itemsize * int(np.prod(shapes[name])))
+    header_bytes = json.dumps(header).encode("utf-8")
+    return header, header_bytes, offset
+
+
+class LapHistory:
+
+    # Room for max_races races of num_laps laps over num_items track items,
+    # one column per car in car_numbers. With a path, the columns are
+    # memory-mapped from a new history file there instead of held in memory.
+    def __init__(self, car_numbers, num_laps, num_items, max_races=1, path=None):
+        self.path = path
+        arrays = None
+        if path is not None:
+            header, header_bytes, size = file_layout(car_numbers, num_laps, num_items, max_races)
+            with open(path, "wb") as history_file:
+                history_file.write(PREFIX.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes)) + header_bytes)
+                history_file.truncate(size)
+            arrays = map_columns(path, header, "r+")
+        self.setup(list(car_numbers), num_laps, num_items, max_races, arrays, races=0)
+        for name in ("item_times", "race_times", "gaps"):
+            self.arrays[name].fill(np.nan)
+
+    def setup(self, car_numbers, num_laps, num_items, max_races, arrays, races):
+        self.car_numbers = car_numbers
+        self.columns = {car_number: column for column, car_number in enumerate(car_numbers)}
+        self.num_laps = num_laps
+        self.num_items = num_items
+        self.max_races = max_races
+        if arrays is None:
+            shapes = column_shapes(max_races, num_laps, num_items, len(car_numbers))
+            arrays = {name: np.zeros(shapes[name], dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        self.arrays = arrays
+        self.seeds = arrays["seeds"]
+        self.item_times = arrays["item_times"]
+        self.race_times = arrays["race_times"]
+        self.gaps = arrays["gaps"]
+        self.positions = arrays["positions"]
+        self.races = races
+        self.race = None
+
+    # A history for a roster and track, sized for max_races races.
+    @classmethod
+    def for_race(cls, cars, track, num_laps, max_races=1, path=None):
+        return cls([car["car_number"] for car in cars], num_laps, len(track["items"]), max_races, path)
+
+    # Open an existing history file to record more races into it, e.g.
+    # from a worker process given its own range of races.
+    @classmethod
+    def open(cls, path):
+        return load_history(path, mode="r+")
+
+    # Start recording race number race (the next unused one if None),
+    # raced by cars under seed.
+    #
+    # Raises ValueError if the history is full, a car has no column or the
+    # seed is outside 0 to MAX_SEED. Nothing is recorded if it does.
+    def begin_race(self, cars, seed, race=None):
+        if race is None:
+            race = self.races
+        if race >= self.max_races:
+            raise ValueError(f"Lap history is full ({self.max_races} races).")
+        unknown = [car["car_number"] for car in cars if car["car_number"] not in self.columns]
+        if unknown:
+            raise ValueError(f"Lap history has no column for cars: {', '.join(unknown)}")
+        if not 0 <= seed <= MAX_SEED:
+            raise ValueError(f"Lap history can only record seeds from 0 to {MAX_SEED}, not {seed}.")
+        self.race = race
+        self.races = max(self.races, race + 1)
+        self.seeds[race] = seed
+
+    # One car's time through the item at item_index on lap.
+    def record_item(self, lap, item_index, car_number, item_time):
+        self.item_times[self.race, lap - 1, item_index, self.columns[car_number]] = item_time
+
+    # The times of several cars, by column, through items start to stop on
+    # lap, as a (cars x items) array.
+    def record_items(self, lap, start, stop, columns, times):
+        self.item_times[self.race, lap - 1, start:stop][:, columns] = times.T
+
+    # Race times, positions and gaps at the end of lap, from the field in running order.
+    def record_lap(self, lap, field):
+        race_times = self.race_times[self.race, lap - 1]
+        gaps = self.gaps[self.race, lap - 1]
+        positions = self.positions[self.race, lap - 1]
+        ahead = None
+        for position, car in enumerate(field, 1):
+            column = self.columns[car["car_number"]]
+            positions[column] = position
+            race_time = car["race_time"]
+            if race_time is None:
+                continue
+            race_times[column] = race_time
+            gaps[column] = 0.0 if ahead is None else race_time - ahead
+            ahead = race_time
+
+    # Columns of the given cars, as an index array for record_items.
+    def columns_of(self, cars):
+        return np.array([self.columns[car["car_number"]] for car in cars], dtype=np.intp)
+
+    # Write the race count to a memory-mapped history's file and flush its columns.
+    def flush(self):
+        if self.path is None:
+            return
+        for array in self.arrays.values():
+            if isinstance(array, np.memmap) and array.flags.writeable:
+                array.flush()
+        with open(self.path, "r+b") as history_file:
+            history_file.seek(PREFIX.size - 12)
+            history_file.write(struct.pack("<Q", self.races))
+
+    def close(self):
+        self.flush()
+
+    # Write the recorded races to a new history file at path.
+    def dump(self, path):
+        header, header_bytes, size = file_layout(self.car_numbers, self.num_laps, self.num_items, self.races)
+        with open(path, "wb") as history_file:
+            history_file.write(PREFIX.pack(MAGIC, FORMAT_VERSION, self.races, len(header_bytes)) + header_bytes)
+            for name, column in header["columns"].items():
+                history_file.seek(column["offset"])
+                history_file.write(memoryview(np.ascontiguousarray(self.arrays[name][:self.races])).cast("B"))
+            history_file.truncate(size)
+
+    # Driving time of every lap, [race, lap, car]: the sum of its item times,
+    # without pit stops, penalties or the start.
+    def lap_times(self):
+        return self.item_times[:self.races].sum(axis=2)
+
+    # One car's item times over every recorded race, [race, lap, item].
+    def car_item_times(self, car_number):
+        return self.item_times[:self.races, :, :, self.columns[car_number]]
+
+
+# Memory-map every column of a history file described by header.
+def map_columns(path, header, mode):
+    return {name: np.memmap(path, dtype=np.dtype(column["dtype"]), mode=mode, offset=column["offset"], shape=tuple(column["shape"]))
+            for name, column in header["columns"].items()}
+
+
+# Open a history file, mapping its columns rather than reading them.
+# mode "r" maps them read-only, "r+" lets more races be recorded.
+#
+# Raises ValueError if the file is not a lap history this version can read.
+def load_history(path, mode="r"):
+    with open(path, "rb") as history_file:
+        prefix = history_file.read(PREFIX.size)
+        if len(prefix) < PREFIX.size or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a lap history.")
+        _, version, races, header_length = PREFIX.unpack(prefix)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lap history version: {version}")
+        header = json.loads(history_file.read(header_length))
+    history = LapHistory.__new__(LapHistory)
+    history.path = path
+    history.setup(header["car_numbers"], header["num_laps"], header["num_items"], header["max_races"], map_columns(path, header, mode), races)
+    return history
+
+
+# Worker entry point: record one chunk of seeded races into the history
+# file, starting at race number first.
+def record_races(path, cars, track, num_laps, first, seeds, engine):
+    from simulation import simulate
+
+    history = LapHistory.open(path)
+    # Races are numbered on from the count, so this worker's land at first onwards.
+    history.races = first
+    for seed in seeds:
+        simulate(cars, track, num_laps, seed=seed, engine=engine, history=history)
+    history.flush()
+    return len(seeds)
+
+
+# Record num_races seeded race weekends into a new history file at path,
+# across worker processes, and return it opened read-only. The race seeds
+# are all derived from seed; race i is always the i-th seed.
+def record_history(cars, track, num_laps, num_races, path, seed=None, workers=None, engine="classic"):
+    base_rng = RaceRNG(seed)
+    seeds = [child.seed for child in base_rng.spawn(num_races)]
+    history = LapHistory.for_race(cars, track, num_laps, num_races, path)
+    history.flush()
+    workers = workers or os.cpu_count() or 1
+    logging.info("Recording %s races from base seed %s on %s workers.", num_races, base_rng.seed, workers)
+
+    chunk_size = max(1, -(-num_races // (workers * 4)))
+    chunks = [(first, seeds[first:first + chunk_size]) for first in range(0, num_races, chunk_size)]
+    if workers == 1:
+        for first, chunk in chunks:
+            record_races(path, cars, track, num_laps, first, chunk, engine)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(record_races, path, cars, track, num_laps, first, chunk, engine) for first, chunk in chunks]
+            for future in futures:
+                future.result()
+
+    history.races = num_races
+    history.flush()
+    return load_history(path)
+
+
+# Print each car's mean lap time, best lap, mean finishing position and
+# share of laps led over every race in the history.
+def print_summary(history):
+    lap_times = history.lap_times()
+    final_positions = history.positions[:history.races, -1]
+    led = history.positions[:history.races] == 1
+    print(f"Lap history of {history.races} races x {history.num_laps} laps x {history.num_items} items:")
+    for column, car_number in enumerate(history.car_numbers):
+        laps = lap_times[:, :, column]
+        driven = laps[~np.isnan(laps)]
+        mean_lap = f"{driven.mean():.3f}s" if driven.size else "n/a"
+        best_lap = f"{driven.min():.3f}s" if driven.size else "n/a"
+        print(f"\tCar #: {car_number}  Mean lap: {mean_lap}  Best lap: {best_lap}  "
+              f"Mean finish: {final_positions[:, column].mean():.2f}  Laps led: {led[:, :, column].mean():.1%}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Record per-lap, per-item race history to a compact columnar file, or summarise one.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Record seeded race weekends.")
+    record.add_argument("cars", help="JSON file where the cars are saved.")
+    record.add_argument("track", help="JSON file where the track is saved.")
+    record.add_argument("laps", type=int, help="Number of laps per race.")
+    record.add_argument("-n", "--races", type=int, default=100, help="Number of race weekends to record.")
+    record.add_argument("--output", required=True, help="History file to write.")
+    record.add_argument("--seed", type=int, default=None, help="Base seed for the race seeds.")
+    record.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    record.add_argument("--engine", choices=("classic", "vector"), default="classic", help="Race engine to use.")
+
+    summary = commands.add_parser("summary", help="Summarise a history file.")
+    summary.add_argument("history", help="History file to read.")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == "record":
+        cars = load_cars_file(args.cars)
+        track = load_track_file(args.track)
+        history = record_history(cars, track, args.laps, args.races, args.output, seed=args.seed, workers=args.workers, engine=args.engine)
+    else:
+        history = load_history(args.history)
+    print_summary(history)
+
+
+if __name__ == "__main__":
+    run_cli()
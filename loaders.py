@@ -0,0 +1,261 @@
+import json
+import os
+
+
+# Validated loading of car and track files.
+# json.load on its own accepts anything, so a car missing "power" or a
+# track item missing "is_lap_end" used to surface as a KeyError deep
+# inside item_time or run_track_item halfway through a race. Everything
+# loaded here is checked against the cars.txt / track.txt schema in one
+# pass as it is read, and every problem found is reported together with
+# the file and the car or item it belongs to.
+#
+# Car rosters can also be streamed one car at a time with iter_cars_file,
+# for callers working through a pool of many thousands of entries that
+# don't need it in memory as a whole. The CLIs and Monte Carlo runs race
+# every car of a roster, so they load it whole with load_cars_file.
+# load_cars_file and load_track_file memoize the validated result
+# by file path, modification time and size, so repeated batch and Monte
+# Carlo runs over the same files only parse them once per process.
+
+
+# Required keys of a car and the types their values may have.
+CAR_SCHEMA = {
+    "team_name": (str,),
+    "driver_name": (str,),
+    "driver_skill": (int, float),
+    "car_number": (str,),
+    "handling": (int, float),
+    "power": (int, float),
+    "reliability": (int, float),
+}
+
+# Required keys of a track item and the types their values may have.
+TRACK_ITEM_SCHEMA = {
+    "base_time": (int, float),
+    "name": (str,),
+    "power": (int, float),
+    "handling": (int, float),
+    "is_lap_end": (bool,),
+}
+
+# Bytes read at a time when streaming a roster.
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Validated files by absolute path: (mtime_ns, size, value).
+file_cache = {}
+
+
+# Raised when a car or track file doesn't match its schema.
+# errors lists every problem found, one message each.
+class SchemaError(ValueError):
+
+    def __init__(self, source, errors):
+        self.source = source
+        self.errors = errors
+        super().__init__(f"{source}: " + "; ".join(errors))
+
+
+# Problems with one object against a schema, as messages prefixed with where.
+def schema_errors(value, schema, where):
+    if not isinstance(value, dict):
+        return [f"{where} is not an object"]
+    errors = []
+    for key, types in schema.items():
+        if key not in value:
+            errors.append(f"{where} is missing \"{key}\"")
+        # bool is an int, but a true/false rating is always a mistake.
+        elif not isinstance(value[key], types) or (isinstance(value[key], bool) and bool not in types):
+            errors.append(f"{where} has a {type(value[key]).__name__} \"{key}\", expected {' or '.join(t.__name__ for t in types)}")
+    return errors
+
+
+# Problems with one car, the index-th of its roster: the schema plus its
+# optional "pit_laps" strategy, a list of lap numbers, and optional
+# "starting_health", a whole number of at least one.
+def car_errors(car, index):
+    label = car_label(car, index)
+    errors = schema_errors(car, CAR_SCHEMA, label)
+    if not errors and "pit_laps" in car:
+        pit_laps = car["pit_laps"]
+        if not isinstance(pit_laps, list) or not all(isinstance(lap, int) and not isinstance(lap, bool) and lap >= 1 for lap in pit_laps):
+            errors.append(f"{label} has a bad \"pit_laps\", expected a list of lap numbers")
+    if not errors and "starting_health" in car:
+        health = car["starting_health"]
+        if not isinstance(health, int) or isinstance(health, bool) or health < 1:
+            errors.append(f"{label} has a bad \"starting_health\", expected a whole number of at least 1")
+    return errors
+
+
+# Describe a car for error messages: its number if it has a usable one, else its index.
+def car_label(car, index):
+    if isinstance(car, dict) and isinstance(car.get("car_number"), str):
+        return f"car {index} (#{car['car_number']})"
+    return f"car {index}"
+
+
+# Check a single car, the index-th of its roster.
+#
+# Raises SchemaError if it doesn't match CAR_SCHEMA or has a bad pit strategy.
+def validate_car(car, index=0, source="cars"):
+    errors = car_errors(car, index)
+    if errors:
+        raise SchemaError(source, errors)
+    return car
+
+
+# Check a parsed car roster: a list of cars with unique car numbers.
+#
+# Raises SchemaError listing every problem found.
+def validate_cars(cars, source="cars"):
+    if not isinstance(cars, list):
+        raise SchemaError(source, ["expected a list of cars"])
+    errors = []
+    seen = {}
+    for index, car in enumerate(cars):
+        problems = car_errors(car, index)
+        errors.extend(problems)
+        if not problems:
+            number = car["car_number"]
+            if number in seen:
+                errors.append(f"car {index} reuses car number {number} from car {seen[number]}")
+            seen[number] = index
+    if not cars:
+        errors.append("the roster has no cars")
+    if errors:
+        raise SchemaError(source, errors)
+    return cars
+
+
+# Check a parsed track: a reliability rating and at least one item, one of them ending the lap.
+#
+# Raises SchemaError listing every problem found.
+def validate_track(track, source="track"):
+    if not isinstance(track, dict):
+        raise SchemaError(source, ["expected a track object"])
+    errors = []
+    rating = track.get("reliability_rating")
+    if "reliability_rating" not in track:
+        errors.append("track is missing \"reliability_rating\"")
+    elif not isinstance(rating, (int, float)) or isinstance(rating, bool):
+        errors.append(f"track has a {type(rating).__name__} \"reliability_rating\", expected int or float")
+    items = track.get("items")
+    if not isinstance(items, dict) or not items:
+        errors.append("track needs a non-empty \"items\" object")
+    else:
+        for item_id, item in items.items():
+            errors.extend(schema_errors(item, TRACK_ITEM_SCHEMA, f"item {item_id}"))
+        if not errors and not any(item["is_lap_end"] for item in items.values()):
+            errors.append("no track item has \"is_lap_end\": true")
+    if errors:
+        raise SchemaError(source, errors)
+    return track
+
+
+# Generator over the cars of a roster file, parsed and validated one at a
+# time from a top-level JSON list, reading STREAM_CHUNK_SIZE bytes at once.
+# Apart from the car numbers seen so far, kept to catch duplicates like
+# validate_cars does, memory use is bounded by the largest single car.
+#
+# Raises json.JSONDecodeError if file cannot be read as JSON.
+# Raises IOError if no such file exists.
+# Raises SchemaError at the first car that doesn't match the schema or
+# reuses an earlier car's number, or at the end of a roster with no cars.
+def iter_cars_file(filepath):
+    decoder = json.JSONDecoder()
+    with open(filepath) as info_file:
+        buffer = info_file.read(STREAM_CHUNK_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise SchemaError(filepath, ["expected a list of cars"])
+        position = 1
+        at_end = False
+        index = 0
+        seen = {}
+        expect_value = True
+        while True:
+            # Skip whitespace and the comma between cars, topping the buffer up as needed.
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n":
+                    position += 1
+                if position < len(buffer) or at_end:
+                    break
+                buffer = info_file.read(STREAM_CHUNK_SIZE)
+                position = 0
+                at_end = not buffer
+            if position >= len(buffer):
+                raise json.JSONDecodeError("Unterminated list of cars", buffer, position)
+            if buffer[position] == "]" and (index == 0 or not expect_value):
+                if index == 0:
+                    raise SchemaError(filepath, ["the roster has no cars"])
+                return
+            if not expect_value:
+                if buffer[position] != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+                position += 1
+                expect_value = True
+                continue
+
+            try:
+                car, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if at_end:
+                    raise
+                # Most likely the car runs past the end of the buffer: drop what's been used and read more.
+                more = info_file.read(STREAM_CHUNK_SIZE)
+                at_end = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            validate_car(car, index, filepath)
+            number = car["car_number"]
+            if number in seen:
+                raise SchemaError(filepath, [f"car {index} reuses car number {number} from car {seen[number]}"])
+            seen[number] = index
+            yield car
+            index += 1
+            position = end
+            expect_value = False
+
+
+# The value cached for filepath, or the result of load(filepath) stored
+# under its current modification time and size.
+def cached_load(filepath, load):
+    path = os.path.abspath(filepath)
+    stat = os.stat(path)
+    cached = file_cache.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    value = load(path)
+    file_cache[path] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+
+def read_json(filepath):
+    with open(filepath) as info_file:
+        return json.load(info_file)
+
+
+# Read and validate a car file, memoized by modification time.
+# The list returned is shared between calls: copy it before racing it
+# directly (simulate and friends already work on a copy).
+#
+# Raises json.JSONDecodeError if file cannot be read as JSON.
+# Raises IOError if no such file exists.
+# Raises SchemaError listing every problem with the cars.
+def load_cars_file(filepath):
+    return cached_load(filepath, lambda path: validate_cars(read_json(path), filepath))
+
+
+# Read and validate a track file, memoized by modification time.
+# The track returned is shared between calls and must not be changed.
+#
+# Raises json.JSONDecodeError if file cannot be read as JSON.
+# Raises IOError if no such file exists.
+# Raises SchemaError listing every problem with the track.
+def load_track_file(filepath):
+    return cached_load(filepath, lambda path: validate_track(read_json(path), filepath))
+
+
+# Forget every memoized file.
+def clear_cache():
+    file_cache.clear()
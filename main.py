@@ -1,40 +1,20 @@
+import heapq
 import json
-import random
 import logging
 import sys
-from functools import cmp_to_key
-import numpy as np
-
-
-# Constants for easy modification
-# TODO: consider making this a config file.
-
-sum_of_differences_weight = 2 # number we divide the sum of differences by to decide how important it is to laptimes.
-corner_randomness_factor = 0.15 # number we can tweak to change how far spread corner times are.
-corner_base_rng_val = 0.6 # Lowest value the corner-time RNG can modify the statistics modifiers by.
-corner_highest_rng_val = 1.6 # Highest value the corner-time RNG can modify the statistics modifiers by.
-crash_base_factor = 0.01 # number we can tweak to change how likely a crash is.
-crash_threshold = 0.25 # seconds apart two cars have to be to trigger a crash check.
-pass_threshold = 0.4 # seconds apart two cars have to be to trigger a pass.
-skill_threshold = 0.25 # seconds apart where a skilled driver can make a pass.
-defender_penalty = 0.1 # seconds which a defender loses by driving defensively.
-attacker_penalty = 0.4 # seconds which an attacker loses by failing to pass.
-start_penalty = 0.2 # seconds between cars at the start of the race.
-starting_health = 3 # number of mechanical failures that can occur during the race before a car must retire.
-failure_factor = 1.10 # modifier to odds of mechanical failures, adjustable to increase/reduce retirement rates. Higher means less, lower means more.
-max_breakdown_resistance = 0.9 # Maximum probability of dodging a mechanical breakdown
-avg_pitstop_time = 45.0 # Average pitstop time in the league right now.
-std_dev_pitstop_time = 5.0 # Size of standard deviation for pitstop times.
-min_pitstop_time = 30.0 # Minimum pitstop time. Don't want to have anomalously low pitstop times.
-max_pitstop_time = 75.0 # Max pitstip time. Don't want to have anomalously high pitstop times.
-
-
-# Global variables for tracking statistics.
-successful_passes = 0
-unsuccessful_passes = 0
-lead_changes = 0
-crashes = 0
-retirements = 0
+import time
+
+from field_order import FieldOrder
+from loaders import SchemaError, load_cars_file, load_track_file
+from race_config import DEFAULT_CONFIG
+from race_context import RaceContext, print_sink
+from race_rng import RaceRNG
+
+
+# Context used when callers don't pass their own: commentary goes to stdout,
+# random draws come from a RaceRNG seeded once at import, and the tuning
+# constants are the defaults in race_config.
+default_context = RaceContext(sink=print_sink)
 
 
 # Read in the JSON file containing an object's info, and return
@@ -53,18 +33,34 @@ def read_json_file(filepath):
 # Does not handle passes, defending, crashes, etc.
 #
 # Formula: Base time + (corner_randomness_factor * sum of differences between a car's ratings and the corner ratings * RNG factor between 0.8 and 1.2)
-def item_time(track_item, car):
+# rng is the corners stream of a RaceRNG, config the RaceConfig to use.
+def item_time(track_item, car, rng=None, config=None):
+    if rng is None:
+        rng = default_context.rng.corners
+    if config is None:
+        config = DEFAULT_CONFIG
+
     # Get a random number between 0.8 and 1.2, up to one decimal place long.
-    rng_factor = random.randint((corner_base_rng_val * 10), (corner_highest_rng_val * 10)) / 10.0
+    rng_factor = rng.randint(int(round(config.corner_base_rng_val * 10)), int(round(config.corner_highest_rng_val * 10))) / 10.0
+
+    item_time = track_item["base_time"] + (item_time_term(track_item, car, config) * rng_factor)
+    if logging.root.isEnabledFor(logging.DEBUG):
+        logging.debug("Car %s: %s + (%s * %s) = %s", car['car_number'], track_item['base_time'], item_time_term(track_item, car, config), rng_factor, item_time)
+    return item_time
+
+
+# The part of item_time that doesn't change from lap to lap:
+# corner_randomness_factor * sum of differences between a car's ratings and the corner ratings.
+def item_time_term(track_item, car, config=None):
+    if config is None:
+        config = DEFAULT_CONFIG
 
     # Sum the differences between the car's relevant ratings and the track item's relevant ratings.
-    sum_of_differences = (track_item["power"] - car["power"] + track_item["handling"] - car["handling"]) / sum_of_differences_weight
+    sum_of_differences = (track_item["power"] - car["power"] + track_item["handling"] - car["handling"]) / config.sum_of_differences_weight
     if sum_of_differences == 0.0:
         sum_of_differences = 0.1 # Prevent multiply by zero by assigning a minimum difference. This keeps some variability in lap times.
 
-    item_time = track_item["base_time"] + (corner_randomness_factor * sum_of_differences * rng_factor)
-    logging.debug(f"Car {car['car_number']}: {str(track_item['base_time'])} + ({str(corner_randomness_factor)} * {str(sum_of_differences)} * {str(rng_factor)}) = {str(item_time)}")
-    return item_time
+    return config.corner_randomness_factor * sum_of_differences
 
 
 # Given two cars' current race times, 
@@ -72,71 +68,61 @@ def item_time(track_item, car):
 # Each true check requires checking each car separately.
 #
 # Formula: probability = crash_base_factor * (time difference / -(crash_threshold) + 1)
-def crash_check(car_a_time, car_b_time):
+# rng is the crashes stream of a RaceRNG, config the RaceConfig to use.
+def crash_check(car_a_time, car_b_time, rng=None, config=None):
+    if rng is None:
+        rng = default_context.rng.crashes
+    if config is None:
+        config = DEFAULT_CONFIG
     logging.debug("Checking if car A and B have caused a crash.")
-    probability = crash_base_factor * (abs(car_a_time - car_b_time) / (-1 * crash_threshold) + 1)
-    logging.debug(f"Crash probability: {str(probability * 100)}") # DEBUG
-    check_num = random.randint(0, 100)
-    logging.debug(f"Check num: {str(check_num)}") # DEBUG
+    probability = config.crash_base_factor * (abs(car_a_time - car_b_time) / (-1 * config.crash_threshold) + 1)
+    logging.debug("Crash probability: %s", probability * 100) # DEBUG
+    check_num = rng.randint(0, 100)
+    logging.debug("Check num: %s", check_num) # DEBUG
     return True if check_num < (probability * 100) else False
 
 
 # Given a car and a track,
 # run the reliability check.
 # True equals a failed check.
-def reliability_check(car, track_rating):
-    percent_difference = failure_factor * (car["reliability"] / track_rating)
-    if percent_difference >= max_breakdown_resistance:
-        percent_difference == max_breakdown_resistance
-    return True if random.randint(1, 100) > (percent_difference * 100) else False
+# rng is the reliability stream of a RaceRNG, config the RaceConfig to use.
+def reliability_check(car, track_rating, rng=None, config=None):
+    if rng is None:
+        rng = default_context.rng.reliability
+    if config is None:
+        config = DEFAULT_CONFIG
+    percent_difference = config.failure_factor * (car["reliability"] / track_rating)
+    if percent_difference >= config.max_breakdown_resistance:
+        percent_difference == config.max_breakdown_resistance
+    return True if rng.randint(1, 100) > (percent_difference * 100) else False
 
 
 # Given the field of cars, determine the 
 # position of the last running car.
 # This will be used when adding new DNFs.
 def last_running(cars):
-    field = sorted(cars, key=lambda car: car["position"])
-    for car in field:
-        if car["health"] < 1:
-            return car["position"] - 1
-        else:
-            continue
+    dnf_positions = [car["position"] for car in cars if car["health"] < 1]
+    if dnf_positions:
+        return min(dnf_positions) - 1
 
 
 # Use this to update the positions of all cars.
 # Ties are broken by race_time, where lower = earlier.
 # None race_times are always DNF.
-def update_positions(cars):
+# rng is the ordering stream of a RaceRNG, used to break DNF ties.
+def update_positions(cars, rng=None):
+    if rng is None:
+        rng = default_context.rng.ordering
 
     logging.debug("Sorting and re-ordering field.")
 
-    # If 1, car_a is behind car_b, else -1 car_b is ahead of car_a.
-    def compare_car_positions(car_a, car_b):
-        if car_a["race_time"] is None:
-            if car_b["race_time"] is None:
-                if car_a["position"] == car_b["position"]:
-                    # Pick one to break the tie randomly.
-                    if random.randint(1, 2) == 1:
-                        return 1
-                    else:
-                        return -1
-                elif car_a["position"] >= car_b["position"]:
-                    return 1
-                else:
-                    return -1
-            else:
-                return 1
-        elif car_b["race_time"] is None:
-            return -1
-        else:
-            # Make the comparison based on race_time.
-            if car_a["race_time"] < car_b["race_time"]:
-                return -1
-            else:
-                return 1
-    
-    # Sort the field using our custom comparator function.
-    field = sorted(cars, key=cmp_to_key(compare_car_positions))
+    # Running cars go first, ordered by race_time.
+    # DNFs go after them in position order, picking randomly between any that are tied.
+    running = [car for car in cars if car["race_time"] is not None]
+    running.sort(key=lambda car: car["race_time"])
+    dnfs = [car for car in cars if car["race_time"] is None]
+    dnfs.sort(key=lambda car: (car["position"], rng.random()))
+    field = running + dnfs
 
     # Now re-number the field.
     for i in range(1, len(field) + 1):
@@ -169,21 +155,15 @@ def get_position(cars, position):
 # Check if any gaps in the field are negative.
 def negative_gap_exists(cars):
     logging.debug("Checking for negative gap...")
-    field_counter = 1
-    while field_counter < len(cars):
-        ahead_car = field_counter - 1
-        if ahead_car < 1:
-            field_counter += 1
-            continue
-        elif cars[field_counter]['race_time'] is None or cars[ahead_car]['race_time'] is None:
+    times = [car['race_time'] for car in cars]
+    # The leader's gap isn't checked; stop at the first DNF.
+    for ahead_time, behind_time in zip(times[1:], times[2:]):
+        if ahead_time is None or behind_time is None:
             return False
-        else:
-            # Check if the car ahead has a negative gap.
-            gap = cars[field_counter]['race_time'] - cars[ahead_car]['race_time']
-            if gap <= 0.0:
-                return True
-        field_counter += 1
-    
+        # Check if the car ahead has a negative gap.
+        if behind_time - ahead_time <= 0.0:
+            return True
+
     return False
 
 
@@ -191,17 +171,29 @@ def negative_gap_exists(cars):
 # Run a pass check through the field.
 # Separated to keep like code together.
 # Also lets me change how often pass checks are made.
-def run_pass_check(cars):
-
-    global successful_passes
-    global unsuccessful_passes
-    global lead_changes
-    global crashes
+def run_pass_check(cars, ctx=None):
+    if ctx is None:
+        ctx = default_context
+    config = ctx.config
+    metrics = ctx.metrics
+    debug = logging.root.isEnabledFor(logging.DEBUG)
 
     #Figure out if any passes occurred or need to be checked.
-    field = sorted(cars, key=lambda car: car["position"])
-    logging.debug(f"Order before pass:\n{get_current_order(field)}") # DEBUG
-    for i in range(1, len(field)):
+    # Only pairs where the car behind has caught the car ahead can pass or
+    # defend, so instead of walking every adjacent pair the check works
+    # through a queue of those, front to back. Whenever a pair changes the
+    # field, the rest of the field behind it is rescanned for new contacts.
+    order = FieldOrder(cars)
+    field = order.cars
+    if debug:
+        logging.debug("Order before pass:\n%s", get_current_order(field)) # DEBUG
+    pending = order.contacts()
+    checked = 0
+    while pending:
+        i = heapq.heappop(pending)
+        if i <= checked:
+            continue
+        checked = i
         pass_happened = False
         car_a = field[i] # Attacker.
         car_b = field[i - 1] # Defender.
@@ -212,25 +204,29 @@ def run_pass_check(cars):
 
         # Check if there was a pass, a defense + crash check, or nothing.
         gap = car_b["race_time"] - car_a["race_time"]
-        logging.debug(f"Checking for pass between {car_a['car_number']} time {str(car_a['race_time'])} and {car_b['car_number']} time {str(car_b['race_time'])}: {str(gap)}") # DEBUG
-        if gap > pass_threshold:
+        logging.debug("Checking for pass between %s time %s and %s time %s: %s", car_a['car_number'], car_a['race_time'], car_b['car_number'], car_b['race_time'], gap) # DEBUG
+        if gap > config.pass_threshold:
+            metrics.observe("pass_attempt_gap", gap)
 
             # Clean pass, switch positions.
-            logging.debug(f"Car {car_b['car_number']} was passed by car {car_a['car_number']}.")
+            logging.debug("Car %s was passed by car %s.", car_b['car_number'], car_a['car_number'])
             car_a_pos = car_a["position"]
-            car_a["position"] = car_b["position"]
-            car_b["position"] = car_a_pos
-            print(f"Wow, look at that! {car_a['driver_name']} in the {car_a['car_number']} just passed {car_b['car_number']} for position {str(car_a_pos - 1)}!")
-            field = update_positions(field)
-            successful_passes += 1
+            ctx.commentate("pass", "Wow, look at that! {driver_name} in the {car_number} just passed {passed_car_number} for position {position}!",
+                           car_number=car_a['car_number'], driver_name=car_a['driver_name'], passed_car_number=car_b['car_number'], position=car_a_pos - 1)
+            # Re-order the running cars by race_time; cars tied on time keep their order.
+            with ctx.phase("position_sorting"):
+                order.sort_running()
+            metrics.count("successful_passes")
             pass_happened = True
         
-        elif gap < pass_threshold and gap >= 0:
+        elif gap < config.pass_threshold and gap >= 0:
+            metrics.observe("pass_attempt_gap", gap)
 
             # Failed pass. Add time penalties.
-            logging.debug(f"Car {car_b['car_number']} defending from car {car_a['car_number']}.")
-            print(f"And car {car_b['car_number']} has to defend against from a pass from car {car_a['car_number']}!")
-            unsuccessful_passes += 1
+            logging.debug("Car %s defending from car %s.", car_b['car_number'], car_a['car_number'])
+            ctx.commentate("defend", "And car {car_number} has to defend against from a pass from car {attacker_car_number}!",
+                           car_number=car_b['car_number'], attacker_car_number=car_a['car_number'])
+            metrics.count("unsuccessful_passes")
 
             # Run a crash check per car.
             a_crashed = False
@@ -239,79 +235,92 @@ def run_pass_check(cars):
             car_b_time = car_b["race_time"]
             gap = abs(car_a_time - car_b_time)
 
-            if gap <= crash_threshold and crash_check(car_a_time, car_b_time):
+            if gap <= config.crash_threshold and crash_check(car_a_time, car_b_time, ctx.rng.crashes, config):
                 # A crashed.
                 a_crashed = True
-                logging.debug(f"Car {car_a['car_number']} crashed out!")
+                logging.debug("Car %s crashed out!", car_a['car_number'])
                 car_a["health"] = 0
                 car_a["race_time"] = None
-                car_a["position"] = last_running(field)
-                field = update_positions(field)
+                with ctx.phase("position_sorting"):
+                    order.retire(car_a)
+                    order.sort_running()
             
-            if gap <= crash_threshold and crash_check(car_b_time, car_a_time):
+            if gap <= config.crash_threshold and crash_check(car_b_time, car_a_time, ctx.rng.crashes, config):
                 # B crashed.
                 b_crashed = True
-                logging.debug(f"Car {car_b['car_number']} crashed out!")
+                logging.debug("Car %s crashed out!", car_b['car_number'])
                 car_b["health"] = 0
                 car_b["race_time"] = None
-                car_b["position"] = last_running(field)
-                field = update_positions(field)
+                with ctx.phase("position_sorting"):
+                    order.retire(car_b)
+                    order.sort_running()
             
             if a_crashed and b_crashed:
-                print(f"Oh now they've come together passing! {car_a['driver_name']} went too deep on the brakes and ran wide, collecting {car_b['driver_name']} with him! They're both out of the race!")
-                unsuccessful_passes += 1
-                crashes += 1
+                ctx.commentate("crash", "Oh now they've come together passing! {attacker_driver_name} went too deep on the brakes and ran wide, collecting {defender_driver_name} with him! They're both out of the race!",
+                               attacker_car_number=car_a['car_number'], attacker_driver_name=car_a['driver_name'], defender_car_number=car_b['car_number'], defender_driver_name=car_b['driver_name'], crashed=[car_a['car_number'], car_b['car_number']])
+                metrics.count("unsuccessful_passes")
+                metrics.count("crashes")
             elif b_crashed:
-                print(f"Look, {car_b['driver_name']} failed to defend from passing and ran wide! And they've spun across the outside of the track and hit the barrier! They're out of the race!")
-                unsuccessful_passes += 1
-                crashes += 1
+                ctx.commentate("crash", "Look, {defender_driver_name} failed to defend from passing and ran wide! And they've spun across the outside of the track and hit the barrier! They're out of the race!",
+                               attacker_car_number=car_a['car_number'], attacker_driver_name=car_a['driver_name'], defender_car_number=car_b['car_number'], defender_driver_name=car_b['driver_name'], crashed=[car_b['car_number']])
+                metrics.count("unsuccessful_passes")
+                metrics.count("crashes")
             elif a_crashed:
-                print(f"Oh no! {car_a['driver_name']} goes in too deep while passing! {car_b['driver_name']} squeezes them to the inside of the track! They've hit a sausage kerb and spun off! They're stuck, and that's the end of their race!")
-                unsuccessful_passes += 1
-                crashes += 1
+                ctx.commentate("crash", "Oh no! {attacker_driver_name} goes in too deep while passing! {defender_driver_name} squeezes them to the inside of the track! They've hit a sausage kerb and spun off! They're stuck, and that's the end of their race!",
+                               attacker_car_number=car_a['car_number'], attacker_driver_name=car_a['driver_name'], defender_car_number=car_b['car_number'], defender_driver_name=car_b['driver_name'], crashed=[car_a['car_number']])
+                metrics.count("unsuccessful_passes")
+                metrics.count("crashes")
             else:
                 # Run driver skills against each other if the threshold is close enough, whoever has the higher driver skill wins the pass.
-                if car_a['race_time'] - car_b['race_time'] < skill_threshold and car_a['driver_skill'] > car_b['driver_skill']:
+                if car_a['race_time'] - car_b['race_time'] < config.skill_threshold and car_a['driver_skill'] > car_b['driver_skill']:
                     # Car A makes the pass on skill.
-                    logging.debug(f"Car {car_b['car_number']} was passed by car {car_a['car_number']} on driver skill.")
+                    logging.debug("Car %s was passed by car %s on driver skill.", car_b['car_number'], car_a['car_number'])
                     car_a_pos = car_a["position"]
-                    car_a["position"] = car_b["position"]
-                    car_b["position"] = car_a_pos
-                    print(f"That's a classic crossover manuever by {car_a['driver_name']} in the {car_a['car_number']}! They've successfully passed {car_b['car_number']} for position {str(car_a_pos - 1)}!")
-                    field = update_positions(field)
-                    successful_passes += 1
+                    ctx.commentate("skill_pass", "That's a classic crossover manuever by {driver_name} in the {car_number}! They've successfully passed {passed_car_number} for position {position}!",
+                                   car_number=car_a['car_number'], driver_name=car_a['driver_name'], passed_car_number=car_b['car_number'], position=car_a_pos - 1)
+                    with ctx.phase("position_sorting"):
+                        order.sort_running()
+                    metrics.count("successful_passes")
                     pass_happened = True
                 else:
                     # Car B defends on skill.
-                    print(f"What a clean defense from passing by {car_b['driver_name']}! Absolutely textbook. {car_a['driver_name']} is still right behind, they might mount an attack into the next corner!")
-                    car_b["race_time"] = car_b["race_time"] + defender_penalty # Defender penalty.
-                    car_a["race_time"] = car_b["race_time"] + attacker_penalty # Attacker penalty.
-                    unsuccessful_passes += 1
+                    ctx.commentate("defense", "What a clean defense from passing by {driver_name}! Absolutely textbook. {attacker_driver_name} is still right behind, they might mount an attack into the next corner!",
+                                   car_number=car_b['car_number'], driver_name=car_b['driver_name'], attacker_car_number=car_a['car_number'], attacker_driver_name=car_a['driver_name'])
+                    car_b["race_time"] = car_b["race_time"] + config.defender_penalty # Defender penalty.
+                    car_a["race_time"] = car_b["race_time"] + config.attacker_penalty # Attacker penalty.
+                    metrics.count("unsuccessful_passes")
+        else:
+            # Gap closed up again since the pair was queued; nothing to do.
+            continue
+
         if pass_happened:
             # Check if we passed the next car ahead by the pass margin. If not, we apply the skill threshold as a penalty.
             # Get the current car and check the gap versus the next car in line.
-            next_car = get_position(field, car_a['position'] - 1)
+            next_car = order.at(car_a['position'] - 1)
             while next_car is not None:
-                if next_car['race_time'] - car_a['race_time'] > pass_threshold:
+                if next_car['race_time'] - car_a['race_time'] > config.pass_threshold:
                     # Extra pass on the next car.
-                    logging.debug(f"Car {car_b['car_number']} was passed by car {car_a['car_number']} on driver skill.")
+                    logging.debug("Car %s was passed by car %s on driver skill.", car_b['car_number'], car_a['car_number'])
                     car_a_pos = car_a["position"]
-                    car_a["position"] = next_car["position"]
-                    next_car["position"] = car_a_pos
-                    print(f"Wow, {car_a['driver_name']} is really picking up the pace, he managed to pass {next_car['driver_name']} as well that lap!")
-                    next_car = get_position(field, car_a['position'] - 1)
+                    order.swap(car_a_pos)
+                    ctx.commentate("extra_pass", "Wow, {driver_name} is really picking up the pace, he managed to pass {passed_driver_name} as well that lap!",
+                                   car_number=car_a['car_number'], driver_name=car_a['driver_name'], passed_car_number=next_car['car_number'], passed_driver_name=next_car['driver_name'], position=next_car['position'] - 1)
+                    next_car = order.at(car_a['position'] - 1)
                 else:
                     break
 
             
             if next_car is not None:
-                if next_car['race_time'] - car_a['race_time'] <= pass_threshold and next_car['race_time'] - car_a['race_time'] >= 0:
+                if next_car['race_time'] - car_a['race_time'] <= config.pass_threshold and next_car['race_time'] - car_a['race_time'] >= 0:
                     # Does not meet pass threshold.
-                    car_a['race_time'] = car_a['race_time'] - skill_threshold
-            logging.debug(f"order after pass:\n {get_current_order(field)}") # DEBUG
+                    car_a['race_time'] = car_a['race_time'] - config.skill_threshold
+            if debug:
+                logging.debug("order after pass:\n %s", get_current_order(field)) # DEBUG
+
+        # Queue whatever is now in contact behind this pair.
+        for contact in order.contacts(i + 1):
+            heapq.heappush(pending, contact)
 
-        # Else no pass occurred, and the field can be left alone.
-    
     return field
 
 
@@ -320,152 +329,325 @@ def run_pass_check(cars):
 # and if the track item is the end of a sector,
 # run the reliability checks.
 # Return the field of cars with the changed information.
-def run_track_item(cars, track_item, track_rating):
+#
+# If compiled (a CompiledTrack) and the item's index in it are given,
+# item times come from the cached per-car terms instead of item_time.
+def run_track_item(cars, track_item, track_rating, ctx=None, compiled=None, item_index=None):
+    if ctx is None:
+        ctx = default_context
 
-    global lead_changes
-    global retirements
+    debug = logging.root.isEnabledFor(logging.DEBUG)
+
+    recorder = ctx.recorder if item_index is not None else None
 
     # Step 1: Calculate the lap times after going through the corner.
-    for car in cars:
-        logging.debug(f"Car {car['car_number']} is going through the track item.")
-        if car["health"] > 0:
-            car_item_time = item_time(track_item, car)
-            logging.debug(f"Car {car['car_number']} has an item time of {str(car_item_time)}")
-            car["race_time"] = car["race_time"] + car_item_time
-            logging.debug(f"Car {car['car_number']} race time before passes = {car['race_time']}")
+    with ctx.phase("item_timing"):
+        for car in cars:
+            if debug:
+                logging.debug("Car %s is going through the track item.", car['car_number'])
+            if car["health"] > 0:
+                if compiled is None:
+                    car_item_time = item_time(track_item, car, ctx.rng.corners, ctx.config)
+                else:
+                    car_item_time = compiled.item_time(car, item_index, ctx.rng.corners)
+                car["race_time"] = car["race_time"] + car_item_time
+                if recorder is not None:
+                    recorder.record_item(ctx.lap, item_index, car["car_number"], car_item_time)
+                if debug:
+                    logging.debug("Car %s has an item time of %s", car['car_number'], car_item_time)
+                    logging.debug("Car %s race time before passes = %s", car['car_number'], car['race_time'])
     
     # Step 2: Run pass check through the field.
     #field = run_pass_check(cars)
 
     # Step 3: Reliability checks at end of lap.
     if track_item["is_lap_end"]:
-        # Per car, run the reliability check.
-        for car in cars:
-            logging.debug(f"Running reliability check for car {car['car_number']}.")
-            # Don't check cars that have already retired from the race.
-            if car["race_time"] is not None:
-                if reliability_check(car, track_rating):
-                    # Car failed. Update their health. Healths of zero = DNF.
-                    logging.debug(f"Car {car['car_number']} failed their reliability check, and has {car['health'] - 1} health remaining.")
-                    print(f"There's a commotion in the pit lane from the garage of car {car['car_number']}, it sounds like the engineers have spotted a mechanical breakdown on the car! Hopefully they can continue racing.")
-                    car["health"] = car["health"] - 1
-                    if car["health"] < 1:
-                        # Car retires.
-                        logging.debug(f"Car {car['car_number']} has retired from the race for mechanical failures.")
-                        print(f"We're hearing that car {car['car_number']} is retiring for a mechanical breakdown! They've pulled off to the side of the track, and the marshals are moving to remove the car. That must be so disappointing!")
-                        car["race_time"] = None
-                        if car["position"] == 1:
-                            lead_changes += 1
-                        car["position"] = last_running(cars)
-                        cars = update_positions(cars)
-                        retirements += 1
-                        logging.debug(f"retirements: {str(retirements)}")
+        with ctx.phase("reliability"):
+            # Per car, run the reliability check.
+            for car in cars:
+                if debug:
+                    logging.debug("Running reliability check for car %s.", car['car_number'])
+                # Don't check cars that have already retired from the race.
+                if car["race_time"] is not None:
+                    if reliability_check(car, track_rating, ctx.rng.reliability, ctx.config):
+                        cars = apply_breakdown(cars, car, ctx)
     
     # Step 4: Return the modified field.
     return cars
 
 
-# Run pit stops for the whole field.
-def run_pit_stops(cars):
+# Apply a failed reliability check to a car in the field.
+# Takes away one health, and retires the car if it has none left.
+# Return the field, re-sorted if the car had to retire.
+def apply_breakdown(cars, car, ctx=None):
+    if ctx is None:
+        ctx = default_context
+
+    # Car failed. Update their health. Healths of zero = DNF.
+    logging.debug("Car %s failed their reliability check, and has %s health remaining.", car['car_number'], car['health'] - 1)
+    ctx.commentate("breakdown", "There's a commotion in the pit lane from the garage of car {car_number}, it sounds like the engineers have spotted a mechanical breakdown on the car! Hopefully they can continue racing.",
+                   car_number=car['car_number'], health=car['health'] - 1)
+    car["health"] = car["health"] - 1
+    if car["health"] < 1:
+        # Car retires.
+        logging.debug("Car %s has retired from the race for mechanical failures.", car['car_number'])
+        ctx.commentate("retirement", "We're hearing that car {car_number} is retiring for a mechanical breakdown! They've pulled off to the side of the track, and the marshals are moving to remove the car. That must be so disappointing!",
+                       car_number=car['car_number'])
+        # Retirements in qualifying (lap 0) hand over no lead and stay out of the race metrics.
+        racing = ctx.lap > 0
+        if racing and car["position"] == 1:
+            ctx.metrics.count("lead_changes")
+        order = FieldOrder(cars)
+        car["race_time"] = None
+        with ctx.phase("position_sorting"):
+            order.retire(car)
+            # Cars tied on race time stay in the order they were handed in, as update_positions leaves them.
+            order.sort_running(ties=cars)
+        cars = order.cars
+        if racing:
+            ctx.metrics.count("retirements")
+            ctx.metrics.observe("retirement_lap", ctx.lap)
+            logging.debug("retirements: %s", ctx.metrics.counters["retirements"])
+
+    return cars
+
+
+# Run pit stops for the cars numbered in car_numbers, or the whole field if None.
+def run_pit_stops(cars, ctx=None, car_numbers=None):
+    if ctx is None:
+        ctx = default_context
+    config = ctx.config
+
     for car in cars:
-        if car['race_time'] is None:
+        if car['race_time'] is None or (car_numbers is not None and car['car_number'] not in car_numbers):
             continue
 
-        print(f"Now {car['driver_name']} is coming down the pit lane to his team! The number {car['car_number']} is coming for their pitstop!")
         # Take a single sample from a normal distribution of pit stop times.
-        pit_stop_time = np.random.normal(avg_pitstop_time, std_dev_pitstop_time, 1)[0]
-        # Apply max and mins to it.
-        if pit_stop_time <= min_pitstop_time:
-            print("Wow! The team has set an incredible pace in their garage, they're getting out early!")
-            pit_stop_time = min_pitstop_time
-        elif pit_stop_time >= max_pitstop_time:
-            print("Oh no! They've had an issue with a stuck center lock nut! This is going to be an incredibly long pitstop, they're going to lose so many positions for this!")
-            pit_stop_time = max_pitstop_time
-        # Now apply to the car's race time.
-        print(f"And now the {car['car_number']} team is sending their car out, with a pit stop time of {pit_stop_time} seconds!")
-        car['race_time'] = car['race_time'] + pit_stop_time
+        pit_stop(car, ctx.rng.pit_stops.gauss(config.avg_pitstop_time, config.std_dev_pitstop_time), ctx)
     
     return cars
 
 
+# Put one car through the pit lane: clamp a drawn pit stop time to the
+# league's limits and add it to the car's race time.
+def pit_stop(car, pit_stop_time, ctx):
+    config = ctx.config
+    ctx.commentate("pit_entry", "Now {driver_name} is coming down the pit lane to his team! The number {car_number} is coming for their pitstop!",
+                   car_number=car['car_number'], driver_name=car['driver_name'])
+    # Apply max and mins to it.
+    if pit_stop_time <= config.min_pitstop_time:
+        ctx.commentate("pit_fast", "Wow! The team has set an incredible pace in their garage, they're getting out early!", car_number=car['car_number'])
+        pit_stop_time = config.min_pitstop_time
+    elif pit_stop_time >= config.max_pitstop_time:
+        ctx.commentate("pit_slow", "Oh no! They've had an issue with a stuck center lock nut! This is going to be an incredibly long pitstop, they're going to lose so many positions for this!", car_number=car['car_number'])
+        pit_stop_time = config.max_pitstop_time
+    ctx.metrics.observe("pit_stop_time", pit_stop_time)
+    # Now apply to the car's race time.
+    ctx.commentate("pit_stop", "And now the {car_number} team is sending their car out, with a pit stop time of {pit_stop_time} seconds!",
+                   car_number=car['car_number'], pit_stop_time=pit_stop_time)
+    car['race_time'] = car['race_time'] + pit_stop_time
+
+
+# Add this lap's tyre wear to every running car: tyre_wear seconds for
+# each lap its current tyres have already done. pit_plans maps car
+# numbers to their pit laps.
+def run_tyre_wear(cars, lap, pit_plans, ctx):
+    from pit_strategy import tyre_age
+
+    for car in cars:
+        if car['race_time'] is not None:
+            car['race_time'] = car['race_time'] + ctx.config.tyre_wear * tyre_age(pit_plans[car['car_number']], lap)
+    return cars
+
+
+# Build the list of current standings for commentary:
+# each car's number, driver, position, race time and gap to the car ahead.
+def get_standings(field):
+    standings = []
+    for field_counter in range(len(field)):
+        current_car = field[field_counter]
+        standings.append({
+            "car_number": current_car['car_number'],
+            "driver_name": current_car['driver_name'],
+            "position": current_car['position'],
+            "race_time": current_car['race_time'],
+            "gap": 0.0 if current_car['race_time'] is None or field_counter == 0 else round(current_car['race_time'] - field[field_counter - 1]['race_time'], 2),
+        })
+    return standings
+
+
+# Format the end of lap standings block.
+# The standings are only listed between laps, not after the flag.
+def format_standings(lap, standings, final=False):
+    lines = [f"At the end of lap {lap}, the current standings are:"]
+    for car in ([] if final else standings):
+        lines.append(f"\tCar: {car['car_number']}")
+        lines.append(f"\t\tDriver: {car['driver_name']}")
+        lines.append(f"\t\tPosition: {car['position']}")
+        lines.append(f"\t\tRace time: {str(car['race_time'])}")
+        lines.append(f"\t\tGap: {str(car['gap'])}")
+    return "\n".join(lines)
+
+
+# Run a generator to the end and return its return value.
+def exhaust(generator):
+    while True:
+        try:
+            next(generator)
+        except StopIteration as stop:
+            return stop.value
+
+
+# Where a race stands between laps: the field, the last lap completed
+# and whether any pit stop has been run. The classic engine keeps the
+# field in running order. The vector engine keeps it in the order the
+# race started with, which its arrays are indexed by, so use each car's
+# "position" for the running order there.
+class RaceState:
+
+    __slots__ = ("field", "lap", "has_pitstop_occurred")
+
+    def __init__(self, field, lap=0, has_pitstop_occurred=False):
+        self.field = field
+        self.lap = lap
+        self.has_pitstop_occurred = has_pitstop_occurred
+
+
 # Given a field of entrants, populated,
 # and the track, run a race with the given
-# number of laps. 
-def run_race(cars, track, num_laps):
-    has_pitstop_occurred = False
-    field = cars
+# number of laps. Each car pits at the end of the laps its
+# strategy names (see pit_strategy).
+def run_race(cars, track, num_laps, ctx=None):
+    return exhaust(iter_race(cars, track, num_laps, ctx))
+
+
+# Generator form of run_race: yields the RaceState after every lap,
+# once that lap's events have gone to the sink, and returns the
+# finishing order. Given a state, the race carries on from it and
+# cars is ignored.
+def iter_race(cars, track, num_laps, ctx=None, state=None):
+    from compiled_track import compile_track
+    from pit_strategy import pit_schedule, pit_strategies
+
+    if ctx is None:
+        ctx = default_context
+    if state is None:
+        state = RaceState(cars)
+
+    compiled = compile_track(track, ctx.config)
+
+    field = state.field
+    pit_plans = pit_strategies(field, num_laps)
+    schedule = pit_schedule(pit_plans)
     # For each lap...
-    for i in range(1, num_laps + 1):
-        print(f"\nIt's now lap {i} here at the Grand Prix!")
-        logging.info(f"Running lap {str(i)}/{str(num_laps)}")
+    for i in range(state.lap + 1, num_laps + 1):
+        if ctx.profiler is not None:
+            lap_started = time.perf_counter()
+        ctx.lap = i
+        ctx.commentate("lap_start", "\nIt's now lap {lap} here at the Grand Prix!", lap=i)
+        logging.info("Running lap %s/%s", i, num_laps)
         # For each track element...
-        for track_item in track["items"].keys():
-            logging.debug(f"Running track element {str(track_item)}.")
+        for item_index, track_item in enumerate(compiled.items):
+            logging.debug("Running track element %s.", compiled.item_ids[item_index])
             # Run the track element.
-            field = run_track_item(field, track["items"][track_item], track["reliability_rating"])
+            field = run_track_item(field, track_item, compiled.reliability_rating, ctx, compiled, item_index)
         
-        # Check if we're at the halfway point, and if so, run the pitstop.
-        if i > num_laps / 2 and not has_pitstop_occurred:
-            field = run_pit_stops(field)
-            has_pitstop_occurred = True
+        if ctx.config.tyre_wear:
+            field = run_tyre_wear(field, i, pit_plans, ctx)
+
+        # Run the pit stops of every car whose strategy has it pitting this lap.
+        if i in schedule:
+            with ctx.phase("pit_stops"):
+                field = run_pit_stops(field, ctx, schedule[i])
+            state.has_pitstop_occurred = True
 
         # At the end of the lap, run pass checks.
-        field = run_pass_check(field)
+        with ctx.phase("pass_resolution"):
+            field = run_pass_check(field, ctx)
         if negative_gap_exists(field):
             logging.error("Negative gap!")
+        if ctx.recorder is not None:
+            ctx.recorder.record_lap(i, field)
+
+        if ctx.sink is not None:
+            ctx.commentate("lap_complete", format_standings, lap=i, standings=get_standings(field), final=i == num_laps)
 
-        print(f"At the end of lap {i}, the current standings are:")
-        field_counter = 0
-        if i != num_laps:
-            while field_counter < len(field):
-                current_car = field[field_counter]
-                print(f"\tCar: {current_car['car_number']}")
-                print(f"\t\tDriver: {current_car['driver_name']}")
-                print(f"\t\tPosition: {current_car['position']}")
-                print(f"\t\tRace time: {str(current_car['race_time'])}")
-                print(f"\t\tGap: {'0.0' if current_car['race_time'] is None or field_counter == 0 else str(round(current_car['race_time'] - field[field_counter - 1]['race_time'], 2))}")
-                field_counter += 1
+        if ctx.profiler is not None:
+            ctx.profiler.record_lap(time.perf_counter() - lap_started)
+        state.field = field
+        state.lap = i
+        yield state
 
     
     # Once the race is over, return the field and get their finishing order.
     logging.info("Race over.")
-    return update_positions(field)
+    with ctx.phase("position_sorting"):
+        return update_positions(field, ctx.rng.ordering)
 
 
 # Given a field of entrants, run qualifying.
-# Everyone gets one lap, each run separately,
-# and we determine starting position based on this lap.
-# Return a dictionary of cars and spots to
-# be used to assess the starting time penalties.
-def run_qualifying(cars, track):
-    # Run each car in a field on its own through one lap and save the laptime.
+# Every car runs qualifying_runs laps on its own and its best lap sets
+# its starting position. All laps come from the compiled track's
+# (cars x items) matrix of static time terms in one pass over the field,
+# and the grid is a single sort of the lap times. A car that retires
+# sets no more laps and lines up behind every car still running.
+# Return a dictionary of car numbers to starting positions
+# to be used to assess the starting time penalties.
+def run_qualifying(cars, track, ctx=None):
+    from compiled_track import compile_track
+
+    if ctx is None:
+        ctx = default_context
+
+    compiled = compile_track(track, ctx.config)
+    terms = [compiled.car_terms(car) for car in cars]
+    base_times = compiled.base_times
+    randint, low, high = ctx.rng.corners.randint, compiled.rng_low, compiled.rng_high
+
+    # Run each car on its own and save its best laptime.
     qualy_laps = {}
-    for car in cars:
-        logging.debug("Qualifying car:\n" + str(car))
-        for track_item in track["items"].keys():
-            # Run the track element.
-            field = run_track_item([car], track["items"][track_item], 1) # No breakdowns in qualy.
-            logging.debug("Current time for car: " + str(field[0]["race_time"]))
-            qualy_laps[field[0]["car_number"]] = field[0]["race_time"]
-        logging.debug("Final time for current car: " + str(qualy_laps[field[0]["car_number"]]))
-        print(f"And car {car['car_number']} just set a laptime of {str(qualy_laps[field[0]['car_number']])}!")
-    
-    # Next go across the laptimes and assign starting orders.
-    logging.debug("Field results =\n" + str(qualy_laps))
-    results = {}
-    position_counter = 1
-    while len(qualy_laps) > 0:
-        next_car = min(qualy_laps, key=qualy_laps.get)
-        results[next_car] = position_counter
-        logging.debug(f"Car position {str(position_counter)} = {next_car}")
-        del qualy_laps[next_car]
-        position_counter += 1
-    
+    for car, car_terms in zip(cars, terms):
+        logging.debug("Qualifying car:\n%s", car)
+        best_lap = None
+        start_time = car["race_time"]
+        for _ in range(ctx.config.qualifying_runs):
+            lap_time = start_time
+            for base_time, term in zip(base_times, car_terms):
+                lap_time += base_time + (term * (randint(low, high) / 10.0))
+            # Reliability is checked against a rating of 1 in qualy, so breakdowns are rare.
+            for _ in compiled.lap_end_indexes:
+                if reliability_check(car, 1, ctx.rng.reliability, ctx.config):
+                    apply_breakdown([car], car, ctx)
+                    if car["health"] < 1:
+                        break
+            if best_lap is None or lap_time < best_lap:
+                best_lap = lap_time
+            if car["health"] < 1:
+                break
+        car["race_time"] = best_lap
+        qualy_laps[car["car_number"]] = best_lap
+        logging.debug("Final time for current car: %s", best_lap)
+        ctx.commentate("qualifying_lap", "And car {car_number} just set a laptime of {lap_time}!", car_number=car['car_number'], lap_time=best_lap)
+
+    # Next sort the laptimes into starting orders, retired cars last. Ties keep the entry order.
+    logging.debug("Field results =\n%s", qualy_laps)
+    retired = {car["car_number"] for car in cars if car["health"] < 1}
+    grid = sorted(qualy_laps, key=lambda car_number: (car_number in retired, qualy_laps[car_number]))
+    results = {car_number: position for position, car_number in enumerate(grid, 1)}
+
     # Return the dict of car numbers to starting order.
-    logging.debug("Qualifying results =\n" + str(results))
+    logging.debug("Qualifying results =\n%s", results)
     return results
 
 
+# Format the starting grid announcement after qualifying.
+def format_grid(grid):
+    lines = ["There were some impressive laps set out there in qualifying today, hopefully they translate to some exciting racing! Your field for today's race:"]
+    for car in grid:
+        lines.append(f"\tCar #: {str(car['car_number'])}\n\t\tDriver: {car['driver_name']}\n\t\tPosition: {str(car['position'])}")
+    return "\n".join(lines)
+
+
 # Run a race weekend.
 # Given a list of cars and the track,
 # populate the extra car fields,
@@ -473,117 +655,173 @@ def run_qualifying(cars, track):
 # apply the qualifying start time penalties,
 # run the race,
 # and output the results.
-def run_race_weekend(cars, track, num_laps):
-    # Populate the fields for the cars.
+#
+# engine picks how the race itself is run: "classic" walks the field
+# car by car, "vector" runs whole track items as NumPy array operations.
+# If ctx has a profiler, its report is finished (and written out, if it
+# has a report_path) once the race is over.
+def run_race_weekend(cars, track, num_laps, engine="classic", ctx=None):
+    return exhaust(iter_race_weekend(cars, track, num_laps, engine, ctx))
+
+
+# Generator form of run_race_weekend: qualifying runs on the first next(),
+# then the race yields its RaceState after every lap. Returns the
+# finishing order.
+def iter_race_weekend(cars, track, num_laps, engine="classic", ctx=None):
+    from compiled_track import compile_track
+
+    if engine not in ("classic", "vector"):
+        raise ValueError(f"Unknown race engine: {engine}")
+    if ctx is None:
+        ctx = default_context
+
+    # Compile the track once; qualifying and the race share its cached per-car terms.
+    track = compile_track(track, ctx.config)
+
+    # Populate the fields for the cars. A car may bring its own
+    # starting_health, e.g. damage carried over from the last round of a season.
     for car in cars:
         car["race_time"] = 0.0
         car["position"] = 0
-        car["health"] = starting_health
+        car["health"] = car.get("starting_health") or ctx.config.starting_health
 
     logging.info("Running qualifying.")
-    print("We're down here now on the pit wall, waiting for the first car to go out. Looks like they're waving the first, so we're now starting qualifying!\n")
-    qualy_results = run_qualifying(cars, track)
-
-    # For each car in qualy results, set their starting race_time and position.
-    for qualified_car in qualy_results.keys():
-        # Find the matching car by the number.
-        for car in cars:
-            if qualified_car == car["car_number"]:
-                car["position"] = qualy_results[qualified_car]
-                car["race_time"] = (start_penalty * qualy_results[qualified_car]) - start_penalty # Quarter-second penalty for each position off pole at start.
+    ctx.lap = 0
+    ctx.commentate("qualifying_start", "We're down here now on the pit wall, waiting for the first car to go out. Looks like they're waving the first, so we're now starting qualifying!\n")
+    with ctx.phase("qualifying"):
+        if engine == "vector":
+            from vector_engine import run_qualifying_vectorized
+            qualy_results = run_qualifying_vectorized(cars, track, ctx)
+        else:
+            qualy_results = run_qualifying(cars, track, ctx)
 
-    logging.debug("Field after qualifying:\n" + str(cars))
-    print("There were some impressive laps set out there in qualifying today, hopefully they translate to some exciting racing! Your field for today's race:")
+    # For each car, set their starting race_time and position from the qualy results.
+    # A car that retired in qualifying starts the race as a DNF.
     for car in cars:
-        print(f"\tCar #: {str(car['car_number'])}\n\t\tDriver: {car['driver_name']}\n\t\tPosition: {str(car['position'])}")
+        car["position"] = qualy_results[car["car_number"]]
+        car["race_time"] = (ctx.config.start_penalty * car["position"]) - ctx.config.start_penalty # Quarter-second penalty for each position off pole at start.
+        if car["health"] < 1:
+            car["race_time"] = None
+
+    logging.debug("Field after qualifying:\n%s", cars)
+    if ctx.sink is not None:
+        grid = [{"car_number": car['car_number'], "driver_name": car['driver_name'], "position": car['position']} for car in cars]
+        ctx.commentate("grid", format_grid, grid=grid)
 
     # Now that the cars are set up with their qualifying results, run the race.
     logging.info("Running race.")
-    print("\nNow let's get down to the starting grid! The cars are lined up, and we're almost ready to drop the green flag!")
-    return run_race(cars, track, num_laps)
+    ctx.commentate("race_start", "\nNow let's get down to the starting grid! The cars are lined up, and we're almost ready to drop the green flag!")
+    if engine == "vector":
+        from vector_engine import iter_race_vectorized
+        race_results = yield from iter_race_vectorized(cars, track, num_laps, ctx=ctx)
+    else:
+        race_results = yield from iter_race(cars, track, num_laps, ctx)
+
+    # Hand over the timing report if the weekend was profiled.
+    if ctx.profiler is not None:
+        report = ctx.profiler.finish()
+        # Only pay for encoding the report when it will be logged.
+        if logging.root.isEnabledFor(logging.INFO):
+            logging.info("Profile report:\n%s", json.dumps(report))
+    return race_results
+
+
+# Load one of the input files with load, exiting with a message if it
+# doesn't exist, isn't JSON or doesn't match its schema. name is the input
+# it came from and kind what it should hold, for the messages.
+def load_input_file(load, filepath, name, kind):
+    try:
+        return load(filepath)
+    except FileNotFoundError:
+        logging.critical(f"{name} file does not exist! Exiting.")
+        sys.exit(-1)
+    except json.JSONDecodeError as jde:
+        logging.critical(f"{name} file could not be parsed as JSON! Exiting.")
+        logging.error(jde.msg)
+        sys.exit(-1)
+    except SchemaError as error:
+        logging.critical(f"{name} file is not a valid {kind} file! Exiting.")
+        logging.error(error)
+        print(error)
+        sys.exit(-1)
+
+
+# Estimated race time in seconds from the car ratings, pit stop and start penalties.
+def estimate_race_time(cars, track, num_laps):
+    from estimator import estimate_race
+
+    return estimate_race(cars, track, num_laps).race_time()
 
 
 # Managing function to run everything. 
-# Gets input from the user,
+# Takes the inputs given on the command line in args (see parse_args),
+# asks the user for any that are missing,
 # reads the input files,
 # calls run_race_weekend.
-def main():
-    print("Welcome to the IKMO race weekend calculator!")
-
-    global lead_changes
-    global retirements
-    global successful_passes
-    global unsuccessful_passes
-    global crashes
+def main(args=None):
+    if args is None:
+        args = parse_args([])
 
+    # A quick estimate needs no log, race context or prompts.
+    if args.estimate:
+        cars = load_input_file(load_cars_file, args.cars, "car_path", "car")
+        track = load_input_file(load_track_file, args.track, "track_path", "track")
+        print(f"The estimated race time is {str(estimate_race_time(cars, track, args.laps) / 60.0)} minutes long.")
+        return
 
-    successful_passes = 0
-    unsuccessful_passes = 0
-    lead_changes = 0
-    crashes = 0
-    retirements = 0
+    print("Welcome to the IKMO race weekend calculator!")
 
-    logging.basicConfig(filename='log.txt', filemode='w', format='%(levelname)s: %(message)s')
+    logging.basicConfig(filename=args.log, filemode='w', format='%(levelname)s: %(message)s')
 
     # Print introductory messages and get the files.
     logging.info("Initializing calculator, printing welcome messages.")
 
-    random.seed()
+    # Every race gets its own seed, logged so it can be replayed.
+    ctx = RaceContext(sink=print_sink, rng=RaceRNG(args.seed))
+    logging.info("Race seed: %s", ctx.rng.seed)
 
-    logging.debug("Getting user input for car_path.")
-    car_path = input("Please type the filepath to the JSON file where the cars are saved.")
+    car_path = args.cars
+    if car_path is None:
+        logging.debug("Getting user input for car_path.")
+        car_path = input("Please type the filepath to the JSON file where the cars are saved.")
     logging.debug(f"car_path = {str(car_path)}")
 
-    logging.debug("Getting user input for track_path.")
-    track_path = input("please type the filepath to the JSON file where the track is saved.")
+    track_path = args.track
+    if track_path is None:
+        logging.debug("Getting user input for track_path.")
+        track_path = input("please type the filepath to the JSON file where the track is saved.")
     logging.debug(f"track_path = {str(track_path)}")
 
     # Load the cars and track.
-    try:
-        cars = read_json_file(car_path)
-    except FileNotFoundError:
-        logging.critical("car_path file does not exist! Exiting.")
-        sys.exit(-1)
-    except json.JSONDecodeError as jde:
-        logging.critical("car_path file could not be parsed as JSON! Exiting.")
-        logging.error(jde.msg)
-        sys.exit(-1)
-    
-    try:
-        track = read_json_file(track_path)
-    except FileNotFoundError:
-        logging.critical("track_path file does not exist! Exiting.")
-        sys.exit(-1)
-    except json.JSONDecodeError as jde:
-        logging.critical("track_path file could not be parsed as JSON! Exiting.")
-        logging.error(jde.msg)
-        sys.exit(-1)
+    cars = load_input_file(load_cars_file, car_path, "car_path", "car")
+    track = load_input_file(load_track_file, track_path, "track_path", "track")
 
     # Get the number of laps to run.
+    num_laps = args.laps
     continue_check = False
     while not continue_check:
-        try:
-            logging.info("Fetching number of laps from user.")
-            user_input = input("Please type the number of laps you'd like to race.")
-            num_laps = int(user_input)
-            logging.debug(f"User put in {str(num_laps)} as integer input.")
-        except ValueError:
-            logging.info("User put in a value that was not parsable as an integer.")
-            logging.debug(f"User input: {user_input}")
-            print("Please try again. Only insert whole integer numbers.")
-            continue
+        if num_laps is None:
+            try:
+                logging.info("Fetching number of laps from user.")
+                user_input = input("Please type the number of laps you'd like to race.")
+                num_laps = int(user_input)
+                logging.debug(f"User put in {str(num_laps)} as integer input.")
+            except ValueError:
+                logging.info("User put in a value that was not parsable as an integer.")
+                logging.debug(f"User input: {user_input}")
+                print("Please try again. Only insert whole integer numbers.")
+                continue
         
-        # Estimate a race time.
-        lap_time_estimate = 0
-        logging.info("Estimating lap time.")
-        for item_id in track["items"].keys():
-            logging.debug(f"Track item {str(item_id)} base_time: {str(track['items'][item_id]['base_time'])}")
-            lap_time_estimate += track["items"][item_id]["base_time"]
-            logging.debug(f"Total time so far: {str(lap_time_estimate)}")
-        lap_time_estimate *= num_laps
+        # Estimate a race time from the car ratings, pit stop and start penalties.
+        logging.info("Estimating race time.")
+        lap_time_estimate = estimate_race_time(cars, track, num_laps)
         logging.info(f"Total race estimate: {str(lap_time_estimate)}")
 
-        is_good = input(f"The estimated race time is {str(lap_time_estimate / 60.0)} minutes long.\nWould you like to continue with this time? (yes/no)")
+        if args.yes:
+            print(f"The estimated race time is {str(lap_time_estimate / 60.0)} minutes long.")
+            is_good = "yes"
+        else:
+            is_good = input(f"The estimated race time is {str(lap_time_estimate / 60.0)} minutes long.\nWould you like to continue with this time? (yes/no)")
         logging.debug(f"User input for confirmation: {is_good}")
         if "yes" in is_good.lower():
             continue_check = True
@@ -591,12 +829,13 @@ def main():
             logging.info(f"User confirmed number of laps at {str(num_laps)}")
         else:
             logging.info(f"User denied number of laps at {str(num_laps)}")
+            num_laps = None
 
     # Run the race weekend.
     logging.info(f"Running race weekend.")
 
     print("Let's go down to the track now, live with Kerbin World News' World of Sports!")
-    race_results = run_race_weekend(cars, track, num_laps)
+    race_results = run_race_weekend(cars, track, num_laps, engine=args.engine, ctx=ctx)
 
     print("Wow, that was an exciting race! Let's go to the results now.")
     for car in race_results:
@@ -607,13 +846,49 @@ def main():
         print(f"\t\tPosition: {car['position']}")
         print(f"\t\tRace time: {car['race_time']}")
     print("Incredible! Now for the race statistics.")
-    print(f"\tSuccessful passes: {successful_passes}")
-    print(f"\tUnsuccessful passes: {unsuccessful_passes}")
-    print(f"\tLead changes: {lead_changes}")
-    print(f"\tCrashes: {crashes}")
-    print(f"\tRetirements: {retirements}")
+    statistics = ctx.metrics.statistics()
+    print(f"\tSuccessful passes: {statistics['successful_passes']}")
+    print(f"\tUnsuccessful passes: {statistics['unsuccessful_passes']}")
+    print(f"\tLead changes: {statistics['lead_changes']}")
+    print(f"\tCrashes: {statistics['crashes']}")
+    print(f"\tRetirements: {statistics['retirements']}")
     logging.info("Race results:\n" + str(race_results))
 
 
+
+# Every input can be given on the command line; anything left out is
+# asked for interactively, so running with no arguments works as before.
+# Only the race engine itself is imported up front, so a scripted race or
+# an --estimate starts in tens of milliseconds. python -m main starts a
+# little faster still than python main.py, which Python compiles from
+# source on every run instead of using the cached bytecode:
+#   python -m main cars.txt track.txt 30 --estimate
+#   python -m main cars.txt track.txt 30 --yes --seed 42 --engine vector
+def parse_args(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run an IKMO race weekend, or just estimate its race time.")
+    parser.add_argument("cars", nargs="?", default=None, help="JSON file where the cars are saved.")
+    parser.add_argument("track", nargs="?", default=None, help="JSON file where the track is saved.")
+    parser.add_argument("laps", nargs="?", type=int, default=None, help="Number of laps to race.")
+    parser.add_argument("-y", "--yes", action="store_true", help="Race without asking to confirm the estimated race time.")
+    parser.add_argument("--estimate", action="store_true", help="Only print the estimated race time; needs cars, track and laps.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the race, to replay one (default: a fresh one).")
+    parser.add_argument("--engine", choices=("classic", "vector"), default="classic", help="Race engine to use.")
+    parser.add_argument("--log", default="log.txt", help="File to write the race log to.")
+    args = parser.parse_args(argv)
+    if args.estimate and args.laps is None:
+        parser.error("--estimate needs the cars, track and laps.")
+    return args
+
+
+def run_cli(argv=None):
+    main(parse_args(sys.argv[1:] if argv is None else argv))
+
+
 if __name__ == "__main__":
-    main()
+    # Run as a script, this file is the __main__ module, while everything
+    # it hands the race to imports it again as main. Run the CLI from that
+    # copy so there is only one of each function, constant and default_context.
+    import main as race_main
+    race_main.run_cli()
@@ -0,0 +1,160 @@
+import bisect
+import json
+
+
+# Per-race metrics.
+# The race statistics used to be module globals in main.py, bumped through
+# global statements and reset by hand before every weekend, so two races
+# in one process trampled each other and nothing survived past the run.
+# Each RaceContext now carries its own RaceMetrics: a handful of counters
+# plus fixed-bucket histograms of the gaps at pass attempts, the laps cars
+# retire on and the pit stop times. Recording is an integer add and, for a
+# histogram, one bisect, so it can stay on in every run.
+#
+# Metrics from any number of races, threads or worker processes add up
+# with merge, and the total can be written out as JSON or in the
+# Prometheus text format.
+
+
+# Counters every race keeps; statistics() reports them under these names.
+COUNTERS = ("successful_passes", "unsuccessful_passes", "lead_changes", "crashes", "retirements")
+
+# Histograms every race keeps and the upper bounds of their buckets.
+# Each histogram also has a last bucket catching everything above.
+HISTOGRAMS = {
+    "pass_attempt_gap": (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 1.0, 2.0, 5.0), # seconds between the cars when a pass is tried
+    "retirement_lap": (1, 2, 5, 10, 20, 50, 100, 200, 500), # lap a car retired on with mechanical failures
+    "pit_stop_time": (30.0, 35.0, 40.0, 45.0, 50.0, 55.0, 60.0, 65.0, 70.0, 75.0), # seconds spent in the pits
+}
+
+# What each metric measures, for the Prometheus HELP lines.
+DESCRIPTIONS = {
+    "successful_passes": "Passes made, clean or on driver skill.",
+    "unsuccessful_passes": "Pass attempts that were defended or ended in a crash.",
+    "lead_changes": "Times the leader retired and handed over the lead.",
+    "crashes": "Pass attempts that ended in a crash.",
+    "retirements": "Cars retired with mechanical failures.",
+    "pass_attempt_gap": "Seconds between attacker and defender at a pass attempt.",
+    "retirement_lap": "Lap a car retired on with mechanical failures.",
+    "pit_stop_time": "Pit stop time in seconds.",
+}
+
+
+# Counts of observed values over fixed buckets, plus their sum.
+class Histogram:
+
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    # Add one value; it lands in the first bucket whose bound it doesn't exceed.
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def count(self):
+        return sum(self.counts)
+
+    def mean(self):
+        count = self.count()
+        return self.total / count if count else 0.0
+
+    # Add another histogram with the same buckets into this one.
+    def merge(self, other):
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets.")
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        return {"bounds": list(self.bounds), "counts": list(self.counts), "sum": self.total}
+
+    @classmethod
+    def from_dict(cls, histogram_dict):
+        histogram = cls(histogram_dict["bounds"])
+        histogram.counts = list(histogram_dict["counts"])
+        histogram.total = histogram_dict["sum"]
+        return histogram
+
+
+class RaceMetrics:
+
+    __slots__ = ("races", "counters", "histograms")
+
+    # races is how many races these metrics cover: one for a race's own
+    # metrics, zero for an empty total to merge others into.
+    def __init__(self, races=1):
+        self.races = races
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {name: Histogram(bounds) for name, bounds in HISTOGRAMS.items()}
+
+    # Add amount to a counter.
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    # Add a value to a histogram.
+    def observe(self, name, value):
+        self.histograms[name].observe(value)
+
+    # The counters as a dictionary, the race statistics of a SimulationResult.
+    def statistics(self):
+        return dict(self.counters)
+
+    # Add another RaceMetrics into this one. Returns self.
+    def merge(self, other):
+        self.races += other.races
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, histogram in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(histogram)
+            else:
+                self.histograms[name] = Histogram(histogram.bounds).merge(histogram)
+        return self
+
+    def to_dict(self):
+        return {
+            "races": self.races,
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, metrics_dict):
+        metrics = cls(metrics_dict["races"])
+        metrics.counters.update(metrics_dict["counters"])
+        for name, histogram_dict in metrics_dict["histograms"].items():
+            metrics.histograms[name] = Histogram.from_dict(histogram_dict)
+        return metrics
+
+    # The metrics in the Prometheus text exposition format, every name
+    # starting with prefix. Counters become _total counters, histograms
+    # get cumulative le buckets plus _sum and _count.
+    def to_prometheus(self, prefix="race_"):
+        lines = [f"# HELP {prefix}races_total Races these metrics cover.", f"# TYPE {prefix}races_total counter", f"{prefix}races_total {self.races}"]
+        for name, value in self.counters.items():
+            metric = f"{prefix}{name}_total"
+            lines += [f"# HELP {metric} {DESCRIPTIONS.get(name, name)}", f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, histogram in self.histograms.items():
+            metric = f"{prefix}{name}"
+            lines += [f"# HELP {metric} {DESCRIPTIONS.get(name, name)}", f"# TYPE {metric} histogram"]
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {histogram.total}", f"{metric}_count {cumulative}"]
+        return "\n".join(lines) + "\n"
+
+
+# Write metrics to filepath: Prometheus text for a .prom file, JSON otherwise.
+def write_metrics(metrics, filepath):
+    with open(filepath, "w") as metrics_file:
+        if filepath.endswith(".prom"):
+            metrics_file.write(metrics.to_prometheus())
+        else:
+            json.dump(metrics.to_dict(), metrics_file, indent=2)
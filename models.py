@@ -0,0 +1,150 @@
+import json
+
+
+# Compact, slotted car and track representations.
+# Loaded from the same JSON schema as cars.txt and track.txt, but without
+# a per-object dict: a Car takes well under half the memory of the
+# equivalent dict, which matters when holding many simulated fields at once,
+# and car.power is a faster lookup than car["power"].
+#
+# Every class here also answers car["power"] / car["race_time"] = ...
+# style item access by mapping keys onto attributes, so Car, Track and
+# TrackItem objects can be passed straight to the existing dict-based
+# simulation functions: simulate() gives the same results for them as
+# for the dicts they were loaded from. That adapter is slower than a real
+# dict lookup; new code should use the attributes. The loaders and CLIs
+# still hand out plain dicts, so nothing in the tree races these models
+# unless a caller builds them with load_cars or the read_*_file functions.
+
+
+# Mixin giving slotted classes read/write item access by attribute name.
+# Like a dict, reading a key that isn't set raises KeyError.
+class SlotMapping:
+
+    __slots__ = ()
+
+    __setitem__ = object.__setattr__
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+# One entrant. The first seven slots come from the car JSON, as do the
+# optional pit_laps strategy and starting_health; race_time, position
+# and health are filled in by run_race_weekend.
+class Car(SlotMapping):
+
+    __slots__ = ("team_name", "driver_name", "driver_skill", "car_number", "handling", "power", "reliability", "pit_laps", "starting_health", "race_time", "position", "health")
+
+    def __init__(self, team_name, driver_name, driver_skill, car_number, handling, power, reliability):
+        self.team_name = team_name
+        self.driver_name = driver_name
+        self.driver_skill = driver_skill
+        self.car_number = car_number
+        self.handling = handling
+        self.power = power
+        self.reliability = reliability
+
+    @classmethod
+    def from_dict(cls, car_dict):
+        car = cls(car_dict["team_name"], car_dict["driver_name"], car_dict["driver_skill"], car_dict["car_number"],
+                  car_dict["handling"], car_dict["power"], car_dict["reliability"])
+        for key in ("pit_laps", "starting_health", "race_time", "position", "health"):
+            if key in car_dict:
+                setattr(car, key, car_dict[key])
+        return car
+
+
+# One corner, straight or other element of a track.
+class TrackItem(SlotMapping):
+
+    __slots__ = ("base_time", "name", "power", "handling", "is_lap_end")
+
+    def __init__(self, base_time, name, power, handling, is_lap_end):
+        self.base_time = base_time
+        self.name = name
+        self.power = power
+        self.handling = handling
+        self.is_lap_end = is_lap_end
+
+    @classmethod
+    def from_dict(cls, item_dict):
+        return cls(item_dict["base_time"], item_dict["name"], item_dict["power"], item_dict["handling"], item_dict["is_lap_end"])
+
+
+# A track: its reliability rating plus its items in lap order,
+# keyed by item id like the "items" object in track.txt.
+class Track(SlotMapping):
+
+    __slots__ = ("reliability_rating", "items")
+
+    def __init__(self, reliability_rating, items):
+        self.reliability_rating = reliability_rating
+        self.items = items
+
+    @classmethod
+    def from_dict(cls, track_dict):
+        items = {item_id: TrackItem.from_dict(item) for item_id, item in track_dict["items"].items()}
+        return cls(track_dict["reliability_rating"], items)
+
+    def to_dict(self):
+        return {
+            "reliability_rating": self.reliability_rating,
+            "items": {item_id: item.to_dict() for item_id, item in self.items.items()},
+        }
+
+
+# Convert a parsed car list into Car objects.
+def load_cars(car_dicts):
+    return [Car.from_dict(car_dict) for car_dict in car_dicts]
+
+
+# Read a car JSON file straight into Car objects.
+#
+# Raises json.JSONDecodeError if file cannot be read as JSON.
+# Raises IOError if no such file exists.
+def read_cars_file(filepath):
+    with open(filepath) as info_file:
+        return load_cars(json.load(info_file))
+
+
+# Read a track JSON file straight into a Track.
+#
+# Raises json.JSONDecodeError if file cannot be read as JSON.
+# Raises IOError if no such file exists.
+def read_track_file(filepath):
+    with open(filepath) as info_file:
+        return Track.from_dict(json.load(info_file))
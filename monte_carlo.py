@@ -0,0 +1,154 @@
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from loaders import load_cars_file, load_track_file
+from metrics import COUNTERS, RaceMetrics, write_metrics
+from race_rng import RaceRNG
+from simulation import simulate
+
+
+# Monte Carlo championship odds.
+# Runs many independent, seeded race weekends across worker processes
+# and merges every car's finishing-position histogram and the race
+# metrics. Each weekend is a silent simulate() call on its own copy
+# of the field, so workers never share state.
+
+
+# Merged output of a batch of race weekends.
+# histograms maps car number -> list of finish counts, index 0 being P1.
+# race_time_sums and finishes add up each car's race times when it finished.
+# metrics is the RaceMetrics of every weekend merged together.
+class ChampionshipOdds:
+
+    def __init__(self, car_numbers, field_size):
+        self.num_weekends = 0
+        self.histograms = {car_number: [0] * field_size for car_number in car_numbers}
+        self.race_time_sums = {car_number: 0.0 for car_number in car_numbers}
+        self.finishes = {car_number: 0 for car_number in car_numbers}
+        self.statistics = {key: 0 for key in COUNTERS}
+        self.metrics = RaceMetrics(races=0)
+
+    # Record one weekend's finishing order, statistics and, if given, metrics.
+    def add_weekend(self, results, statistics, metrics=None):
+        self.num_weekends += 1
+        for car in results:
+            self.histograms[car["car_number"]][car["position"] - 1] += 1
+            if car["race_time"] is not None:
+                self.race_time_sums[car["car_number"]] += car["race_time"]
+                self.finishes[car["car_number"]] += 1
+        for key, value in statistics.items():
+            self.statistics[key] += value
+        if metrics is not None:
+            self.metrics.merge(metrics)
+
+    # Fold another batch's counts into this one.
+    def merge(self, other):
+        self.num_weekends += other.num_weekends
+        for car_number, counts in other.histograms.items():
+            merged = self.histograms[car_number]
+            for i, count in enumerate(counts):
+                merged[i] += count
+        for car_number, race_time_sum in other.race_time_sums.items():
+            self.race_time_sums[car_number] += race_time_sum
+            self.finishes[car_number] += other.finishes[car_number]
+        for key, value in other.statistics.items():
+            self.statistics[key] += value
+        self.metrics.merge(other.metrics)
+        return self
+
+    # Probability of each car finishing in each position.
+    def probabilities(self):
+        if self.num_weekends == 0:
+            return {car_number: [0.0] * len(counts) for car_number, counts in self.histograms.items()}
+        return {car_number: [count / self.num_weekends for count in counts] for car_number, counts in self.histograms.items()}
+
+    # Each car's average race time over the weekends it finished, or None if it never did.
+    def mean_race_times(self):
+        return {car_number: self.race_time_sums[car_number] / finishes if finishes else None for car_number, finishes in self.finishes.items()}
+
+    # Average of each race statistic per weekend.
+    def mean_statistics(self):
+        if self.num_weekends == 0:
+            return {key: 0.0 for key in self.statistics}
+        return {key: value / self.num_weekends for key, value in self.statistics.items()}
+
+
+# Worker entry point: run one chunk of seeded weekends.
+def run_weekend_batch(cars, track, num_laps, seeds, engine, config=None):
+    odds = ChampionshipOdds([car["car_number"] for car in cars], len(cars))
+    for seed in seeds:
+        result = simulate(cars, track, num_laps, seed=seed, engine=engine, config=config)
+        odds.add_weekend(result.results, result.statistics, result.metrics)
+    return odds
+
+
+# Split seeds into roughly equal chunks, a few per worker
+# so slow chunks don't leave cores idle at the end.
+def chunk_seeds(seeds, num_chunks):
+    num_chunks = max(1, min(num_chunks, len(seeds)))
+    return [seeds[i::num_chunks] for i in range(num_chunks)]
+
+
+# Run num_weekends independent race weekends across worker processes
+# and return the merged ChampionshipOdds.
+# The weekend seeds are all derived from seed, so the result is the same
+# no matter how many workers are used.
+# config is the RaceConfig of tuning constants; the defaults if None.
+def run_championship_odds(cars, track, num_laps, num_weekends, seed=None, workers=None, engine="classic", config=None):
+    base_rng = RaceRNG(seed)
+    seeds = [child.seed for child in base_rng.spawn(num_weekends)]
+    logging.info("Running %s weekends from base seed %s.", num_weekends, base_rng.seed)
+
+    workers = workers or os.cpu_count() or 1
+    odds = ChampionshipOdds([car["car_number"] for car in cars], len(cars))
+    if workers == 1:
+        return odds.merge(run_weekend_batch(cars, track, num_laps, seeds, engine, config))
+
+    chunks = chunk_seeds(seeds, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_weekend_batch, cars, track, num_laps, chunk, engine, config) for chunk in chunks]
+        for future in futures:
+            odds.merge(future.result())
+    return odds
+
+
+# Print a finishing-position probability table for the field.
+def print_odds(cars, odds):
+    print(f"Finishing odds over {odds.num_weekends} race weekends:")
+    for car in cars:
+        probabilities = odds.probabilities()[car["car_number"]]
+        print(f"\tCar #: {car['car_number']} ({car['driver_name']})")
+        print("\t\t" + " ".join(f"P{i + 1}: {p:.3f}" for i, p in enumerate(probabilities) if p > 0.0))
+    print("Average race statistics per weekend:")
+    for key, value in odds.mean_statistics().items():
+        print(f"\t{key}: {value:.3f}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Estimate championship finishing odds by running many seeded race weekends.")
+    parser.add_argument("cars", help="JSON file where the cars are saved.")
+    parser.add_argument("track", help="JSON file where the track is saved.")
+    parser.add_argument("laps", type=int, help="Number of laps per race.")
+    parser.add_argument("-n", "--weekends", type=int, default=1000, help="Number of race weekends to run.")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed for the weekend seeds.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--engine", choices=("classic", "vector"), default="classic", help="Race engine to use.")
+    parser.add_argument("--metrics", default=None, help="Write the merged race metrics to this file: Prometheus text if it ends in .prom, JSON otherwise.")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    cars = load_cars_file(args.cars)
+    track = load_track_file(args.track)
+    odds = run_championship_odds(cars, track, args.laps, args.weekends, seed=args.seed, workers=args.workers, engine=args.engine)
+    print_odds(cars, odds)
+    if args.metrics is not None:
+        write_metrics(odds.metrics, args.metrics)
+
+
+if __name__ == "__main__":
+    run_cli()
@@ -0,0 +1,215 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+
+import main
+from loaders import load_cars_file, load_track_file
+from race_config import DEFAULT_CONFIG
+from race_rng import RaceRNG
+
+
+# Pit strategies.
+# A car's strategy is the list of laps at the end of which it pits, kept
+# as "pit_laps" in its car dict, e.g. "pit_laps": [12, 24] for a two-stop
+# race. Cars without one make the league's single stop just after half
+# distance, which is what every car used to do. The race engines turn the
+# field's strategies into a schedule of which cars pit on which lap once
+# per race, and run each lap's stops for all the cars making them at once.
+#
+# Pit stops only cost time unless tyres wear: with the tyre_wear constant
+# set, every lap on a set of tyres costs tyre_wear seconds more than the
+# one before, and a stop resets that. The optimizer races every candidate
+# strategy for each car, across worker processes and over the same seeded
+# race weekends, and ranks them by the car's mean race time:
+#   python pit_strategy.py cars.txt track.txt 30 --config wear.json --stops 1,2,3
+#   python pit_strategy.py cars.txt track.txt 30 --config wear.json --window 8:14 --window 18:24 --car 01
+
+
+# The field, track and seeds of the current worker, set once per process by init_worker.
+worker_inputs = {}
+
+
+# The single stop every car made before strategies: at the end of the
+# first lap past half distance.
+def default_pit_laps(num_laps):
+    return [num_laps // 2 + 1]
+
+
+# The laps a car pits on, its own strategy or the default one.
+def car_pit_laps(car, num_laps):
+    pit_laps = car.get("pit_laps")
+    return default_pit_laps(num_laps) if pit_laps is None else pit_laps
+
+
+# Every car's pit laps, by car number.
+def pit_strategies(cars, num_laps):
+    return {car["car_number"]: car_pit_laps(car, num_laps) for car in cars}
+
+
+# Which cars pit on which lap: lap -> set of car numbers, from the
+# strategies of pit_strategies.
+def pit_schedule(strategies):
+    schedule = {}
+    for car_number, pit_laps in strategies.items():
+        for lap in pit_laps:
+            schedule.setdefault(lap, set()).add(car_number)
+    return schedule
+
+
+# Laps a car's tyres have already done when it starts lap, given its pit laps.
+def tyre_age(pit_laps, lap):
+    fitted = 0
+    for pit_lap in pit_laps:
+        if fitted < pit_lap < lap:
+            fitted = pit_lap
+    return lap - 1 - fitted
+
+
+# Total tyre wear of a strategy over a race: tyre_wear seconds for every
+# lap already done on the tyres, summed over each stint.
+def tyre_wear_time(pit_laps, num_laps, tyre_wear):
+    total = 0
+    fitted = 0
+    for pit_lap in sorted(lap for lap in pit_laps if lap <= num_laps) + [num_laps]:
+        stint = pit_lap - fitted
+        total += stint * (stint - 1) // 2
+        fitted = pit_lap
+    return tyre_wear * total
+
+
+# Candidate strategies, as tuples of increasing pit laps.
+# With windows, a list of (first, last) laps, there is one stop in each
+# window. Otherwise there are stop_counts stops anywhere before the final
+# lap (pitting after it only costs time). Only every step-th lap is tried.
+def candidate_plans(num_laps, stop_counts=(1, 2), windows=None, step=1):
+    if windows is not None:
+        laps_per_stop = [range(first, last + 1, step) for first, last in windows]
+        return [plan for plan in itertools.product(*laps_per_stop) if all(a < b for a, b in zip(plan, plan[1:]))]
+    laps = range(step, num_laps, step)
+    return [plan for stops in stop_counts for plan in itertools.combinations(laps, stops)]
+
+
+# Worker initializer: keep the field, track and seeds every task uses.
+def init_worker(cars, track, num_laps, seeds, engine, config):
+    worker_inputs.update(cars=cars, track=track, num_laps=num_laps, seeds=seeds, engine=engine, config=config)
+
+
+# Race one car on one plan, everyone else on their own strategy, over
+# every seed, and summarise how the car did.
+def evaluate_plan(task):
+    from simulation import simulate
+
+    car_number, plan = task
+    cars = [dict(car, pit_laps=list(plan)) if car["car_number"] == car_number else car for car in worker_inputs["cars"]]
+    race_times = []
+    positions = []
+    for seed in worker_inputs["seeds"]:
+        result = simulate(cars, worker_inputs["track"], worker_inputs["num_laps"], seed=seed, engine=worker_inputs["engine"], config=worker_inputs["config"])
+        car = next(car for car in result.results if car["car_number"] == car_number)
+        positions.append(car["position"])
+        if car["race_time"] is not None:
+            race_times.append(car["race_time"])
+    return {
+        "car_number": car_number,
+        "pit_laps": list(plan),
+        "races": len(positions),
+        "finishes": len(race_times),
+        "mean_race_time": sum(race_times) / len(race_times) if race_times else None,
+        "mean_position": sum(positions) / len(positions),
+    }
+
+
+# Evaluate every plan for every car in car_numbers (default: the whole
+# field) over races seeded race weekends. Returns car number -> plan
+# summaries, fastest mean race time first; plans the car never finished
+# on come last. Every plan sees the same seeds, so the results don't
+# depend on the number of workers.
+def optimize_strategies(cars, track, num_laps, plans, races, seed=None, workers=None, engine="classic", config=None, car_numbers=None):
+    config = config or DEFAULT_CONFIG
+    base_rng = RaceRNG(seed)
+    seeds = [child.seed for child in base_rng.spawn(races)]
+    car_numbers = car_numbers or [car["car_number"] for car in cars]
+    tasks = [(car_number, plan) for car_number in car_numbers for plan in plans]
+    workers = workers or os.cpu_count() or 1
+    logging.info("Racing %s plans for %s cars x %s races from base seed %s on %s workers.", len(plans), len(car_numbers), races, base_rng.seed, workers)
+
+    if workers == 1:
+        init_worker(cars, track, num_laps, seeds, engine, config)
+        summaries = [evaluate_plan(task) for task in tasks]
+    else:
+        # Imported here: the race engines and the estimator use this module, and multiprocessing costs them startup time.
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cars, track, num_laps, seeds, engine, config)) as executor:
+            summaries = list(executor.map(evaluate_plan, tasks, chunksize=chunksize))
+
+    results = {car_number: [] for car_number in car_numbers}
+    for summary in summaries:
+        results[summary["car_number"]].append(summary)
+    for car_summaries in results.values():
+        car_summaries.sort(key=lambda summary: (summary["mean_race_time"] is None, summary["mean_race_time"] or 0.0))
+    return results
+
+
+# Print each car's best few plans.
+def print_strategies(results, top=3):
+    for car_number, summaries in results.items():
+        print(f"\tCar #: {car_number}")
+        for summary in summaries[:top]:
+            plan = "Pit on laps " + ", ".join(str(lap) for lap in summary["pit_laps"]) if summary["pit_laps"] else "No stops"
+            race_time = "DNF" if summary["mean_race_time"] is None else f"{summary['mean_race_time']:.2f}s"
+            print(f"\t\t{plan}: {race_time}  Position: {summary['mean_position']:.2f}  Finishes: {summary['finishes']}/{summary['races']}")
+
+
+# Parse a --window argument: "first:last".
+def parse_window(text):
+    first, _, last = text.partition(":")
+    try:
+        return int(first), int(last)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a lap window like 8:14, got {text}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Find the fastest pit strategy for each car by racing every candidate over seeded race weekends.")
+    parser.add_argument("cars", help="JSON file where the cars are saved.")
+    parser.add_argument("track", help="JSON file where the track is saved.")
+    parser.add_argument("laps", type=int, help="Number of laps per race.")
+    parser.add_argument("--stops", default="1,2", help="Comma-separated numbers of stops to try.")
+    parser.add_argument("--window", type=parse_window, action="append", default=None, metavar="FIRST:LAST",
+                        help="Lap window for one stop; give one per stop to try only plans with a stop in each.")
+    parser.add_argument("--step", type=int, default=None, help="Only try pit laps on every step-th lap (default: a tenth of the race).")
+    parser.add_argument("--car", action="append", default=None, help="Car number to optimize (default: every car).")
+    parser.add_argument("--config", default=None, help="JSON file of tuning constant overrides, e.g. {\"tyre_wear\": 0.05}.")
+    parser.add_argument("--races", type=int, default=20, help="Seeded races per plan.")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed for the race seeds.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--engine", choices=("classic", "vector"), default="classic", help="Race engine to use.")
+    parser.add_argument("--output", default=None, help="Also write every plan summary as JSON to this file.")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    cars = load_cars_file(args.cars)
+    track = load_track_file(args.track)
+    config = DEFAULT_CONFIG if args.config is None else DEFAULT_CONFIG.replace(**main.read_json_file(args.config))
+    step = args.step or max(1, args.laps // 10)
+    plans = candidate_plans(args.laps, [int(stops) for stops in args.stops.split(",")], args.window, step)
+    if not plans:
+        sys.exit("No candidate plans: check --stops, --window and --step against the lap count.")
+
+    results = optimize_strategies(cars, track, args.laps, plans, args.races, seed=args.seed, workers=args.workers, engine=args.engine, config=config, car_numbers=args.car)
+    print(f"Best pit strategies over {args.races} races ({len(plans)} plans per car):")
+    print_strategies(results)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    run_cli()
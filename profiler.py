@@ -0,0 +1,119 @@
+import json
+import time
+
+
+# Built-in phase profiler for the simulation.
+# Attach one to a RaceContext to collect call counts and cumulative wall
+# time for each phase of a race weekend, plus a histogram of how long
+# each lap took. With no profiler attached, every phase is a shared no-op,
+# so the hot path pays for little more than an attribute check.
+
+
+# Phases the engines report on.
+PHASES = ("qualifying", "item_timing", "reliability", "pass_resolution", "pit_stops", "position_sorting")
+
+# Upper bounds, in seconds, of the lap latency histogram buckets.
+# The last bucket catches everything slower.
+LAP_BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+# Stand-in for a phase timer when profiling is off.
+class NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+# Times one run of a phase and adds it to the profiler on exit.
+class PhaseTimer:
+
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Profiler:
+
+    # report_path, if given, is where the JSON report is written when the weekend finishes.
+    def __init__(self, report_path=None):
+        self.report_path = report_path
+        self.calls = {name: 0 for name in PHASES}
+        self.total_seconds = {name: 0.0 for name in PHASES}
+        self.lap_seconds = []
+
+    # Context manager timing one run of the named phase.
+    def phase(self, name):
+        return PhaseTimer(self, name)
+
+    # Add one run of a phase that took elapsed seconds.
+    def record(self, name, elapsed):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.total_seconds[name] = self.total_seconds.get(name, 0.0) + elapsed
+
+    # Add one lap that took elapsed seconds, all phases included.
+    def record_lap(self, elapsed):
+        self.lap_seconds.append(elapsed)
+
+    # Histogram of lap latencies over LAP_BUCKETS.
+    def lap_histogram(self):
+        counts = [0] * (len(LAP_BUCKETS) + 1)
+        for elapsed in self.lap_seconds:
+            bucket = 0
+            while bucket < len(LAP_BUCKETS) and elapsed > LAP_BUCKETS[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+        return {"bucket_upper_bounds": list(LAP_BUCKETS) + [None], "counts": counts}
+
+    # Latency at the given quantile (0.0 - 1.0) of the recorded laps.
+    def lap_quantile(self, quantile):
+        if not self.lap_seconds:
+            return None
+        ordered = sorted(self.lap_seconds)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    # The whole profile as a JSON-ready dictionary.
+    def report(self):
+        phases = {}
+        for name in self.calls:
+            calls = self.calls[name]
+            phases[name] = {
+                "calls": calls,
+                "total_seconds": self.total_seconds[name],
+                "mean_seconds": self.total_seconds[name] / calls if calls else 0.0,
+            }
+        return {
+            "phases": phases,
+            "laps": {
+                "count": len(self.lap_seconds),
+                "total_seconds": sum(self.lap_seconds),
+                "p50_seconds": self.lap_quantile(0.5),
+                "p90_seconds": self.lap_quantile(0.9),
+                "p99_seconds": self.lap_quantile(0.99),
+                "max_seconds": max(self.lap_seconds) if self.lap_seconds else None,
+                "histogram": self.lap_histogram(),
+            },
+        }
+
+    # Called at the end of a race weekend: write the report if a path was given.
+    def finish(self):
+        report = self.report()
+        if self.report_path is not None:
+            with open(self.report_path, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+        return report
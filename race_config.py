@@ -0,0 +1,92 @@
+import json
+
+
+# Tuning constants for the simulation.
+# These used to be module globals at the top of main.py, so a process
+# could only ever run one configuration. A RaceConfig is carried on the
+# RaceContext instead, letting any number of configurations run side by
+# side, and can be loaded from a JSON file of overrides.
+
+
+# Every tuning constant and its default value.
+DEFAULTS = {
+    "sum_of_differences_weight": 2, # number we divide the sum of differences by to decide how important it is to laptimes.
+    "corner_randomness_factor": 0.15, # number we can tweak to change how far spread corner times are.
+    "corner_base_rng_val": 0.6, # Lowest value the corner-time RNG can modify the statistics modifiers by.
+    "corner_highest_rng_val": 1.6, # Highest value the corner-time RNG can modify the statistics modifiers by.
+    "crash_base_factor": 0.01, # number we can tweak to change how likely a crash is.
+    "crash_threshold": 0.25, # seconds apart two cars have to be to trigger a crash check.
+    "pass_threshold": 0.4, # seconds apart two cars have to be to trigger a pass.
+    "skill_threshold": 0.25, # seconds apart where a skilled driver can make a pass.
+    "defender_penalty": 0.1, # seconds which a defender loses by driving defensively.
+    "attacker_penalty": 0.4, # seconds which an attacker loses by failing to pass.
+    "start_penalty": 0.2, # seconds between cars at the start of the race.
+    "starting_health": 3, # number of mechanical failures that can occur during the race before a car must retire.
+    "failure_factor": 1.10, # modifier to odds of mechanical failures, adjustable to increase/reduce retirement rates. Higher means less, lower means more.
+    "max_breakdown_resistance": 0.9, # Maximum probability of dodging a mechanical breakdown
+    "avg_pitstop_time": 45.0, # Average pitstop time in the league right now.
+    "std_dev_pitstop_time": 5.0, # Size of standard deviation for pitstop times.
+    "min_pitstop_time": 30.0, # Minimum pitstop time. Don't want to have anomalously low pitstop times.
+    "max_pitstop_time": 75.0, # Max pitstip time. Don't want to have anomalously high pitstop times.
+    "qualifying_runs": 1, # number of qualifying laps each car gets; the best one sets the grid.
+    "tyre_wear": 0.0, # seconds a set of tyres loses per lap for every lap already done on it; a pit stop fits new ones.
+}
+
+
+class RaceConfig:
+
+    __slots__ = tuple(DEFAULTS)
+
+    # Any constant not given keeps its default.
+    #
+    # Raises TypeError for a name that isn't a tuning constant.
+    def __init__(self, **values):
+        unknown = set(values) - set(DEFAULTS)
+        if unknown:
+            raise TypeError(f"Unknown tuning constants: {', '.join(sorted(unknown))}")
+        for name, default in DEFAULTS.items():
+            setattr(self, name, values.get(name, default))
+
+    # A copy of this config with some constants changed.
+    def replace(self, **changes):
+        values = self.to_dict()
+        values.update(changes)
+        return RaceConfig(**values)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    # Read a JSON file of constant overrides, e.g. {"pass_threshold": 0.5}.
+    #
+    # Raises json.JSONDecodeError if file cannot be read as JSON.
+    # Raises IOError if no such file exists.
+    # Raises TypeError for a name that isn't a tuning constant.
+    @classmethod
+    def from_file(cls, filepath):
+        with open(filepath) as config_file:
+            return cls(**json.load(config_file))
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, RaceConfig) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(tuple(self.to_dict().items()))
+
+    def __repr__(self):
+        changed = {name: value for name, value in self.to_dict().items() if value != DEFAULTS[name]}
+        return f"RaceConfig({', '.join(f'{name}={value!r}' for name, value in changed.items())})"
+
+
+# The league's current tuning, used whenever no config is given.
+DEFAULT_CONFIG = RaceConfig()
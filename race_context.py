@@ -0,0 +1,142 @@
+import json
+
+from metrics import RaceMetrics
+from profiler import NULL_PHASE
+from race_config import DEFAULT_CONFIG
+from race_rng import RaceRNG
+
+
+# Per-run state threaded through the simulation functions.
+# Commentary used to go straight to stdout via print. It now goes to an
+# optional event sink, and the commentary line is only formatted if
+# someone actually reads it.
+
+
+# Event kinds and the fields each one carries.
+EVENT_KINDS = {
+    "qualifying_start": (),
+    "qualifying_lap": ("car_number", "lap_time"),
+    "grid": ("grid",),
+    "race_start": (),
+    "lap_start": ("lap",),
+    "lap_complete": ("lap", "standings", "final"),
+    "pass": ("car_number", "driver_name", "passed_car_number", "position"),
+    "skill_pass": ("car_number", "driver_name", "passed_car_number", "position"),
+    "extra_pass": ("car_number", "driver_name", "passed_car_number", "passed_driver_name", "position"),
+    "defend": ("car_number", "attacker_car_number"),
+    "defense": ("car_number", "driver_name", "attacker_car_number", "attacker_driver_name"),
+    "crash": ("attacker_car_number", "attacker_driver_name", "defender_car_number", "defender_driver_name", "crashed"),
+    "breakdown": ("car_number", "health"),
+    "retirement": ("car_number",),
+    "pit_entry": ("car_number", "driver_name"),
+    "pit_fast": ("car_number",),
+    "pit_slow": ("car_number",),
+    "pit_stop": ("car_number", "pit_stop_time"),
+    "race_result": ("results", "statistics", "metrics", "seed"),
+}
+
+
+# A single piece of race commentary.
+# kind names what happened ("pass", "crash", "pit_stop", ...),
+# lap is the lap it happened on (0 during qualifying),
+# fields holds the facts behind it (car numbers, positions, times).
+# template is a format string over fields, or a function taking fields.
+class RaceEvent:
+
+    __slots__ = ("kind", "lap", "template", "fields")
+
+    def __init__(self, kind, lap, template, fields):
+        self.kind = kind
+        self.lap = lap
+        self.template = template
+        self.fields = fields
+
+    # The broadcaster's line for this event, formatted on demand.
+    @property
+    def message(self):
+        if callable(self.template):
+            return self.template(**self.fields)
+        return self.template.format(**self.fields)
+
+    # JSON-ready form of the event; the message is only formatted if asked for.
+    def to_dict(self, include_message=False):
+        event = {"kind": self.kind, "lap": self.lap, "fields": self.fields}
+        if include_message:
+            event["message"] = self.message
+        return event
+
+    def __repr__(self):
+        return f"RaceEvent({self.kind!r}, lap={self.lap}, {self.fields!r})"
+
+
+# Sink that prints every commentary line, like the calculator always has.
+def print_sink(event):
+    print(event.message)
+
+
+# Sink writing every event as one JSON line to a file.
+# target is a path or an already open text file; a path is opened with a
+# write buffer of buffer_size bytes and closed by close(). Nothing is held
+# beyond that buffer, so arbitrarily long races stream out in constant
+# memory. kinds, if given, limits the output to those event kinds.
+class JsonlSink:
+
+    def __init__(self, target, buffer_size=1 << 16, include_message=False, kinds=None):
+        if isinstance(target, str):
+            self.file = open(target, "w", buffering=buffer_size)
+            self.owns_file = True
+        else:
+            self.file = target
+            self.owns_file = False
+        self.include_message = include_message
+        self.kinds = None if kinds is None else frozenset(kinds)
+
+    def __call__(self, event):
+        if self.kinds is None or event.kind in self.kinds:
+            self.file.write(json.dumps(event.to_dict(self.include_message)) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+# Simulation state that used to be implicit.
+# sink is called with every RaceEvent, or None to run silently.
+# rng is the RaceRNG all random draws come from; a freshly seeded one if None.
+# profiler is a Profiler collecting per-phase timings, or None to skip timing.
+# config is the RaceConfig of tuning constants; the defaults if None.
+# metrics is the RaceMetrics the race's statistics go to; a fresh one if None.
+# recorder is a LapHistory recording item times and lap standings, or None.
+class RaceContext:
+
+    def __init__(self, sink=None, rng=None, profiler=None, config=None, metrics=None, recorder=None):
+        self.sink = sink
+        self.rng = rng if rng is not None else RaceRNG()
+        self.profiler = profiler
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.metrics = metrics if metrics is not None else RaceMetrics()
+        self.recorder = recorder
+        self.lap = 0
+
+    # Context manager timing the named phase, a no-op unless profiling.
+    def phase(self, name):
+        if self.profiler is None:
+            return NULL_PHASE
+        return self.profiler.phase(name)
+
+    # Send a commentary event to the sink, if there is one.
+    def commentate(self, kind, template, **fields):
+        if self.sink is not None:
+            self.sink(RaceEvent(kind, self.lap, template, fields))
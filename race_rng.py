@@ -0,0 +1,73 @@
+import random
+
+
+# Seedable random number streams for a single race.
+# Every subsystem draws from its own independent stream, all derived from
+# one seed, so the same seed reproduces a race bit-for-bit and an extra
+# draw in one subsystem (say a new pit stop) doesn't shift every corner
+# time after it. Parallel runs each get their own RaceRNG and never share
+# state with each other or with the global random module.
+
+
+# Names of the independent streams, one per simulation subsystem.
+SUBSYSTEMS = ("corners", "crashes", "reliability", "pit_stops", "ordering")
+
+
+class RaceRNG:
+
+    # seed is any integer; a fresh one is picked (and kept in self.seed) if None.
+    def __init__(self, seed=None):
+        if seed is None:
+            # Same OS entropy as secrets.randbits, without importing secrets (and hashlib, hmac, base64) at startup.
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        # String seeds are hashed with SHA-512 by random.Random, which is
+        # stable across processes and Python runs, unlike hash().
+        self.streams = {name: random.Random(f"{seed}:{name}") for name in SUBSYSTEMS}
+        self.corners = self.streams["corners"]
+        self.crashes = self.streams["crashes"]
+        self.reliability = self.streams["reliability"]
+        self.pit_stops = self.streams["pit_stops"]
+        self.ordering = self.streams["ordering"]
+        self.numpy_streams = {}
+
+    # NumPy Generator for a subsystem, for the vectorized engine.
+    # Seeded from the same seed but independent of the random.Random streams.
+    def numpy(self, name):
+        if name not in self.numpy_streams:
+            import numpy as np
+            seed_sequence = np.random.SeedSequence(self.seed, spawn_key=(SUBSYSTEMS.index(name),))
+            self.numpy_streams[name] = np.random.Generator(np.random.PCG64(seed_sequence))
+        return self.numpy_streams[name]
+
+    # Derive num_children independent RaceRNGs, e.g. one per parallel race.
+    # The child seeds depend only on this seed, not on how many draws
+    # have been made from it.
+    def spawn(self, num_children):
+        seeder = random.Random(f"{self.seed}:spawn")
+        return [RaceRNG(seeder.getrandbits(64)) for _ in range(num_children)]
+
+    # Full state of every stream, Python and NumPy, e.g. to checkpoint a
+    # race. Restoring it carries on the exact same sequences of draws.
+    def getstate(self):
+        return {
+            "seed": self.seed,
+            "streams": {name: stream.getstate() for name, stream in self.streams.items()},
+            "numpy": {name: generator.bit_generator.state for name, generator in self.numpy_streams.items()},
+        }
+
+    def setstate(self, state):
+        for name, stream_state in state["streams"].items():
+            self.streams[name].setstate(stream_state)
+        for name, generator_state in state["numpy"].items():
+            self.numpy(name).bit_generator.state = generator_state
+
+    # A RaceRNG picking up exactly where the one that gave state left off.
+    @classmethod
+    def from_state(cls, state):
+        rng = cls(state["seed"])
+        rng.setstate(state)
+        return rng
+
+    def __repr__(self):
+        return f"RaceRNG(seed={self.seed})"
@@ -0,0 +1,425 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from loaders import SchemaError, load_cars_file, load_track_file, validate_cars, validate_track
+from race_config import RaceConfig
+from simulation import iter_events
+
+
+# Local race server.
+# An asyncio front end for the simulation: clients post race jobs over
+# HTTP or a WebSocket and get the race events streamed back lap by lap
+# while it runs. The races themselves run in a process pool, so the event
+# loop only ever moves bytes.
+#
+# Each running job has a small bounded queue between its worker process
+# and the connection. Events are only taken off the queue once the client
+# has received the previous ones, so a slow client stalls its own race
+# instead of piling up events in memory, and a client that stops reading
+# altogether has its race abandoned after stall_timeout seconds. At most
+# max_jobs races run at once; up to max_waiting more wait for a slot and
+# anything beyond that is turned away with a 503.
+#
+# Endpoints:
+#   GET  /health  running and waiting job counts, as JSON
+#   POST /races   body is a race job; the response is a chunked stream of
+#                 JSON lines, one per event, ending with a race_result event
+#   GET  /ws      WebSocket; send the race job as one text message and get
+#                 one text message per event back
+#
+# A race job is a JSON object:
+#   {"cars": [...], "track": {...}, "laps": 30, "seed": 7, "engine": "classic",
+#    "config": {"pass_threshold": 0.5}, "messages": true}
+# cars and track are in the cars.txt / track.txt schemas; seed, engine,
+# config and messages (include commentary lines) are optional.
+#
+# Example:
+#   python race_server.py serve --port 8765
+#   python race_server.py run cars.txt track.txt 30 --port 8765 --clients 24
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Event kinds that end a batch sent from a worker: the grid and every lap.
+BATCH_ENDS = ("grid", "lap_complete", "race_result")
+
+REASONS = {200: "OK", 101: "Switching Protocols", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+# Raised for a request the server won't run; status is the HTTP status to answer with.
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Worker entry point: run one race and put its events on the events queue,
+# one list of event dicts per lap. Stops early if cancelled is set or the
+# connection hasn't taken a batch for stall_timeout seconds.
+def run_streamed_race(job, events, cancelled, stall_timeout):
+    try:
+        batch = []
+        config = RaceConfig(**job["config"]) if "config" in job else None
+        for event in iter_events(job["cars"], job["track"], job["laps"], seed=job.get("seed"), engine=job.get("engine", "classic"), config=config):
+            batch.append(event.to_dict(job.get("messages", False)))
+            if event.kind in BATCH_ENDS:
+                if cancelled.is_set():
+                    return
+                events.put(batch, timeout=stall_timeout)
+                batch = []
+    except queue.Full:
+        logging.warning("Abandoned a race whose client stopped reading.")
+    except Exception as error:
+        # If the client has stopped reading too, the race's own error goes
+        # out of the worker rather than the queue.Full from reporting it.
+        try:
+            events.put([{"kind": "error", "message": str(error)}], timeout=stall_timeout)
+        except queue.Full:
+            logging.warning("Could not report a failed race to a client that stopped reading.")
+        else:
+            return
+        raise
+
+
+# Check a decoded race job and fill in its defaults.
+#
+# Raises RequestError for anything the simulation can't run.
+def validate_job(job, max_laps):
+    if not isinstance(job, dict):
+        raise RequestError(400, "A race job must be a JSON object.")
+    try:
+        validate_cars(job.get("cars"), "cars")
+        validate_track(job.get("track"), "track")
+    except SchemaError as error:
+        raise RequestError(400, str(error))
+    laps = job.get("laps")
+    if not isinstance(laps, int) or laps < 1 or laps > max_laps:
+        raise RequestError(400, f"\"laps\" must be a whole number from 1 to {max_laps}.")
+    if job.setdefault("engine", "classic") not in ("classic", "vector"):
+        raise RequestError(400, f"Unknown race engine: {job['engine']}")
+    if "config" in job:
+        try:
+            RaceConfig(**job["config"])
+        except TypeError as error:
+            raise RequestError(400, str(error))
+    return job
+
+
+class RaceServer:
+
+    # workers is the size of the simulation process pool (default: all cores).
+    # max_jobs races run at once, max_waiting more may queue for a slot.
+    # queue_laps is how many laps of events may sit between a race and its client.
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, max_jobs=None, max_waiting=64, max_laps=1000,
+                 max_body=1 << 20, queue_laps=4, stall_timeout=30.0):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs or self.workers * 4
+        self.max_waiting = max_waiting
+        self.max_laps = max_laps
+        self.max_body = max_body
+        self.queue_laps = queue_laps
+        self.stall_timeout = stall_timeout
+        self.running = 0
+        self.waiting = 0
+        self.server = None
+
+    async def start(self):
+        self.slots = asyncio.Semaphore(self.max_jobs)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Blocking reads from the worker queues happen on these threads, one per running job.
+        self.readers = ThreadPoolExecutor(max_workers=self.max_jobs)
+        self.manager = multiprocessing.Manager()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info("Race server listening on %s:%s with %s workers.", self.host, self.port, self.workers)
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+        self.readers.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+    # One connection: parse the request and dispatch it.
+    async def handle(self, reader, writer):
+        try:
+            method, path, headers = await self.read_request_head(reader)
+            if path == "/health":
+                await self.send_json(writer, 200, {"running": self.running, "waiting": self.waiting, "max_jobs": self.max_jobs})
+            elif path == "/races":
+                if method != "POST":
+                    raise RequestError(405, "Post a race job to /races.")
+                job = validate_job(await self.read_json_body(reader, headers), self.max_laps)
+                await self.stream_http(writer, job)
+            elif path == "/ws":
+                await self.stream_websocket(reader, writer, headers)
+            else:
+                raise RequestError(404, f"No such endpoint: {path}")
+        except RequestError as error:
+            await self.send_json(writer, error.status, {"error": str(error)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logging.debug("Client went away.")
+        finally:
+            writer.close()
+
+    # Read the request line and headers.
+    async def read_request_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise RequestError(413, "Request headers too large.")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise RequestError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target.split("?", 1)[0], headers
+
+    async def read_json_body(self, reader, headers):
+        length = headers.get("content-length", "0")
+        if not (length.isascii() and length.isdigit()):
+            raise RequestError(400, "Content-Length must be a whole number of bytes.")
+        length = int(length)
+        if length > self.max_body:
+            raise RequestError(413, f"Race jobs are limited to {self.max_body} bytes.")
+        try:
+            return json.loads(await reader.readexactly(length))
+        except json.JSONDecodeError as error:
+            raise RequestError(400, f"Race job is not valid JSON: {error.msg}")
+
+    async def send_json(self, writer, status, body):
+        data = json.dumps(body).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+    # Run a job in the pool and yield its event batches as the client can take them.
+    # Raises RequestError(503) if too many jobs are already waiting.
+    async def run_job(self, job):
+        if self.waiting >= self.max_waiting:
+            raise RequestError(503, "Too many races queued; try again later.")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        loop = asyncio.get_running_loop()
+        events = self.manager.Queue(maxsize=self.queue_laps)
+        cancelled = self.manager.Event()
+        started = time.perf_counter()
+        future = loop.run_in_executor(self.pool, run_streamed_race, job, events, cancelled, self.stall_timeout)
+        try:
+            while True:
+                batch = await loop.run_in_executor(self.readers, take_batch, events)
+                if batch is not None:
+                    yield batch
+                elif future.done():
+                    # The race is over; hand over whatever it left on the queue.
+                    while (batch := take_batch(events, block=False)) is not None:
+                        yield batch
+                    break
+            await future
+            logging.info("Race of %s laps streamed in %.2fs.", job["laps"], time.perf_counter() - started)
+        finally:
+            cancelled.set()
+            self.running -= 1
+            self.slots.release()
+
+    # POST /races: stream the events as chunked JSON lines.
+    # The job is closed however the stream ends, so a client that goes
+    # away frees its slot straight away rather than when the generator
+    # happens to be collected.
+    async def stream_http(self, writer, job):
+        jobs = self.run_job(job)
+        try:
+            first = await anext(jobs)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            batch = first
+            while batch is not None:
+                data = "".join(json.dumps(event) + "\n" for event in batch).encode("utf-8")
+                writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+                # Waiting here until the client has taken the batch is the backpressure.
+                await writer.drain()
+                batch = await anext(jobs, None)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            await jobs.aclose()
+
+    # GET /ws: WebSocket handshake, one job message in, one message per event out.
+    async def stream_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or key is None:
+            raise RequestError(400, "Expected a WebSocket upgrade.")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("latin-1")).digest()).decode("latin-1")
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+
+        opcode, payload = await read_frame(reader, self.max_body)
+        try:
+            if opcode != 0x1:
+                raise RequestError(400, "Send the race job as a text message.")
+            try:
+                job = validate_job(json.loads(payload), self.max_laps)
+            except json.JSONDecodeError as error:
+                raise RequestError(400, f"Race job is not valid JSON: {error.msg}")
+            jobs = self.run_job(job)
+            try:
+                async for batch in jobs:
+                    for event in batch:
+                        writer.write(encode_frame(0x1, json.dumps(event).encode("utf-8")))
+                    await writer.drain()
+            finally:
+                await jobs.aclose()
+            writer.write(encode_frame(0x8, struct.pack("!H", 1000)))
+        except RequestError as error:
+            writer.write(encode_frame(0x1, json.dumps({"kind": "error", "message": str(error)}).encode("utf-8")))
+            writer.write(encode_frame(0x8, struct.pack("!H", 1008)))
+        await writer.drain()
+
+
+# Take one batch off a worker queue, or None if none turns up in time.
+def take_batch(events, block=True):
+    try:
+        return events.get(block, 0.25)
+    except queue.Empty:
+        return None
+
+
+# Read one WebSocket frame from a client, unmasking it.
+# Returns (opcode, payload). Fragmented messages aren't supported.
+async def read_frame(reader, max_length):
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > max_length:
+        raise RequestError(413, f"Race jobs are limited to {max_length} bytes.")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return opcode, payload
+
+
+# Encode one unmasked, unfragmented WebSocket frame, as servers send them.
+def encode_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+# Local client: post a race job to a running server and yield its events as they arrive.
+async def stream_race(job, host="127.0.0.1", port=8765):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps(job).encode("utf-8")
+        writer.write(f"POST /races HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        status = int(head.split(" ", 2)[1])
+        if status != 200:
+            raise RequestError(status, json.loads(await reader.read())["error"])
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            if size == 0:
+                break
+            chunk = await reader.readexactly(size + 2)
+            for line in chunk[:-2].decode("utf-8").splitlines():
+                yield json.loads(line)
+    finally:
+        writer.close()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Serve race simulations over HTTP and WebSockets, or run races against such a server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the race server.")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    serve.add_argument("--workers", type=int, default=None, help="Simulation worker processes (default: all cores).")
+    serve.add_argument("--max-jobs", type=int, default=None, help="Races run at once (default: four per worker).")
+    serve.add_argument("--max-waiting", type=int, default=64, help="Races allowed to wait for a slot before new ones are refused.")
+
+    run = commands.add_parser("run", help="Stream races from a running server.")
+    run.add_argument("cars", help="JSON file where the cars are saved.")
+    run.add_argument("track", help="JSON file where the track is saved.")
+    run.add_argument("laps", type=int, help="Number of laps per race.")
+    run.add_argument("--host", default="127.0.0.1", help="Server address.")
+    run.add_argument("--port", type=int, default=8765, help="Server port.")
+    run.add_argument("--seed", type=int, default=None, help="Seed for the race (each extra client adds one).")
+    run.add_argument("--clients", type=int, default=1, help="Number of races to run at once.")
+    run.add_argument("--engine", choices=("classic", "vector"), default="classic", help="Race engine to use.")
+    return parser.parse_args(argv)
+
+
+# Stream one race per client and print the commentary of the first one.
+async def run_clients(args):
+    cars = load_cars_file(args.cars)
+    track = load_track_file(args.track)
+
+    async def one_race(index):
+        job = {"cars": cars, "track": track, "laps": args.laps, "engine": args.engine, "messages": index == 0}
+        if args.seed is not None:
+            job["seed"] = args.seed + index
+        count = 0
+        async for event in stream_race(job, args.host, args.port):
+            count += 1
+            if index == 0 and "message" in event:
+                print(event["message"])
+        return count
+
+    started = time.perf_counter()
+    counts = await asyncio.gather(*(one_race(index) for index in range(args.clients)))
+    print(f"Streamed {sum(counts)} events from {args.clients} races in {time.perf_counter() - started:.2f}s.")
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+        server = RaceServer(args.host, args.port, workers=args.workers, max_jobs=args.max_jobs, max_waiting=args.max_waiting)
+        asyncio.run(server.serve_forever())
+    else:
+        asyncio.run(run_clients(args))
+
+
+if __name__ == "__main__":
+    run_cli()
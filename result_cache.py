@@ -0,0 +1,123 @@
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+
+from race_config import DEFAULT_CONFIG
+from simulation import SimulationResult, simulate
+
+
+# Content-hashed cache of simulation results.
+# A seeded race weekend always produces the same result for the same
+# inputs, so results are stored under a hash of everything they depend
+# on: the cars, the track, the lap count, the seed, the engine and every
+# tuning constant of the RaceConfig. Changing a constant changes the key,
+# so stale entries are simply never looked up again.
+#
+# Lookups go to an in-memory LRU first and then, if a directory is given,
+# to one JSON file per entry on disk, which survives restarts and can be
+# shared between processes.
+
+
+# Bump whenever a change to the simulation gives different results for the same inputs,
+# or the stored results change shape. tests/test_result_cache.py pins a
+# fingerprint of seeded results to each format and fails until both move.
+CACHE_FORMAT = 4
+
+
+# Key for one race weekend: a SHA-256 over a canonical JSON encoding of
+# its inputs and its tuning constants (the defaults if config is None).
+def result_key(cars, track, num_laps, seed, engine="classic", config=None):
+    if config is None:
+        config = DEFAULT_CONFIG
+    inputs = {
+        "format": CACHE_FORMAT,
+        "cars": [dict(car) for car in cars],
+        "track": {"reliability_rating": track["reliability_rating"], "items": {item_id: dict(item) for item_id, item in track["items"].items()}},
+        "laps": num_laps,
+        "seed": seed,
+        "engine": engine,
+        "constants": config.to_dict(),
+    }
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+
+    # max_entries bounds the in-memory LRU.
+    # directory, if given, is where entries are also stored on disk.
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    # Stored result dict for key, or None.
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key)) as entry_file:
+                result_dict = json.load(entry_file)
+        except (IOError, json.JSONDecodeError):
+            return None
+        self.remember(key, result_dict)
+        return result_dict
+
+    # Store a result dict under key, in memory and on disk.
+    def put(self, key, result_dict):
+        self.remember(key, result_dict)
+        if self.directory is not None:
+            # Write to a temporary file first so readers never see half an entry.
+            temp_path = f"{self.path(key)}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as entry_file:
+                json.dump(result_dict, entry_file)
+            os.replace(temp_path, self.path(key))
+
+    # Add an entry to the LRU, evicting the least recently used one if full.
+    def remember(self, key, result_dict):
+        self.entries[key] = result_dict
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Drop every in-memory entry, and the on-disk ones too if on_disk.
+    def clear(self, on_disk=False):
+        self.entries.clear()
+        if on_disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+
+    # simulate(), answered from the cache when possible.
+    # Unseeded runs are random by design and always simulated.
+    def simulate(self, cars, track, num_laps, seed=None, engine="classic", config=None):
+        if seed is None:
+            return simulate(cars, track, num_laps, engine=engine, config=config)
+
+        key = result_key(cars, track, num_laps, seed, engine, config)
+        result_dict = self.get(key)
+        if result_dict is not None:
+            self.hits += 1
+            logging.debug("Result cache hit for %s", key)
+        else:
+            self.misses += 1
+            result_dict = simulate(cars, track, num_laps, seed=seed, engine=engine, config=config).to_dict()
+            self.put(key, result_dict)
+        # Hand out a copy so callers can't change the cached entry.
+        return SimulationResult.from_dict(copy.deepcopy(result_dict))
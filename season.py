@@ -0,0 +1,322 @@
+import argparse
+import copy
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from loaders import load_cars_file, load_track_file
+from monte_carlo import chunk_seeds
+from race_config import DEFAULT_CONFIG, RaceConfig
+from race_rng import RaceRNG
+from simulation import simulate
+
+
+# Full-season simulator.
+# Runs a championship calendar round by round, one race weekend per
+# track, and keeps the drivers' and teams' championship standings up to
+# date after every round. Optionally a car's remaining health carries
+# over from one round to the next, and its reliability wears a little
+# with every round raced. Many independently seeded seasons can be run
+# across worker processes to get each driver's and team's title odds.
+#
+# A calendar is a JSON file, track paths being relative to it:
+#   {
+#       "rounds": [{"name": "Kerbin Grand Prix", "track": "track.txt", "laps": 30}, ...],
+#       "points": [25, 18, 15, 12, 10, 8, 6, 4, 2, 1],
+#       "carry_health": true,
+#       "reliability_wear": 0.1,
+#       "engine": "classic",
+#       "config": {"pass_threshold": 0.5}
+#   }
+# Everything but "rounds" is optional.
+#
+# Example:
+#   python season.py cars.txt calendar.json --seed 7
+#   python season.py cars.txt calendar.json --seasons 1000
+
+
+# Points for first place, second place and so on; everyone further back scores nothing.
+DEFAULT_POINTS = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+
+
+# One round of the calendar.
+class SeasonRound:
+
+    __slots__ = ("name", "track", "laps")
+
+    def __init__(self, name, track, laps):
+        self.name = name
+        self.track = track
+        self.laps = laps
+
+
+# A calendar plus the rules of the season.
+# carry_health: a car starts each round with the health it finished the
+# last one with; a car that retired gets a fresh one at full health.
+# reliability_wear: reliability rating every car loses after each round.
+class SeasonPlan:
+
+    __slots__ = ("rounds", "points", "carry_health", "reliability_wear", "engine", "config")
+
+    def __init__(self, rounds, points=DEFAULT_POINTS, carry_health=False, reliability_wear=0.0, engine="classic", config=None):
+        self.rounds = rounds
+        self.points = tuple(points)
+        self.carry_health = carry_health
+        self.reliability_wear = reliability_wear
+        self.engine = engine
+        self.config = config if config is not None else DEFAULT_CONFIG
+
+
+# Read a calendar file into a SeasonPlan.
+#
+# Raises ValueError if the calendar is missing a required key or has a bad value.
+# Raises SchemaError if a track file doesn't match the track schema.
+def read_calendar(filepath):
+    calendar = main.read_json_file(filepath)
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+    if not calendar.get("rounds"):
+        raise ValueError(f"Calendar {filepath} has no \"rounds\" list.")
+
+    rounds = []
+    for round_index, round_dict in enumerate(calendar["rounds"]):
+        for key in ("track", "laps"):
+            if key not in round_dict:
+                raise ValueError(f"Round {round_index + 1} in {filepath} is missing \"{key}\".")
+        if not isinstance(round_dict["laps"], int) or round_dict["laps"] < 1:
+            raise ValueError(f"Round {round_index + 1} in {filepath} has an invalid lap count: {round_dict['laps']!r}")
+        track = load_track_file(os.path.join(base_dir, round_dict["track"]))
+        rounds.append(SeasonRound(round_dict.get("name", f"Round {round_index + 1}"), track, round_dict["laps"]))
+
+    engine = calendar.get("engine", "classic")
+    if engine not in ("classic", "vector"):
+        raise ValueError(f"Calendar {filepath} has an unknown race engine: {engine}")
+    try:
+        config = RaceConfig(**calendar["config"]) if "config" in calendar else None
+    except TypeError as error:
+        raise ValueError(f"Calendar {filepath} has a bad config: {error}")
+    return SeasonPlan(rounds, calendar.get("points", DEFAULT_POINTS), calendar.get("carry_health", False),
+                      calendar.get("reliability_wear", 0.0), engine, config)
+
+
+# Championship standings, updated one round at a time.
+# Only classified finishers score; ties are broken on wins, then on car number.
+class Standings:
+
+    def __init__(self, cars, points=DEFAULT_POINTS):
+        self.points = tuple(points)
+        self.rounds = 0
+        self.teams = {car["car_number"]: car["team_name"] for car in cars}
+        self.driver_points = {car["car_number"]: 0 for car in cars}
+        self.driver_wins = {car["car_number"]: 0 for car in cars}
+        self.team_points = {team_name: 0 for team_name in self.teams.values()}
+        self.team_wins = {team_name: 0 for team_name in self.teams.values()}
+
+    # Score one round from its classified results.
+    def add_round(self, results):
+        self.rounds += 1
+        for car in results:
+            if car["race_time"] is None:
+                continue
+            position = car["position"]
+            scored = self.points[position - 1] if position <= len(self.points) else 0
+            team_name = self.teams[car["car_number"]]
+            self.driver_points[car["car_number"]] += scored
+            self.team_points[team_name] += scored
+            if position == 1:
+                self.driver_wins[car["car_number"]] += 1
+                self.team_wins[team_name] += 1
+
+    # Car numbers in championship order.
+    def driver_order(self):
+        return sorted(self.driver_points, key=lambda car_number: (-self.driver_points[car_number], -self.driver_wins[car_number], car_number))
+
+    # Team names in championship order.
+    def team_order(self):
+        return sorted(self.team_points, key=lambda team_name: (-self.team_points[team_name], -self.team_wins[team_name], team_name))
+
+    def to_dict(self):
+        return {
+            "rounds": self.rounds,
+            "drivers": [{"car_number": car_number, "points": self.driver_points[car_number], "wins": self.driver_wins[car_number]} for car_number in self.driver_order()],
+            "teams": [{"team_name": team_name, "points": self.team_points[team_name], "wins": self.team_wins[team_name]} for team_name in self.team_order()],
+        }
+
+
+# Outcome of one season: the standings and every round's SimulationResult.
+class SeasonResult:
+
+    def __init__(self, seed, standings, round_results):
+        self.seed = seed
+        self.standings = standings
+        self.round_results = round_results
+
+
+# Carry a season car's condition out of a round into the next, as the plan says.
+def carry_over(car, result, plan):
+    if plan.carry_health:
+        car["starting_health"] = result["health"] if result["race_time"] is not None and result["health"] > 0 else None
+    if plan.reliability_wear:
+        car["reliability"] = max(0.0, car["reliability"] - plan.reliability_wear)
+
+
+# Generator running a season round by round. After each round it yields
+# (season_round, result, standings), the standings already including the
+# round. Returns the SeasonResult. Each round's seed comes from seed.
+def iter_season(cars, plan, seed=None):
+    base_rng = RaceRNG(seed)
+    season_cars = {car["car_number"]: car for car in copy.deepcopy(cars)}
+    standings = Standings(cars, plan.points)
+    round_results = []
+    for season_round, round_rng in zip(plan.rounds, base_rng.spawn(len(plan.rounds))):
+        logging.info("Running %s (seed %s).", season_round.name, round_rng.seed)
+        result = simulate(list(season_cars.values()), season_round.track, season_round.laps, seed=round_rng.seed, engine=plan.engine, config=plan.config)
+        standings.add_round(result.results)
+        for car_result in result.results:
+            carry_over(season_cars[car_result["car_number"]], car_result, plan)
+        round_results.append(result)
+        yield season_round, result, standings
+    return SeasonResult(base_rng.seed, standings, round_results)
+
+
+def run_season(cars, plan, seed=None):
+    return main.exhaust(iter_season(cars, plan, seed))
+
+
+# Merged championship outcomes of many seasons.
+# positions maps car number -> list of championship finish counts, index 0 being the title.
+class TitleOdds:
+
+    def __init__(self, cars):
+        self.num_seasons = 0
+        self.positions = {car["car_number"]: [0] * len(cars) for car in cars}
+        self.driver_points = {car["car_number"]: 0 for car in cars}
+        self.team_titles = {car["team_name"]: 0 for car in cars}
+        self.team_points = {car["team_name"]: 0 for car in cars}
+
+    # Record one season's final standings.
+    def add_season(self, standings):
+        self.num_seasons += 1
+        for position, car_number in enumerate(standings.driver_order()):
+            self.positions[car_number][position] += 1
+            self.driver_points[car_number] += standings.driver_points[car_number]
+        self.team_titles[standings.team_order()[0]] += 1
+        for team_name, points in standings.team_points.items():
+            self.team_points[team_name] += points
+
+    # Fold another batch's counts into this one.
+    def merge(self, other):
+        self.num_seasons += other.num_seasons
+        for car_number, counts in other.positions.items():
+            merged = self.positions[car_number]
+            for i, count in enumerate(counts):
+                merged[i] += count
+            self.driver_points[car_number] += other.driver_points[car_number]
+        for team_name, titles in other.team_titles.items():
+            self.team_titles[team_name] += titles
+            self.team_points[team_name] += other.team_points[team_name]
+        return self
+
+    # Probability of each driver winning the title.
+    def driver_title_odds(self):
+        return {car_number: counts[0] / self.num_seasons if self.num_seasons else 0.0 for car_number, counts in self.positions.items()}
+
+    # Probability of each team winning the title.
+    def team_title_odds(self):
+        return {team_name: titles / self.num_seasons if self.num_seasons else 0.0 for team_name, titles in self.team_titles.items()}
+
+    # Average points per season, for drivers and for teams.
+    def mean_points(self):
+        seasons = max(self.num_seasons, 1)
+        return ({car_number: points / seasons for car_number, points in self.driver_points.items()},
+                {team_name: points / seasons for team_name, points in self.team_points.items()})
+
+
+# Worker entry point: run one chunk of seeded seasons.
+def run_season_batch(cars, plan, seeds):
+    odds = TitleOdds(cars)
+    for seed in seeds:
+        odds.add_season(run_season(cars, plan, seed).standings)
+    return odds
+
+
+# Run num_seasons independent seasons across worker processes and return
+# the merged TitleOdds. The season seeds are all derived from seed, so the
+# result is the same no matter how many workers are used.
+def run_title_odds(cars, plan, num_seasons, seed=None, workers=None):
+    base_rng = RaceRNG(seed)
+    seeds = [child.seed for child in base_rng.spawn(num_seasons)]
+    logging.info("Running %s seasons from base seed %s.", num_seasons, base_rng.seed)
+
+    workers = workers or os.cpu_count() or 1
+    odds = TitleOdds(cars)
+    if workers == 1:
+        return odds.merge(run_season_batch(cars, plan, seeds))
+
+    chunks = chunk_seeds(seeds, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_season_batch, cars, plan, chunk) for chunk in chunks]
+        for future in futures:
+            odds.merge(future.result())
+    return odds
+
+
+# Print the drivers' and teams' standings.
+def print_standings(cars, standings):
+    names = {car["car_number"]: car["driver_name"] for car in cars}
+    print("\tDrivers:")
+    for position, car_number in enumerate(standings.driver_order(), 1):
+        print(f"\t\t{position}. #{car_number} {names[car_number]}: {standings.driver_points[car_number]} pts, {standings.driver_wins[car_number]} wins")
+    print("\tTeams:")
+    for position, team_name in enumerate(standings.team_order(), 1):
+        print(f"\t\t{position}. {team_name}: {standings.team_points[team_name]} pts, {standings.team_wins[team_name]} wins")
+
+
+# Print each driver's and team's title odds and average points, favourites first.
+def print_title_odds(cars, odds):
+    names = {car["car_number"]: car["driver_name"] for car in cars}
+    driver_odds = odds.driver_title_odds()
+    team_odds = odds.team_title_odds()
+    driver_points, team_points = odds.mean_points()
+    print(f"Title odds over {odds.num_seasons} seasons:")
+    print("\tDrivers:")
+    for car_number in sorted(driver_odds, key=lambda car_number: (-driver_odds[car_number], -driver_points[car_number])):
+        print(f"\t\t#{car_number} {names[car_number]}: {driver_odds[car_number]:.3f}  ({driver_points[car_number]:.1f} pts)")
+    print("\tTeams:")
+    for team_name in sorted(team_odds, key=lambda team_name: (-team_odds[team_name], -team_points[team_name])):
+        print(f"\t\t{team_name}: {team_odds[team_name]:.3f}  ({team_points[team_name]:.1f} pts)")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Simulate a championship season, or many seasons for title odds.")
+    parser.add_argument("cars", help="JSON file where the cars are saved.")
+    parser.add_argument("calendar", help="JSON file with the season's rounds and rules.")
+    parser.add_argument("-n", "--seasons", type=int, default=1, help="Number of seasons to run; more than one reports title odds.")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed for the season and round seeds.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--engine", choices=("classic", "vector"), default=None, help="Race engine to use (default: the calendar's).")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    cars = load_cars_file(args.cars)
+    plan = read_calendar(args.calendar)
+    if args.engine is not None:
+        plan.engine = args.engine
+
+    if args.seasons > 1:
+        print_title_odds(cars, run_title_odds(cars, plan, args.seasons, seed=args.seed, workers=args.workers))
+        return
+
+    names = {car["car_number"]: car["driver_name"] for car in cars}
+    season = iter_season(cars, plan, args.seed)
+    for round_number, (season_round, result, standings) in enumerate(season, 1):
+        winner = result.results[0]
+        print(f"Round {round_number}, {season_round.name}: won by #{winner['car_number']} {names[winner['car_number']]}.")
+        print_standings(cars, standings)
+
+
+if __name__ == "__main__":
+    run_cli()
@@ -0,0 +1,115 @@
+import collections
+import copy
+
+import main
+from metrics import RaceMetrics
+from profiler import Profiler
+from race_context import RaceContext, RaceEvent
+from race_rng import RaceRNG
+
+
+# Headless simulation API.
+# Runs a race weekend without printing, prompting or touching the caller's
+# car dicts, and hands back a structured result. Commentary is only
+# produced if a sink is given.
+
+
+# Outcome of one simulated race weekend.
+# results is the classified field in finishing order, one dict per car.
+# statistics are the race's counters, metrics its full RaceMetrics.
+# profile is the Profiler report if the run was profiled, else None.
+class SimulationResult:
+
+    def __init__(self, seed, num_laps, results, statistics, profile=None, metrics=None):
+        self.seed = seed
+        self.num_laps = num_laps
+        self.results = results
+        self.statistics = statistics
+        self.profile = profile
+        self.metrics = metrics
+
+    # Finishing order as a list of car numbers.
+    def finishing_order(self):
+        return [car["car_number"] for car in self.results]
+
+    @classmethod
+    def from_dict(cls, result_dict):
+        metrics = RaceMetrics.from_dict(result_dict["metrics"]) if result_dict.get("metrics") is not None else None
+        return cls(result_dict["seed"], result_dict["num_laps"], result_dict["results"], result_dict["statistics"], result_dict.get("profile"), metrics)
+
+    def to_dict(self):
+        return {
+            "seed": self.seed,
+            "num_laps": self.num_laps,
+            "results": self.results,
+            "statistics": self.statistics,
+            "metrics": self.metrics.to_dict() if self.metrics is not None else None,
+            "profile": self.profile,
+        }
+
+
+# Reduce a finished car dict to the fields worth reporting.
+def classify(car):
+    return {
+        "car_number": car["car_number"],
+        "driver_name": car["driver_name"],
+        "team_name": car["team_name"],
+        "position": car["position"],
+        "race_time": car["race_time"],
+        "health": car["health"],
+    }
+
+
+# Simulate a full race weekend (qualifying and race) and return a SimulationResult.
+# cars and track are the parsed JSON structures; cars is not modified.
+# seed makes the run reproducible; a fresh one is picked and reported if None.
+# sink, if given, is called with every RaceEvent of commentary.
+# profile turns on the phase profiler; its report ends up in result.profile.
+# config is the RaceConfig of tuning constants; the defaults if None.
+# history, if given, is a LapHistory the race is recorded into as its next race.
+def simulate(cars, track, num_laps, seed=None, sink=None, engine="classic", profile=False, config=None, history=None):
+    ctx = RaceContext(sink=sink, rng=RaceRNG(seed), profiler=Profiler() if profile else None, config=config, recorder=history)
+    if history is not None:
+        history.begin_race(cars, ctx.rng.seed)
+    field = main.run_race_weekend(copy.deepcopy(cars), track, num_laps, engine=engine, ctx=ctx)
+    report = ctx.profiler.report() if profile else None
+    return SimulationResult(ctx.rng.seed, num_laps, [classify(car) for car in field], ctx.metrics.statistics(), report, ctx.metrics)
+
+
+# Simulate a race weekend as a stream of RaceEvents.
+# A generator: the weekend runs lap by lap as the caller iterates, and
+# each lap's events are handed over as soon as the lap is done, so only
+# one lap's worth of events is ever held. The last event is a
+# "race_result" carrying the classified field, statistics, metrics and seed.
+# sink, if given, also receives every event, e.g. a JsonlSink.
+def iter_events(cars, track, num_laps, seed=None, engine="classic", sink=None, config=None):
+    pending = collections.deque()
+    if sink is None:
+        collect = pending.append
+    else:
+        def collect(event):
+            pending.append(event)
+            sink(event)
+
+    ctx = RaceContext(sink=collect, rng=RaceRNG(seed), config=config)
+    laps = main.iter_race_weekend(copy.deepcopy(cars), track, num_laps, engine=engine, ctx=ctx)
+    while True:
+        try:
+            next(laps)
+        except StopIteration as stop:
+            field = stop.value
+            break
+        while pending:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+    result = RaceEvent("race_result", num_laps, "The chequered flag is out, the race is over!", {
+        "results": [classify(car) for car in field],
+        "statistics": ctx.metrics.statistics(),
+        "metrics": ctx.metrics.to_dict(),
+        "seed": ctx.rng.seed,
+    })
+    if sink is not None:
+        sink(result)
+    yield result
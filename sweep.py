@@ -0,0 +1,254 @@
+import argparse
+import collections
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from loaders import load_cars_file, load_track_file
+from race_config import DEFAULT_CONFIG, DEFAULTS
+from race_rng import RaceRNG
+from simulation import simulate
+
+
+# Sensitivity sweep over the tuning constants.
+# Evaluates many RaceConfigs, each over the same set of seeded race
+# weekends, across worker processes, and reports how each configuration
+# plays out: pass and crash rates, retirements and how spread out the
+# finishing order is. Every configuration sees the same seeds, so the
+# differences between them come from the constants rather than the dice.
+#
+# Configurations are either a full grid over listed values or a random
+# sample from ranges:
+#   python sweep.py cars.txt track.txt 30 --vary pass_threshold=0.3,0.4,0.5 --vary crash_base_factor=0.005,0.01,0.02
+#   python sweep.py cars.txt track.txt 30 --samples 2000 --vary failure_factor=0.9:1.3 --vary skill_threshold=0.1:0.4 --engine vector
+
+
+# Draws random_configs may make per configuration asked for before giving up on the ranges.
+MAX_DRAWS_PER_CONFIG = 100
+
+# The field and track of the current worker, set once per process by init_worker.
+worker_inputs = {}
+
+
+# Aggregated outcome of the races run under one configuration.
+class SweepPoint:
+
+    def __init__(self, config):
+        self.config = config
+        self.races = 0
+        self.successful_passes = 0
+        self.unsuccessful_passes = 0
+        self.crashes = 0
+        self.retirements = 0
+        self.lead_changes = 0
+        self.entries = 0
+        self.non_finishers = 0
+        self.spread_total = 0.0
+        self.margin_total = 0.0
+
+    # Record one finished race weekend.
+    def add_race(self, result):
+        self.races += 1
+        for key in ("successful_passes", "unsuccessful_passes", "crashes", "retirements", "lead_changes"):
+            setattr(self, key, getattr(self, key) + result.statistics[key])
+        finish_times = [car["race_time"] for car in result.results if car["race_time"] is not None]
+        self.entries += len(result.results)
+        self.non_finishers += len(result.results) - len(finish_times)
+        if len(finish_times) > 1:
+            self.spread_total += max(finish_times) - min(finish_times)
+            ordered = sorted(finish_times)
+            self.margin_total += ordered[1] - ordered[0]
+
+    # Rates per race, as a JSON-ready dictionary next to the constants that produced them.
+    def summary(self):
+        races = max(self.races, 1)
+        attempts = self.successful_passes + self.unsuccessful_passes
+        return {
+            "config": self.config.to_dict(),
+            "races": self.races,
+            "passes_per_race": self.successful_passes / races,
+            "pass_success_rate": self.successful_passes / attempts if attempts else 0.0,
+            "crashes_per_race": self.crashes / races,
+            "retirements_per_race": self.retirements / races,
+            "lead_changes_per_race": self.lead_changes / races,
+            "dnf_rate": self.non_finishers / self.entries if self.entries else 0.0,
+            "finishing_spread": self.spread_total / races,
+            "winning_margin": self.margin_total / races,
+        }
+
+
+# The constants that keep a configuration from being simulated at all.
+# crash_check divides by crash_threshold, and the grid needs at least one
+# qualifying lap. Empty for a configuration that can be simulated.
+def invalid_constants(config):
+    invalid = []
+    if config.corner_base_rng_val > config.corner_highest_rng_val:
+        invalid += ["corner_base_rng_val", "corner_highest_rng_val"]
+    if config.min_pitstop_time > config.max_pitstop_time:
+        invalid += ["min_pitstop_time", "max_pitstop_time"]
+    if config.sum_of_differences_weight == 0:
+        invalid.append("sum_of_differences_weight")
+    if config.crash_threshold <= 0:
+        invalid.append("crash_threshold")
+    if config.qualifying_runs < 1:
+        invalid.append("qualifying_runs")
+    return invalid
+
+
+# Whether a configuration can be simulated at all.
+def valid_config(config):
+    return not invalid_constants(config)
+
+
+# Every combination of the listed values, on top of base.
+# grid maps constant name -> list of values. Invalid combinations are left out.
+def grid_configs(grid, base=None):
+    base = base or DEFAULT_CONFIG
+    names = list(grid)
+    configs = [base.replace(**dict(zip(names, values))) for values in itertools.product(*(grid[name] for name in names))]
+    valid = [config for config in configs if valid_config(config)]
+    if len(valid) < len(configs):
+        logging.warning("Left out %s invalid combinations.", len(configs) - len(valid))
+    return valid
+
+
+# count configurations drawn uniformly from ranges, on top of base.
+# ranges maps constant name -> (low, high); constants whose default is
+# an integer are drawn as integers. Invalid draws are drawn again, up to
+# MAX_DRAWS_PER_CONFIG times the count in all.
+# A fresh seed is picked (and logged) if seed is None.
+#
+# Raises ValueError, naming the constants at fault, if the ranges give
+# too few valid configurations.
+def random_configs(ranges, count, seed=None, base=None):
+    base = base or DEFAULT_CONFIG
+    if seed is None:
+        seed = RaceRNG().seed
+    logging.info("Drawing %s configurations from seed %s.", count, seed)
+    rng = random.Random(f"{seed}:sweep")
+    configs = []
+    rejected = collections.Counter()
+    for _ in range(count * MAX_DRAWS_PER_CONFIG):
+        if len(configs) == count:
+            break
+        values = {}
+        for name, (low, high) in ranges.items():
+            if isinstance(DEFAULTS[name], int):
+                values[name] = rng.randint(int(low), int(high))
+            else:
+                values[name] = rng.uniform(low, high)
+        config = base.replace(**values)
+        invalid = invalid_constants(config)
+        if invalid:
+            rejected.update(invalid)
+        else:
+            configs.append(config)
+    if len(configs) < count:
+        names = ", ".join(name for name, _ in rejected.most_common())
+        raise ValueError(f"Only {len(configs)} of {count} configurations drawn were valid; check the ranges of {names}.")
+    return configs
+
+
+# Worker initializer: keep the field, track and seeds every task uses.
+def init_worker(cars, track, num_laps, seeds, engine):
+    worker_inputs.update(cars=cars, track=track, num_laps=num_laps, seeds=seeds, engine=engine)
+
+
+# Run every seeded race under one configuration.
+def evaluate_config(config):
+    point = SweepPoint(config)
+    for seed in worker_inputs["seeds"]:
+        point.add_race(simulate(worker_inputs["cars"], worker_inputs["track"], worker_inputs["num_laps"], seed=seed, engine=worker_inputs["engine"], config=config))
+    return point.summary()
+
+
+# Evaluate every configuration over races_per_config seeded race weekends
+# and return their summaries in the order given. The race seeds are all
+# derived from seed, so results don't depend on the number of workers.
+def run_sweep(cars, track, num_laps, configs, races_per_config, seed=None, workers=None, engine="classic"):
+    base_rng = RaceRNG(seed)
+    seeds = [child.seed for child in base_rng.spawn(races_per_config)]
+    workers = workers or os.cpu_count() or 1
+    logging.info("Sweeping %s configurations x %s races from base seed %s on %s workers.", len(configs), races_per_config, base_rng.seed, workers)
+
+    if workers == 1:
+        init_worker(cars, track, num_laps, seeds, engine)
+        return [evaluate_config(config) for config in configs]
+
+    # A few chunks per worker so slow configurations don't leave cores idle at the end.
+    chunksize = max(1, len(configs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cars, track, num_laps, seeds, engine)) as executor:
+        return list(executor.map(evaluate_config, configs, chunksize=chunksize))
+
+
+# Parse a --vary argument: "name=v1,v2,..." for a grid, "name=low:high" for a range.
+def parse_vary(text):
+    name, _, values = text.partition("=")
+    if name not in DEFAULTS:
+        raise argparse.ArgumentTypeError(f"Unknown tuning constant: {name}")
+    if ":" in values:
+        low, high = values.split(":", 1)
+        return name, (float(low), float(high))
+    return name, [type(DEFAULTS[name])(value) for value in values.split(",")]
+
+
+# Print one line per configuration: the constants that vary and the rates.
+def print_sweep(summaries, names):
+    for summary in summaries:
+        constants = " ".join(f"{name}={summary['config'][name]:.4g}" for name in names)
+        print(f"{constants}: passes {summary['passes_per_race']:.2f} ({summary['pass_success_rate']:.1%}) "
+              f"crashes {summary['crashes_per_race']:.3f} retirements {summary['retirements_per_race']:.3f} "
+              f"dnf {summary['dnf_rate']:.1%} spread {summary['finishing_spread']:.2f}s margin {summary['winning_margin']:.2f}s")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Sweep tuning constants over many seeded races and report pass, crash and retirement rates.")
+    parser.add_argument("cars", help="JSON file where the cars are saved.")
+    parser.add_argument("track", help="JSON file where the track is saved.")
+    parser.add_argument("laps", type=int, help="Number of laps per race.")
+    parser.add_argument("--vary", type=parse_vary, action="append", required=True, metavar="NAME=VALUES",
+                        help="Constant to vary: comma-separated values for a grid, or low:high with --samples.")
+    parser.add_argument("--samples", type=int, default=None, help="Draw this many random configurations from the low:high ranges instead of a grid.")
+    parser.add_argument("--config", default=None, help="JSON file of constant overrides to sweep around (default: the league's constants).")
+    parser.add_argument("--races", type=int, default=20, help="Seeded races per configuration.")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed for the race seeds and random sampling.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--engine", choices=("classic", "vector"), default="classic", help="Race engine to use.")
+    parser.add_argument("--output", default=None, help="Also write one JSON line per configuration to this file.")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    cars = load_cars_file(args.cars)
+    track = load_track_file(args.track)
+    base = DEFAULT_CONFIG if args.config is None else DEFAULT_CONFIG.replace(**main.read_json_file(args.config))
+
+    varied = dict(args.vary)
+    if args.samples is not None:
+        if any(not isinstance(values, tuple) for values in varied.values()):
+            sys.exit("--samples needs every --vary to be a low:high range.")
+        try:
+            configs = random_configs(varied, args.samples, args.seed, base)
+        except ValueError as error:
+            sys.exit(str(error))
+    else:
+        if any(isinstance(values, tuple) for values in varied.values()):
+            sys.exit("low:high ranges need --samples; use comma-separated values for a grid.")
+        configs = grid_configs(varied, base)
+
+    summaries = run_sweep(cars, track, args.laps, configs, args.races, seed=args.seed, workers=args.workers, engine=args.engine)
+    print_sweep(summaries, list(varied))
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            for summary in summaries:
+                output_file.write(json.dumps(summary) + "\n")
+
+
+if __name__ == "__main__":
+    run_cli()
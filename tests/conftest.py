@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to cars.txt and track.txt.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loaders import load_cars_file, load_track_file
+
+
+@pytest.fixture
+def cars():
+    return load_cars_file(os.path.join(ROOT, "cars.txt"))
+
+
+@pytest.fixture
+def track():
+    return load_track_file(os.path.join(ROOT, "track.txt"))
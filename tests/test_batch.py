@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from batch import read_manifest, run_batch
+from race_config import DEFAULT_CONFIG
+from simulation import simulate
+
+
+def write_manifest(tmp_path, cars, track, jobs):
+    (tmp_path / "cars.json").write_text(json.dumps(cars))
+    (tmp_path / "track.json").write_text(json.dumps(track))
+    (tmp_path / "manifest.json").write_text(json.dumps({"engine": "classic", "jobs": jobs}))
+    return str(tmp_path / "manifest.json")
+
+
+def read_records(path):
+    with open(path) as output_file:
+        return [json.loads(line) for line in output_file]
+
+
+def test_batch_matches_simulate_whatever_the_workers(cars, track, tmp_path):
+    manifest = write_manifest(tmp_path, cars, track, [
+        {"cars": "cars.json", "track": "track.json", "laps": 4, "seeds": [1, 2, 3]},
+        {"cars": "cars.json", "track": "track.json", "laps": 5, "seed": 7, "engine": "vector", "config": {"tyre_wear": 0.05}},
+    ])
+    runs = read_manifest(manifest)
+    assert [(run.job, run.seed, run.engine) for run in runs] == [(0, 1, "classic"), (0, 2, "classic"), (0, 3, "classic"), (1, 7, "vector")]
+    assert run_batch(runs, str(tmp_path / "serial.jsonl"), workers=1) == 4
+    run_batch(runs, str(tmp_path / "parallel.jsonl"), workers=2)
+    records = read_records(tmp_path / "serial.jsonl")
+    assert read_records(tmp_path / "parallel.jsonl") == records
+
+    for run, record in zip(runs, records):
+        expected = simulate(cars, track, run.laps, seed=run.seed, engine=run.engine, config=run.config).to_dict()
+        del expected["profile"]
+        assert {key: record[key] for key in expected} == json.loads(json.dumps(expected))
+        assert (record["job"], record["engine"]) == (run.job, run.engine)
+    assert records[-1]["config"] == DEFAULT_CONFIG.replace(tyre_wear=0.05).to_dict()
+
+
+@pytest.mark.parametrize("job, message", [
+    ({"cars": "cars.json", "laps": 4}, 'missing "track"'),
+    ({"cars": "cars.json", "track": "track.json", "laps": 0}, "invalid lap count"),
+    ({"cars": "cars.json", "track": "track.json", "laps": 4, "engine": "warp"}, "unknown race engine"),
+    ({"cars": "cars.json", "track": "track.json", "laps": 4, "config": {"no_such_constant": 1}}, "bad config"),
+])
+def test_bad_manifest_jobs_are_rejected(cars, track, tmp_path, job, message):
+    with pytest.raises(ValueError, match=message):
+        read_manifest(write_manifest(tmp_path, cars, track, [job]))
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from checkpoint import dump_snapshot, load_snapshot, read_snapshot_file, resume, simulate_with_checkpoints
+from race_config import DEFAULT_CONFIG
+from simulation import simulate
+
+# Retirements, tyre wear and two-stop strategies, so a resumed race has to carry every kind of state on.
+CONFIG = DEFAULT_CONFIG.replace(failure_factor=0.7, tyre_wear=0.05)
+
+
+def with_strategies(cars):
+    return [dict(car, pit_laps=[3, 7]) if i % 2 else car for i, car in enumerate(cars)]
+
+
+# A race resumed from the snapshot of any lap finishes exactly as the
+# uninterrupted race did, with the same metrics.
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_resume_from_every_lap_matches_uninterrupted_race(cars, track, engine, tmp_path):
+    cars = with_strategies(cars)
+    result = simulate_with_checkpoints(cars, track, 10, str(tmp_path), every=1, seed=21, engine=engine, config=CONFIG)
+    expected = simulate(cars, track, 10, seed=21, engine=engine, config=CONFIG).to_dict()
+    assert result.to_dict() == expected
+    assert expected["statistics"]["retirements"] > 0
+
+    snapshots = sorted(os.listdir(tmp_path))
+    assert snapshots == [f"lap_{lap:04d}.snap" for lap in range(1, 11)]
+    for name in snapshots:
+        snapshot = read_snapshot_file(os.path.join(tmp_path, name))
+        assert resume(snapshot).to_dict() == expected, name
+        # Resuming doesn't use the snapshot up.
+        assert resume(snapshot).to_dict() == expected, name
+
+
+def test_branching_with_a_new_seed_keeps_the_laps_before(cars, track, tmp_path):
+    simulate_with_checkpoints(cars, track, 10, str(tmp_path), every=5, seed=21, config=CONFIG)
+    snapshot = read_snapshot_file(os.path.join(tmp_path, "lap_0005.snap"))
+    branch = resume(snapshot, seed=99)
+    assert branch.seed == 99
+    assert branch.metrics.to_dict()["counters"]["successful_passes"] >= snapshot.metrics["counters"]["successful_passes"]
+
+
+def test_snapshot_round_trip_and_bad_data(cars, track):
+    import main
+    from race_context import RaceContext
+    from race_rng import RaceRNG
+
+    ctx = RaceContext(rng=RaceRNG(1))
+    laps = main.iter_race_weekend([dict(car) for car in with_strategies(cars)], track, 6, ctx=ctx)
+    state = next(laps)
+    snapshot = load_snapshot(dump_snapshot(state, track, 6, ctx))
+    assert snapshot.lap == 1 and snapshot.num_laps == 6
+    # Cars without a strategy read the same with pit_laps None.
+    assert [{key: value for key, value in car.items() if value is not None} for car in snapshot.field] == state.field
+    with pytest.raises(ValueError):
+        load_snapshot(b"not a snapshot")
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from main import estimate_race_time
+from simulation import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARS = os.path.join(ROOT, "cars.txt")
+TRACK = os.path.join(ROOT, "track.txt")
+
+
+# Run python with args in a fresh interpreter from cwd, with nothing on stdin.
+def run_python(args, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60)
+
+
+def test_import_stays_lean(tmp_path):
+    check = "import sys, main, estimator; print(sorted(name for name in ('numpy', 'secrets', 'concurrent.futures') if name in sys.modules))"
+    assert run_python(["-c", check], tmp_path).stdout.strip() == "[]"
+
+
+def test_estimate_needs_no_prompt_or_log(cars, track, tmp_path):
+    run = run_python(["-m", "main", CARS, TRACK, "12", "--estimate"], tmp_path)
+    assert run.returncode == 0
+    assert run.stdout == f"The estimated race time is {estimate_race_time(cars, track, 12) / 60.0} minutes long.\n"
+    assert os.listdir(tmp_path) == []
+    assert run_python(["-m", "main", CARS, "--estimate"], tmp_path).returncode != 0
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_scripted_race_runs_without_prompts(cars, track, tmp_path, engine):
+    run = run_python([os.path.join(ROOT, "main.py"), CARS, TRACK, "4", "--yes", "--seed", "42", "--engine", engine, "--log", "race.log"], tmp_path)
+    assert run.returncode == 0, run.stderr
+    expected = simulate(cars, track, 4, seed=42, engine=engine)
+    # The results table comes last, after the lap by lap standings.
+    race_times = [line.split(": ", 1)[1] for line in run.stdout.splitlines() if line.startswith("\t\tRace time: ")]
+    assert race_times[-len(cars):] == [str(car["race_time"]) for car in expected.results]
+    assert f"\tRetirements: {expected.statistics['retirements']}" in run.stdout.splitlines()
+    assert os.listdir(tmp_path) == ["race.log"]
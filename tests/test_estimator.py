@@ -0,0 +1,48 @@
+import math
+import random
+
+import pytest
+
+from estimator import clipped_normal_moments, compare_with_monte_carlo, count_distribution, estimate_race, finish_probability
+from monte_carlo import run_championship_odds
+from simulation import simulate
+
+
+def with_pit_laps(cars, pit_laps):
+    return [dict(car, pit_laps=pit_laps) if i == 0 else car for i, car in enumerate(cars)]
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_repeated_pit_lap_is_one_stop(cars, track, engine):
+    once = simulate(with_pit_laps(cars, [5]), track, 8, seed=3, engine=engine)
+    twice = simulate(with_pit_laps(cars, [5, 5]), track, 8, seed=3, engine=engine)
+    assert twice.to_dict() == once.to_dict()
+    assert estimate_race(with_pit_laps(cars, [5, 5]), track, 8).to_dict() == estimate_race(with_pit_laps(cars, [5]), track, 8).to_dict()
+
+
+def test_distribution_helpers():
+    # Bounds far out in the tails leave the normal as it is.
+    mean, variance = clipped_normal_moments(40.0, 3.0, 0.0, 100.0)
+    assert (mean, variance) == pytest.approx((40.0, 9.0))
+    rng = random.Random(0)
+    draws = [min(45.0, max(38.0, rng.gauss(40.0, 3.0))) for _ in range(20000)]
+    sample_mean = sum(draws) / len(draws)
+    sample_variance = sum((draw - sample_mean) ** 2 for draw in draws) / len(draws)
+    assert clipped_normal_moments(40.0, 3.0, 38.0, 45.0) == pytest.approx((sample_mean, sample_variance), rel=0.02)
+
+    assert count_distribution([0.5, 0.5, 0.5]) == pytest.approx([0.125, 0.375, 0.375, 0.125])
+    assert finish_probability(0.0, 30, 3) == 1.0
+    assert finish_probability(1.0, 30, 3) == 0.0
+    assert finish_probability(0.1, 10, 2) == pytest.approx(0.9 ** 10 + 10 * 0.1 * 0.9 ** 9)
+
+
+def test_estimate_tracks_monte_carlo(cars, track):
+    estimate = estimate_race(cars, track, 10)
+    for car in estimate.cars:
+        assert math.fsum(car.position_probabilities) == pytest.approx(1.0)
+        assert 1.0 <= car.expected_position() <= len(cars)
+    comparison = compare_with_monte_carlo(estimate, run_championship_odds(cars, track, 10, 200, seed=1, workers=1))
+    for car in comparison["cars"].values():
+        assert car["race_time"] == pytest.approx(car["simulated_race_time"], rel=0.005)
+        assert car["expected_position"] == pytest.approx(car["simulated_position"], abs=1.5)
+    assert comparison["mean_distance"] < 0.5
@@ -0,0 +1,45 @@
+import io
+import json
+
+import pytest
+
+from race_context import EVENT_KINDS, JsonlSink
+from simulation import iter_events, simulate
+
+NUM_LAPS = 6
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_jsonl_sink_round_trips_the_stream(cars, track, engine, tmp_path):
+    path = str(tmp_path / "race.jsonl")
+    with JsonlSink(path) as sink:
+        events = list(iter_events(cars, track, NUM_LAPS, seed=5, engine=engine, sink=sink))
+    with open(path) as jsonl_file:
+        written = [json.loads(line) for line in jsonl_file]
+    assert written == json.loads(json.dumps([event.to_dict() for event in events]))
+
+    for event in events:
+        assert set(event.fields) == set(EVENT_KINDS[event.kind])
+    assert [event.fields["lap"] for event in events if event.kind == "lap_complete"] == list(range(1, NUM_LAPS + 1))
+    laps = [event.lap for event in events]
+    assert laps == sorted(laps)
+
+    # The stream ends with the same result simulate gives.
+    expected = simulate(cars, track, NUM_LAPS, seed=5, engine=engine).to_dict()
+    result = written[-1]
+    assert result["kind"] == "race_result"
+    assert result["fields"]["results"] == expected["results"]
+    assert result["fields"]["statistics"] == expected["statistics"]
+    assert result["fields"]["metrics"] == expected["metrics"]
+    assert result["fields"]["seed"] == 5
+
+
+def test_jsonl_sink_filters_kinds_and_adds_messages(cars, track):
+    output = io.StringIO()
+    sink = JsonlSink(output, include_message=True, kinds=["lap_complete", "race_result"])
+    for _ in iter_events(cars, track, 3, seed=2, sink=sink):
+        pass
+    sink.close()
+    written = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [event["kind"] for event in written] == ["lap_complete"] * 3 + ["race_result"]
+    assert all(event["message"] for event in written)
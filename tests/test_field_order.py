@@ -0,0 +1,47 @@
+import random
+
+import main
+from field_order import FieldOrder
+from race_context import RaceContext
+from race_rng import RaceRNG
+
+
+def make_field(race_times):
+    return [{"car_number": str(i), "position": i + 1, "race_time": race_time, "health": 3} for i, race_time in enumerate(race_times)]
+
+
+def test_sort_running_keeps_tied_cars_in_position_order():
+    order = FieldOrder(make_field([3.0, 1.0, 1.0, 2.0]))
+    order.sort_running()
+    assert [car["car_number"] for car in order] == ["1", "2", "3", "0"]
+    assert [car["position"] for car in order] == [1, 2, 3, 4]
+
+
+def test_retire_moves_car_to_head_of_dnf_block():
+    cars = make_field([1.0, 2.0, 3.0, None])
+    cars[3]["health"] = 0
+    order = FieldOrder(cars)
+    cars[0]["race_time"] = None
+    order.retire(cars[0])
+    assert [car["car_number"] for car in order] == ["1", "2", "0", "3"]
+    assert order.last_running() == 2
+
+
+# A retirement re-sorts the field the way update_positions did: running
+# cars by race time, ties in the order of the list handed in, which need
+# not be position order.
+def test_breakdown_breaks_ties_like_update_positions():
+    rng = random.Random(5)
+    for _ in range(200):
+        field = make_field([rng.choice((1.0, 2.0, 3.0)) for _ in range(8)])
+        rng.shuffle(field)
+        victim = rng.choice(field)
+        victim["health"] = 1
+
+        expected = [dict(car) for car in field]
+        expected_victim = next(car for car in expected if car["car_number"] == victim["car_number"])
+        expected_victim.update(health=0, race_time=None)
+        expected = main.update_positions(expected, random.Random(0))
+
+        result = main.apply_breakdown(field, victim, RaceContext(rng=RaceRNG(0)))
+        assert [car["car_number"] for car in result] == [car["car_number"] for car in expected]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from lap_history import MAX_SEED, LapHistory, load_history, record_history
+from race_config import DEFAULT_CONFIG
+from simulation import simulate
+
+# Enough retirements that some columns read NaN before the flag.
+CONFIG = DEFAULT_CONFIG.replace(failure_factor=0.7)
+
+NUM_LAPS = 8
+
+
+def assert_same_history(history, other):
+    assert (history.car_numbers, history.num_laps, history.num_items, history.races) == (other.car_numbers, other.num_laps, other.num_items, other.races)
+    for name, array in history.arrays.items():
+        np.testing.assert_array_equal(array[:history.races], other.arrays[name][:other.races])
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_recorded_laps_match_results(cars, track, engine):
+    history = LapHistory.for_race(cars, track, NUM_LAPS, max_races=3)
+    for seed in range(3):
+        result = simulate(cars, track, NUM_LAPS, seed=seed, engine=engine, config=CONFIG, history=history)
+        assert history.seeds[seed] == seed
+        for car in result.results:
+            column = history.columns[car["car_number"]]
+            race_time = history.race_times[seed, -1, column]
+            if car["race_time"] is None:
+                assert np.isnan(race_time)
+            else:
+                assert race_time == car["race_time"]
+                assert history.positions[seed, -1, column] == car["position"]
+    assert history.races == 3
+
+
+def test_dump_and_load_round_trip(cars, track, tmp_path):
+    history = LapHistory.for_race(cars, track, NUM_LAPS, max_races=5)
+    for seed in (4, 9):
+        simulate(cars, track, NUM_LAPS, seed=seed, config=CONFIG, history=history)
+    history.dump(str(tmp_path / "history.bin"))
+    assert_same_history(history, load_history(str(tmp_path / "history.bin")))
+
+
+def test_record_history_does_not_depend_on_workers(cars, track, tmp_path):
+    serial = record_history(cars, track, NUM_LAPS, 6, str(tmp_path / "serial.bin"), seed=3, workers=1)
+    parallel = record_history(cars, track, NUM_LAPS, 6, str(tmp_path / "parallel.bin"), seed=3, workers=2)
+    assert serial.races == 6
+    assert_same_history(serial, parallel)
+
+
+def test_unrecordable_seed_is_refused(cars, track):
+    history = LapHistory.for_race(cars, track, NUM_LAPS, max_races=2)
+    for seed in (-1, MAX_SEED + 1):
+        with pytest.raises(ValueError, match="seeds from 0"):
+            simulate(cars, track, NUM_LAPS, seed=seed, history=history)
+        assert history.races == 0
+    simulate(cars, track, NUM_LAPS, seed=MAX_SEED, history=history)
+    assert history.seeds[0] == MAX_SEED
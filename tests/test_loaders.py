@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+import loaders
+from loaders import SchemaError, iter_cars_file, load_cars_file, validate_cars, validate_track
+
+
+def write_json(path, value):
+    with open(path, "w") as json_file:
+        json.dump(value, json_file, indent=1)
+    return str(path)
+
+
+# Streaming yields the same cars as loading, whatever the chunk size.
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 16])
+def test_stream_matches_load(cars, tmp_path, monkeypatch, chunk_size):
+    path = write_json(tmp_path / "cars.json", cars)
+    monkeypatch.setattr(loaders, "STREAM_CHUNK_SIZE", chunk_size)
+    assert list(iter_cars_file(path)) == cars
+
+
+def test_stream_rejects_empty_roster(tmp_path):
+    path = write_json(tmp_path / "empty.json", [])
+    with pytest.raises(SchemaError) as streamed:
+        list(iter_cars_file(path))
+    with pytest.raises(SchemaError) as loaded:
+        validate_cars([], path)
+    assert str(streamed.value) == str(loaded.value)
+
+
+def test_stream_rejects_duplicate_car_numbers(cars, tmp_path):
+    roster = cars + [dict(cars[3], driver_name="Someone Else")]
+    path = write_json(tmp_path / "cars.json", roster)
+    with pytest.raises(SchemaError) as streamed:
+        list(iter_cars_file(path))
+    with pytest.raises(SchemaError) as loaded:
+        validate_cars(roster)
+    assert streamed.value.errors == loaded.value.errors
+
+
+def test_stream_reports_bad_car_and_bad_json(cars, tmp_path):
+    bad = [dict(cars[0])]
+    del bad[0]["power"]
+    with pytest.raises(SchemaError, match='missing "power"'):
+        list(iter_cars_file(write_json(tmp_path / "bad.json", bad)))
+    (tmp_path / "broken.json").write_text(json.dumps(cars[:2])[:-1] + " {}]")
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_cars_file(str(tmp_path / "broken.json")))
+
+
+def test_validation_collects_every_error(track):
+    with pytest.raises(SchemaError) as error:
+        validate_track({"reliability_rating": True, "items": {"1": dict(track["items"]["1"], is_lap_end=False, power="fast")}})
+    assert len(error.value.errors) == 2
+
+
+def test_load_is_memoized_by_mtime(cars, tmp_path):
+    path = write_json(tmp_path / "cars.json", cars)
+    first = load_cars_file(path)
+    assert load_cars_file(path) is first
+    write_json(tmp_path / "cars.json", cars[:5])
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert len(load_cars_file(path)) == 5
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from metrics import COUNTERS, HISTOGRAMS, Histogram, RaceMetrics, write_metrics
+from monte_carlo import run_championship_odds
+from race_config import DEFAULT_CONFIG
+from simulation import simulate
+
+# Enough retirements, pit stops and passes that every metric sees values.
+CONFIG = DEFAULT_CONFIG.replace(failure_factor=0.8)
+
+
+def race_metrics(cars, track, seed, engine="classic"):
+    cars = [dict(car, pit_laps=[5]) if i % 2 else car for i, car in enumerate(cars)]
+    return simulate(cars, track, 12, seed=seed, engine=engine, config=CONFIG)
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram((1, 2))
+    for value in (0.5, 1, 1.5, 2, 3):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.count() == 5
+    assert histogram.mean() == pytest.approx(1.6)
+    with pytest.raises(ValueError):
+        histogram.merge(Histogram((1, 3)))
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_statistics_are_the_counters(cars, track, engine):
+    result = race_metrics(cars, track, 3, engine)
+    assert result.statistics == result.metrics.counters
+    assert set(result.statistics) == set(COUNTERS)
+    assert result.metrics.races == 1
+    histograms = result.metrics.histograms
+    assert histograms["retirement_lap"].count() == result.statistics["retirements"]
+    assert histograms["pit_stop_time"].count() > 0
+    assert histograms["pass_attempt_gap"].count() >= result.statistics["successful_passes"]
+
+
+def test_merge_adds_up_races(cars, track):
+    races = [race_metrics(cars, track, seed).metrics for seed in range(3)]
+    total = RaceMetrics(races=0)
+    for metrics in races:
+        total.merge(metrics)
+    assert total.races == 3
+    for name in COUNTERS:
+        assert total.counters[name] == sum(metrics.counters[name] for metrics in races)
+    for name in HISTOGRAMS:
+        assert total.histograms[name].counts == [sum(counts) for counts in zip(*(metrics.histograms[name].counts for metrics in races))]
+        assert total.histograms[name].total == pytest.approx(sum(metrics.histograms[name].total for metrics in races))
+
+
+def test_dict_round_trip(cars, track):
+    metrics = race_metrics(cars, track, 4).metrics
+    metrics_dict = json.loads(json.dumps(metrics.to_dict()))
+    assert RaceMetrics.from_dict(metrics_dict).to_dict() == metrics.to_dict()
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = RaceMetrics()
+    metrics.count("crashes", 2)
+    for gap in (0.01, 0.3, 0.3, 7.0):
+        metrics.observe("pass_attempt_gap", gap)
+    lines = metrics.to_prometheus().splitlines()
+    assert "race_races_total 1" in lines
+    assert "race_crashes_total 2" in lines
+    buckets = [line for line in lines if line.startswith("race_pass_attempt_gap_bucket")]
+    assert buckets[0] == 'race_pass_attempt_gap_bucket{le="0.05"} 1'
+    assert 'race_pass_attempt_gap_bucket{le="0.3"} 3' in buckets
+    assert buckets[-1] == 'race_pass_attempt_gap_bucket{le="+Inf"} 4'
+    assert "race_pass_attempt_gap_count 4" in lines
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+
+
+def test_write_metrics_picks_the_format(tmp_path):
+    metrics = RaceMetrics()
+    metrics.count("lead_changes")
+    write_metrics(metrics, str(tmp_path / "race.prom"))
+    write_metrics(metrics, str(tmp_path / "race.json"))
+    assert (tmp_path / "race.prom").read_text() == metrics.to_prometheus()
+    assert RaceMetrics.from_dict(json.loads((tmp_path / "race.json").read_text())).to_dict() == metrics.to_dict()
+
+
+def test_monte_carlo_metrics_do_not_depend_on_workers(cars, track):
+    serial = run_championship_odds(cars, track, 8, 12, seed=5, workers=1, config=CONFIG).metrics
+    parallel = run_championship_odds(cars, track, 8, 12, seed=5, workers=2, config=CONFIG).metrics
+    assert serial.races == parallel.races == 12
+    assert serial.counters == parallel.counters
+    for name in HISTOGRAMS:
+        assert serial.histograms[name].counts == parallel.histograms[name].counts
+        assert serial.histograms[name].total == pytest.approx(parallel.histograms[name].total)
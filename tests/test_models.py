@@ -0,0 +1,37 @@
+import pickle
+
+import pytest
+
+from models import Car, Track, load_cars
+from simulation import simulate
+
+
+def test_missing_key_raises_key_error(cars):
+    car = Car.from_dict(cars[0])
+    assert car["power"] == cars[0]["power"]
+    with pytest.raises(KeyError):
+        car["race_time"]
+    with pytest.raises(KeyError):
+        car["not_a_key"]
+    # Methods are not keys.
+    with pytest.raises(KeyError):
+        car["to_dict"]
+    assert car.get("race_time") is None
+    assert car.get("power") == cars[0]["power"]
+    assert car.get("keys") is None
+    assert car.get("to_dict", "missing") == "missing"
+    assert "race_time" not in car
+
+
+def test_models_round_trip(cars, track):
+    loaded = load_cars(cars)
+    assert [car.to_dict() for car in loaded] == cars
+    assert Track.from_dict(track).to_dict() == track
+    assert pickle.loads(pickle.dumps(loaded)) == loaded
+
+
+# The dict-style adapter lets the engines race models unchanged.
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_simulate_models_matches_dicts(cars, track, engine):
+    expected = simulate(cars, track, 5, seed=3, engine=engine).to_dict()
+    assert simulate(load_cars(cars), Track.from_dict(track), 5, seed=3, engine=engine).to_dict() == expected
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from profiler import LAP_BUCKETS, PHASES, Profiler
+from simulation import simulate
+
+NUM_LAPS = 6
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_profile_report_covers_every_phase_and_lap(cars, track, engine):
+    result = simulate(cars, track, NUM_LAPS, seed=1, engine=engine, profile=True)
+    phases = result.profile["phases"]
+    assert list(phases) == list(PHASES)
+    assert phases["qualifying"]["calls"] == 1
+    assert phases["reliability"]["calls"] == phases["pass_resolution"]["calls"] == NUM_LAPS
+    assert all(phase["calls"] > 0 and phase["total_seconds"] >= 0.0 for phase in phases.values())
+    laps = result.profile["laps"]
+    assert laps["count"] == NUM_LAPS
+    assert sum(laps["histogram"]["counts"]) == NUM_LAPS
+    assert laps["p50_seconds"] <= laps["p90_seconds"] <= laps["max_seconds"]
+    # Profiling times the race without changing it.
+    unprofiled = simulate(cars, track, NUM_LAPS, seed=1, engine=engine)
+    assert unprofiled.profile is None
+    assert dict(result.to_dict(), profile=None) == unprofiled.to_dict()
+
+
+def test_lap_histogram_and_quantiles():
+    profiler = Profiler()
+    assert profiler.lap_quantile(0.5) is None
+    for elapsed in (0.00005, 0.0001, 0.0003, 5.0):
+        profiler.record_lap(elapsed)
+    counts = profiler.lap_histogram()["counts"]
+    assert len(counts) == len(LAP_BUCKETS) + 1
+    assert counts[:3] == [2, 0, 1] and counts[-1] == 1
+    assert profiler.lap_quantile(0.5) == 0.0003
+    assert profiler.lap_quantile(1.0) == 5.0
+
+
+def test_finish_writes_the_report(tmp_path):
+    profiler = Profiler(report_path=str(tmp_path / "profile.json"))
+    with profiler.phase("pit_stops"):
+        pass
+    profiler.record("pit_stops", 0.5)
+    report = profiler.finish()
+    assert report["phases"]["pit_stops"]["calls"] == 2
+    assert report["phases"]["pit_stops"]["mean_seconds"] >= 0.25
+    assert json.loads((tmp_path / "profile.json").read_text()) == report
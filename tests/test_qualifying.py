@@ -0,0 +1,68 @@
+import copy
+
+import pytest
+
+import main
+import vector_engine
+from race_config import DEFAULT_CONFIG
+from race_context import RaceContext
+from race_rng import RaceRNG
+from simulation import simulate
+
+# Half of all reliability checks fail, so best-of-N qualifying retires cars.
+FRAGILE = DEFAULT_CONFIG.replace(failure_factor=0.05, qualifying_runs=5)
+
+QUALIFIERS = {"classic": main.run_qualifying, "vector": vector_engine.run_qualifying_vectorized}
+
+
+def fresh_field(cars):
+    field = copy.deepcopy(cars)
+    for car in field:
+        car.update(race_time=0.0, position=0, health=FRAGILE.starting_health)
+    return field
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_cars_retiring_in_qualifying_line_up_last(cars, track, engine):
+    field = fresh_field(cars)
+    grid = QUALIFIERS[engine](field, track, RaceContext(rng=RaceRNG(4), config=FRAGILE))
+    retired = [car for car in field if car["health"] < 1]
+    running = [car for car in field if car["health"] > 0]
+    assert retired and running
+    assert sorted(grid.values()) == list(range(1, len(field) + 1))
+    assert max(grid[car["car_number"]] for car in running) < min(grid[car["car_number"]] for car in retired)
+    assert all(car["race_time"] is not None for car in field)
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_best_of_n_lap_is_the_fastest_run(cars, track, engine):
+    config = DEFAULT_CONFIG.replace(qualifying_runs=4)
+    one = fresh_field(cars)
+    QUALIFIERS[engine](one, track, RaceContext(rng=RaceRNG(4), config=DEFAULT_CONFIG))
+    best = fresh_field(cars)
+    QUALIFIERS[engine](best, track, RaceContext(rng=RaceRNG(4), config=config))
+    # Each car's laps are drawn in turn, so the first car's first lap is the same either way.
+    if engine == "classic":
+        assert best[0]["race_time"] <= one[0]["race_time"]
+    # Every best lap is a single lap, not runs added together.
+    assert max(car["race_time"] for car in best) < 1.5 * min(car["race_time"] for car in best)
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_race_after_qualifying_retirements(cars, track, engine):
+    result = simulate(cars, track, 3, seed=4, engine=engine, config=FRAGILE)
+    finishers = [car for car in result.results if car["race_time"] is not None]
+    assert [car["position"] for car in result.results] == list(range(1, len(cars) + 1))
+    assert result.results[:len(finishers)] == finishers
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_qualifying_retirements_stay_out_of_race_metrics(cars, track, engine):
+    # Every reliability check fails, so the whole field retires in qualifying.
+    ctx = RaceContext(rng=RaceRNG(4), config=DEFAULT_CONFIG.replace(failure_factor=0.0, qualifying_runs=DEFAULT_CONFIG.starting_health))
+    field = fresh_field(cars)
+    QUALIFIERS[engine](field, track, ctx)
+    assert all(car["health"] < 1 for car in field)
+    assert ctx.metrics.counters["lead_changes"] == 0
+    assert ctx.metrics.counters["retirements"] == 0
+    assert ctx.metrics.histograms["retirement_lap"].count() == 0
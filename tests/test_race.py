@@ -0,0 +1,71 @@
+import copy
+import random
+
+import pytest
+
+import main
+import vector_engine
+from field_order import FieldOrder
+from race_context import RaceContext
+from race_rng import RaceRNG
+
+RUN_RACE = {"classic": main.run_race, "vector": vector_engine.run_race_vectorized}
+ITER_RACE = {"classic": main.iter_race, "vector": vector_engine.iter_race_vectorized}
+
+
+# A field on the grid, ready for run_race.
+def grid(cars):
+    field = copy.deepcopy(cars)
+    for i, car in enumerate(field):
+        car.update(race_time=0.25 * i, position=i + 1, health=3)
+    return field
+
+
+def test_contacts_are_the_pairs_with_non_negative_gaps():
+    rng = random.Random(3)
+    for _ in range(200):
+        times = [rng.choice((rng.uniform(-0.5, 0.5), 0.0, 1.0)) for _ in range(12)]
+        field = [{"car_number": str(i), "position": i + 1, "race_time": sum(times[:i + 1]), "health": 3} for i in range(12)]
+        retired = rng.randrange(13)
+        for car in field[retired:]:
+            car["race_time"] = None
+        order = FieldOrder(field)
+        start = rng.randrange(1, 13)
+        expected = [i for i in range(start, order.last_running()) if field[i - 1]["race_time"] - field[i]["race_time"] >= 0]
+        assert order.contacts(start) == expected
+
+
+def test_negative_gap_exists_matches_pairwise_check():
+    assert not main.negative_gap_exists([{"race_time": t} for t in (1.0, 2.0, 3.0, None, None)])
+    assert main.negative_gap_exists([{"race_time": t} for t in (1.0, 2.0, 2.0)])
+    # The leader's gap isn't checked.
+    assert not main.negative_gap_exists([{"race_time": t} for t in (2.0, 1.0, 3.0)])
+
+
+# Stepping a race lap by lap through its generator gives the same race as
+# running it in one go, including the state handed back after every lap.
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_iter_race_matches_run_race(cars, track, engine):
+    expected = RUN_RACE[engine](grid(cars), track, 10, RaceContext(rng=RaceRNG(11)))
+
+    ctx = RaceContext(rng=RaceRNG(11))
+    race = ITER_RACE[engine](grid(cars), track, 10, ctx)
+    laps = []
+    while True:
+        try:
+            state = next(race)
+        except StopIteration as stop:
+            result = stop.value
+            break
+        laps.append(state.lap)
+    assert laps == list(range(1, 11))
+    assert result == expected
+
+
+@pytest.mark.parametrize("engine", ["classic", "vector"])
+def test_race_weekend_generator_matches_run_race_weekend(cars, track, engine):
+    expected_ctx = RaceContext(rng=RaceRNG(5))
+    expected = main.run_race_weekend(copy.deepcopy(cars), track, 8, engine, expected_ctx)
+    ctx = RaceContext(rng=RaceRNG(5))
+    assert main.exhaust(main.iter_race_weekend(copy.deepcopy(cars), track, 8, engine, ctx)) == expected
+    assert ctx.metrics.to_dict() == expected_ctx.metrics.to_dict()
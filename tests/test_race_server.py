@@ -0,0 +1,104 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+from race_server import RaceServer, RequestError, run_streamed_race, stream_race
+from simulation import simulate
+
+
+# Run coroutine(server) against a fresh server on a free port.
+def with_server(coroutine, **options):
+    async def run():
+        server = RaceServer(port=0, workers=1, max_jobs=2, queue_laps=1, stall_timeout=5.0, **options)
+        await server.start()
+        try:
+            return await coroutine(server)
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+# Send raw request bytes and return (status, body).
+async def raw_request(server, data):
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), body
+
+
+async def health(server):
+    status, body = await raw_request(server, b"GET /health HTTP/1.1\r\nHost: test\r\n\r\n")
+    assert status == 200
+    return json.loads(body)
+
+
+def test_streamed_race_matches_simulate(cars, track):
+    async def race(server):
+        return [event async for event in stream_race({"cars": cars, "track": track, "laps": 5, "seed": 8}, server.host, server.port)]
+
+    events = with_server(race)
+    expected = simulate(cars, track, 5, seed=8).to_dict()
+    assert [event["kind"] for event in events].count("lap_complete") == 5
+    result = events[-1]
+    assert result["kind"] == "race_result"
+    assert result["fields"]["results"] == expected["results"]
+    assert result["fields"]["statistics"] == expected["statistics"]
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"1e3", b"\xc2\xb2"])
+def test_bad_content_length_is_rejected(length):
+    async def post(server):
+        return await raw_request(server, b"POST /races HTTP/1.1\r\nHost: test\r\nContent-Length: " + length + b"\r\n\r\n{}")
+
+    status, body = with_server(post)
+    assert status == 400
+    assert "Content-Length" in json.loads(body)["error"]
+
+
+def test_invalid_job_is_rejected(cars, track):
+    async def race(server):
+        with pytest.raises(RequestError) as error:
+            async for _ in stream_race({"cars": cars, "track": track, "laps": 0}, server.host, server.port):
+                pass
+        return error.value.status
+
+    assert with_server(race) == 400
+
+
+# A client that hangs up mid-race gives its job slot back straight away.
+def test_disconnect_frees_job_slot(cars, track):
+    async def abandon(server):
+        body = json.dumps({"cars": cars, "track": track, "laps": 1000, "seed": 1}).encode("utf-8")
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(b"POST /races HTTP/1.1\r\nHost: test\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+        assert (await health(server))["running"] == 1
+        writer.close()
+
+        started = time.perf_counter()
+        while (await health(server))["running"] and time.perf_counter() - started < 5.0:
+            await asyncio.sleep(0.05)
+        return (await health(server))["running"], time.perf_counter() - started
+
+    running, seconds = with_server(abandon)
+    assert running == 0
+    assert seconds < 2.0
+
+
+def test_race_error_survives_a_full_queue(cars, track):
+    job = {"cars": cars, "track": track, "laps": 3, "engine": "warp"}
+    events = queue.Queue(maxsize=1)
+    run_streamed_race(job, events, threading.Event(), 0.01)
+    assert events.get_nowait() == [{"kind": "error", "message": "Unknown race engine: warp"}]
+    # Nobody is taking events off the queue, so the error can't be reported and is raised as is.
+    events.put(["unread"])
+    with pytest.raises(ValueError, match="Unknown race engine"):
+        run_streamed_race(job, events, threading.Event(), 0.01)
@@ -0,0 +1,58 @@
+import hashlib
+import itertools
+import json
+
+from race_config import DEFAULT_CONFIG
+from result_cache import CACHE_FORMAT, ResultCache, result_key
+from simulation import simulate
+
+# Fingerprint of seeded results on both engines, per CACHE_FORMAT. A
+# cache must never hand out results an older simulation produced, so if
+# a change makes this test fail, bump CACHE_FORMAT and pin the new
+# fingerprint under it.
+PINNED_RESULTS = {
+    4: "e6c49c173845cc04b9be26e4ffcbaa5955704ee562c41b5ef13e3325fb91f5f7",
+}
+
+# Pit strategies, tyre wear and retirements in the race and in qualifying,
+# so every part of a race weekend feeds the fingerprint.
+CONFIGS = (
+    DEFAULT_CONFIG.replace(failure_factor=0.8, tyre_wear=0.02),
+    DEFAULT_CONFIG.replace(failure_factor=0.09, qualifying_runs=3),
+)
+
+
+def results_fingerprint(cars, track):
+    cars = [dict(car, pit_laps=[4, 8]) if i % 3 == 0 else car for i, car in enumerate(cars)]
+    races = []
+    for engine in ("classic", "vector"):
+        for seed, config in itertools.product(range(4), CONFIGS):
+            result = simulate(cars, track, 12, seed=seed, engine=engine, config=config)
+            races.append([engine, seed, result.statistics, result.metrics.to_dict(),
+                          [[car["car_number"], car["position"], car["health"], None if car["race_time"] is None else round(car["race_time"], 6)] for car in result.results]])
+    encoded = json.dumps(races, sort_keys=True, default=lambda value: round(value, 6) if isinstance(value, float) else value)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def test_seeded_results_match_cache_format(cars, track):
+    assert results_fingerprint(cars, track) == PINNED_RESULTS[CACHE_FORMAT]
+
+
+def test_cached_result_matches_simulate(cars, track, tmp_path):
+    expected = simulate(cars, track, 5, seed=2).to_dict()
+    cache = ResultCache(max_entries=1, directory=str(tmp_path))
+    assert cache.simulate(cars, track, 5, seed=2).to_dict() == expected
+    assert cache.simulate(cars, track, 5, seed=2).to_dict() == expected
+    assert (cache.hits, cache.misses) == (1, 1)
+    # A fresh cache over the same directory answers from disk.
+    reopened = ResultCache(directory=str(tmp_path))
+    assert reopened.simulate(cars, track, 5, seed=2).to_dict() == expected
+    assert reopened.hits == 1
+
+
+def test_key_covers_every_input(cars, track):
+    key = result_key(cars, track, 5, 2)
+    assert result_key(cars, track, 5, 2, config=DEFAULT_CONFIG) == key
+    assert len({key, result_key(cars, track, 6, 2), result_key(cars, track, 5, 3), result_key(cars, track, 5, 2, "vector"),
+                result_key(cars, track, 5, 2, config=DEFAULT_CONFIG.replace(tyre_wear=0.1)),
+                result_key([dict(cars[0], power=cars[0]["power"] + 1)] + cars[1:], track, 5, 2)}) == 6
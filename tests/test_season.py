@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from race_rng import RaceRNG
+from season import DEFAULT_POINTS, SeasonPlan, SeasonRound, iter_season, read_calendar, run_season, run_title_odds
+from simulation import simulate
+
+
+def plan_of(track, rounds=3, **rules):
+    return SeasonPlan([SeasonRound(f"Round {i + 1}", track, 4) for i in range(rounds)], **rules)
+
+
+def test_rounds_are_seeded_races_and_standings_add_up(cars, track):
+    plan = plan_of(track)
+    seeds = [child.seed for child in RaceRNG(11).spawn(len(plan.rounds))]
+    points = {car["car_number"]: 0 for car in cars}
+    for (season_round, result, standings), seed in zip(iter_season(cars, plan, seed=11), seeds):
+        assert result.to_dict() == simulate(cars, track, season_round.laps, seed=seed).to_dict()
+        for car in result.results:
+            if car["race_time"] is not None and car["position"] <= len(DEFAULT_POINTS):
+                points[car["car_number"]] += DEFAULT_POINTS[car["position"] - 1]
+        # The standings are up to date after every round.
+        assert standings.driver_points == points
+    order = standings.driver_order()
+    assert [standings.driver_points[car_number] for car_number in order] == sorted(points.values(), reverse=True)
+    assert sum(standings.team_points.values()) == sum(points.values())
+
+
+def test_health_and_reliability_carry_over(cars, track):
+    plan = plan_of(track, rounds=2, carry_health=True, reliability_wear=0.5)
+    season = iter_season(cars, plan, seed=3)
+    _, first, _ = next(season)
+    _, second, _ = next(season)
+    seeds = [child.seed for child in RaceRNG(3).spawn(2)]
+    carried = []
+    for car in cars:
+        finished = next(result for result in first.results if result["car_number"] == car["car_number"])
+        starting_health = finished["health"] if finished["race_time"] is not None and finished["health"] > 0 else None
+        carried.append(dict(car, starting_health=starting_health, reliability=car["reliability"] - 0.5))
+    assert second.to_dict() == simulate(carried, track, 4, seed=seeds[1]).to_dict()
+
+
+def test_title_odds_do_not_depend_on_workers(cars, track):
+    plan = plan_of(track, rounds=2)
+    serial = run_title_odds(cars, plan, 8, seed=5, workers=1)
+    parallel = run_title_odds(cars, plan, 8, seed=5, workers=2)
+    assert serial.positions == parallel.positions
+    assert serial.team_titles == parallel.team_titles
+    assert sum(serial.driver_title_odds().values()) == pytest.approx(1.0)
+    assert sum(serial.team_title_odds().values()) == pytest.approx(1.0)
+    assert run_season(cars, plan, seed=5).seed == 5
+
+
+def test_calendar_is_read_and_checked(track, tmp_path):
+    (tmp_path / "track.json").write_text(json.dumps(track))
+    calendar = {"rounds": [{"name": "Opener", "track": "track.json", "laps": 5}], "points": [10, 5], "carry_health": True}
+    (tmp_path / "calendar.json").write_text(json.dumps(calendar))
+    plan = read_calendar(str(tmp_path / "calendar.json"))
+    assert [(season_round.name, season_round.laps) for season_round in plan.rounds] == [("Opener", 5)]
+    assert (plan.points, plan.carry_health, plan.engine) == ((10, 5), True, "classic")
+
+    calendar["rounds"][0]["laps"] = 0
+    (tmp_path / "calendar.json").write_text(json.dumps(calendar))
+    with pytest.raises(ValueError, match="invalid lap count"):
+        read_calendar(str(tmp_path / "calendar.json"))
@@ -0,0 +1,33 @@
+import pytest
+
+from race_config import DEFAULT_CONFIG
+from sweep import grid_configs, random_configs, valid_config
+
+RANGES = {"crash_threshold": (0.1, 0.5), "qualifying_runs": (1, 5)}
+
+
+def test_seeded_draws_repeat():
+    assert random_configs(RANGES, 5, seed=7) == random_configs(RANGES, 5, seed=7)
+
+
+def test_unseeded_draws_differ():
+    assert random_configs(RANGES, 5) != random_configs(RANGES, 5)
+
+
+def test_invalid_configs_are_rejected():
+    assert valid_config(DEFAULT_CONFIG)
+    assert not valid_config(DEFAULT_CONFIG.replace(crash_threshold=0.0))
+    assert not valid_config(DEFAULT_CONFIG.replace(qualifying_runs=0))
+    configs = grid_configs({"crash_threshold": [0.0, 0.25], "qualifying_runs": [0, 1, 2]})
+    assert [(config.crash_threshold, config.qualifying_runs) for config in configs] == [(0.25, 1), (0.25, 2)]
+
+
+def test_random_configs_draw_again_until_valid():
+    configs = random_configs({"crash_threshold": (0.0, 0.5), "qualifying_runs": (0, 2)}, 20, seed=1)
+    assert len(configs) == 20
+    assert all(valid_config(config) for config in configs)
+
+
+def test_random_configs_give_up_on_impossible_ranges():
+    with pytest.raises(ValueError, match="crash_threshold"):
+        random_configs({"crash_threshold": (-1.0, 0.0), "qualifying_runs": (1, 5)}, 3, seed=1)
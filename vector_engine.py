@@ -0,0 +1,230 @@
+import logging
+import time
+import numpy as np
+
+import main
+from compiled_track import compile_track
+from pit_strategy import pit_schedule, pit_strategies, tyre_age
+
+
+# Vectorized race engine.
+# Instead of walking the field one car dict at a time, the hot per-item
+# numbers (ratings, race times, health, positions) are held as NumPy arrays
+# and every track item is run for the whole field in one operation.
+# The car dicts are still kept up to date at lap boundaries so the
+# existing pass checks and commentary keep working unchanged; the pit
+# stop times of every car pitting on a lap come from one NumPy draw.
+
+
+# Integer bounds of the corner-time RNG, matching item_time's
+# random.randint((corner_base_rng_val * 10), (corner_highest_rng_val * 10)) / 10.0
+def corner_rng_bounds(config):
+    return int(round(config.corner_base_rng_val * 10)), int(round(config.corner_highest_rng_val * 10))
+
+
+# Struct-of-arrays view over a field of car dicts.
+# None race_times (DNFs) are stored as NaN.
+class VectorField:
+
+    def __init__(self, cars):
+        self.cars = cars
+        self.power = np.array([car["power"] for car in cars], dtype=float)
+        self.handling = np.array([car["handling"] for car in cars], dtype=float)
+        self.reliability = np.array([car["reliability"] for car in cars], dtype=float)
+        self.race_time = np.zeros(len(cars))
+        self.health = np.zeros(len(cars), dtype=np.int64)
+        self.position = np.zeros(len(cars), dtype=np.int64)
+        self.pull()
+
+    # Copy the car dicts into the arrays.
+    def pull(self):
+        for i, car in enumerate(self.cars):
+            self.race_time[i] = np.nan if car["race_time"] is None else car["race_time"]
+            self.health[i] = car["health"]
+            self.position[i] = car["position"]
+
+    # Copy the arrays back into the car dicts.
+    def push(self):
+        for i, car in enumerate(self.cars):
+            race_time = self.race_time[i]
+            car["race_time"] = None if np.isnan(race_time) else float(race_time)
+            car["health"] = int(self.health[i])
+            car["position"] = int(self.position[i])
+
+    # Mask of cars that are still running.
+    def running(self):
+        return (self.health > 0) & ~np.isnan(self.race_time)
+
+    # Take on a CompiledTrack: its lap segments, item base times and the
+    # (cars x items) matrix of static item_time terms for this field,
+    # computed once so each lap only draws and applies the random factor.
+    def attach_track(self, compiled):
+        self.track_rating = compiled.reliability_rating
+        self.segments = compiled.segments()
+        self.base_times = compiled.base_time_array()
+        self.terms = compiled.term_matrix(self.power, self.handling)
+
+
+# Run one full lap for the whole field, which must have a track attached.
+# Every segment of the lap is a single (cars x items) RNG draw and sum
+# over the precomputed terms.
+def run_lap_vectorized(field, ctx):
+    low, high = corner_rng_bounds(ctx.config)
+    rng = ctx.rng.numpy("corners")
+    for start, stop, ends_lap in field.segments:
+        with ctx.phase("item_timing"):
+            running = field.health > 0
+            num_running = int(np.count_nonzero(running))
+            if num_running > 0:
+                rng_factor = rng.integers(low, high + 1, size=(num_running, stop - start)) / 10.0
+                times = field.base_times[None, start:stop] + (field.terms[running, start:stop] * rng_factor)
+                field.race_time[running] += times.sum(axis=1)
+                if ctx.recorder is not None:
+                    ctx.recorder.record_items(ctx.lap, start, stop, field.history_columns[running], times)
+
+        if ends_lap:
+            run_reliability_checks(field, field.track_rating, ctx)
+
+
+# Run the end of lap reliability checks for the whole field.
+# Same odds as reliability_check. Failures are rare, so each one is
+# handed to apply_breakdown on the car dicts to keep the commentary,
+# retirement ordering and statistics in one place.
+def run_reliability_checks(field, track_rating, ctx):
+    with ctx.phase("reliability"):
+        running = ~np.isnan(field.race_time)
+        percent_difference = ctx.config.failure_factor * (field.reliability / track_rating)
+        failed = running & (ctx.rng.numpy("reliability").integers(1, 101, size=len(field.cars)) > (percent_difference * 100))
+        if failed.any():
+            field.push()
+            for i in np.flatnonzero(failed):
+                main.apply_breakdown(field.cars, field.cars[i], ctx)
+            field.pull()
+
+
+# Vectorized counterpart of run_qualifying.
+# Every car's qualifying_runs laps are one (runs x cars x items) draw from
+# the NumPy corners stream applied to the compiled track's term matrix,
+# and the reliability checks of every lap end are one draw from the NumPy
+# reliability stream, against a rating of 1 like run_qualifying. The
+# best lap per car sets the grid through a single stable sort, with cars
+# that retired (and set no laps after it) behind every running car.
+def run_qualifying_vectorized(cars, track, ctx):
+    compiled = compile_track(track, ctx.config)
+    field = VectorField(cars)
+    terms = compiled.term_matrix(field.power, field.handling)
+    base_times = compiled.base_time_array()
+    low, high = corner_rng_bounds(ctx.config)
+    runs = ctx.config.qualifying_runs
+
+    rng_factor = ctx.rng.numpy("corners").integers(low, high + 1, size=(runs, len(cars), len(base_times))) / 10.0
+    lap_times = field.race_time[None, :] + (base_times[None, None, :] + terms[None, :, :] * rng_factor).sum(axis=2)
+
+    # Failed checks per run and car. Failures are rare, so each is handed to apply_breakdown.
+    percent_difference = ctx.config.failure_factor * field.reliability
+    checks = ctx.rng.numpy("reliability").integers(1, 101, size=(runs, len(compiled.lap_end_indexes), len(cars)))
+    failures = (checks > (percent_difference * 100)).sum(axis=1)
+    for i in np.flatnonzero(failures.any(axis=0)):
+        car = cars[i]
+        for run in range(runs):
+            for _ in range(failures[run, i]):
+                main.apply_breakdown([car], car, ctx)
+                if car["health"] < 1:
+                    break
+            if car["health"] < 1:
+                lap_times[run + 1:, i] = np.inf
+                break
+    best_laps = lap_times.min(axis=0)
+    retired = np.array([car["health"] < 1 for car in cars])
+
+    for car, best_lap in zip(cars, best_laps):
+        car["race_time"] = float(best_lap)
+        ctx.commentate("qualifying_lap", "And car {car_number} just set a laptime of {lap_time}!", car_number=car['car_number'], lap_time=car["race_time"])
+
+    grid = np.lexsort((best_laps, retired))
+    return {cars[i]["car_number"]: position for position, i in enumerate(grid, 1)}
+
+
+# Draw size samples from a normal distribution clamped to [low, high], in one call.
+def clipped_normal(generator, mean, std_dev, low, high, size):
+    return np.clip(generator.normal(mean, std_dev, size), low, high)
+
+
+# Run pit stops for the running cars numbered in car_numbers, with every
+# pit stop time drawn in one clipped normal sample from the NumPy
+# pit_stops stream.
+def run_pit_stops_vectorized(cars, ctx, car_numbers):
+    config = ctx.config
+    pitting = [car for car in cars if car["race_time"] is not None and car["car_number"] in car_numbers]
+    pit_stop_times = clipped_normal(ctx.rng.numpy("pit_stops"), config.avg_pitstop_time, config.std_dev_pitstop_time,
+                                    config.min_pitstop_time, config.max_pitstop_time, len(pitting))
+    for car, pit_stop_time in zip(pitting, pit_stop_times):
+        main.pit_stop(car, float(pit_stop_time), ctx)
+    return cars
+
+
+# Given a field of entrants, populated,
+# and the track, run a race with the given
+# number of laps using the vectorized engine.
+# Drop-in replacement for run_race; corner times and reliability checks
+# draw from the NumPy streams of ctx.rng.
+def run_race_vectorized(cars, track, num_laps, ctx=None):
+    return main.exhaust(iter_race_vectorized(cars, track, num_laps, ctx))
+
+
+# Generator form of run_race_vectorized, yielding the RaceState after
+# every lap. Given a state, the race carries on from it like iter_race.
+def iter_race_vectorized(cars, track, num_laps, ctx=None, state=None):
+    if ctx is None:
+        ctx = main.default_context
+    if state is None:
+        state = main.RaceState(cars)
+
+    field = VectorField(state.field)
+    field.attach_track(compile_track(track, ctx.config))
+    if ctx.recorder is not None:
+        field.history_columns = ctx.recorder.columns_of(field.cars)
+    pit_plans = pit_strategies(field.cars, num_laps)
+    schedule = pit_schedule(pit_plans)
+    # Laps done on each car's tyres at the start of every lap, (laps x cars).
+    tyre_ages = None
+    if ctx.config.tyre_wear:
+        tyre_ages = np.array([[tyre_age(pit_plans[car["car_number"]], lap) for car in field.cars] for lap in range(num_laps + 1)], dtype=float)
+    for i in range(state.lap + 1, num_laps + 1):
+        if ctx.profiler is not None:
+            lap_started = time.perf_counter()
+        ctx.lap = i
+        ctx.commentate("lap_start", "\nIt's now lap {lap} here at the Grand Prix!", lap=i)
+        logging.info("Running lap %s/%s", i, num_laps)
+        run_lap_vectorized(field, ctx)
+
+        if tyre_ages is not None:
+            running = field.running()
+            field.race_time[running] += ctx.config.tyre_wear * tyre_ages[i][running]
+
+        # Pit stops and pass checks work on the car dicts.
+        field.push()
+        if i in schedule:
+            with ctx.phase("pit_stops"):
+                run_pit_stops_vectorized(field.cars, ctx, schedule[i])
+            state.has_pitstop_occurred = True
+
+        with ctx.phase("pass_resolution"):
+            ordered = main.run_pass_check(field.cars, ctx)
+        if main.negative_gap_exists(ordered):
+            logging.error("Negative gap!")
+        if ctx.recorder is not None:
+            ctx.recorder.record_lap(i, ordered)
+        if ctx.sink is not None:
+            ctx.commentate("lap_complete", main.format_standings, lap=i, standings=main.get_standings(ordered), final=i == num_laps)
+        field.pull()
+
+        if ctx.profiler is not None:
+            ctx.profiler.record_lap(time.perf_counter() - lap_started)
+        state.lap = i
+        yield state
+
+    logging.info("Race over.")
+    field.push()
+    with ctx.phase("position_sorting"):
+        return main.update_positions(field.cars, ctx.rng.ordering)